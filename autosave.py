@@ -0,0 +1,108 @@
+"""Auto-save writer shared by every tab.
+
+The editor takes a snapshot of each modified document on the Tk thread and
+hands it over here. A single worker thread encodes it, skips it when the
+content hash matches the last save and otherwise writes it through a
+temporary file that is fsynced and renamed over the target, so a crash
+never leaves a truncated file behind.
+"""
+import codecs
+import hashlib
+import os
+import queue
+import tempfile
+import threading
+import time
+
+import file_loader
+import perf
+
+
+def encoded_chunks(text, encoding):
+    """Bytes of a saved file holding text, a str or a document.Snapshot,
+    in pieces. Saving always ends the file with a newline, like Tk's text."""
+    encoder = codecs.getincrementalencoder(encoding)(file_loader.error_handler(encoding))
+    for chunk in [text] if isinstance(text, str) else text.chunks():
+        yield encoder.encode(chunk)
+    yield encoder.encode('\n', final=True)
+
+
+def atomic_write(path, data):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates the file as 0600, keep the mode of the original
+        try:
+            os.chmod(temp_path, os.stat(path).st_mode & 0o7777)
+        except FileNotFoundError:
+            pass
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+    # The rename itself is only durable once the directory is synced
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+class AutoSaver:
+    """Single background writer for auto-save snapshots.
+
+    submit(key, path, text, encoding) queues a snapshot, text being a str or
+    a document.Snapshot. The outcome is put on results as (key, path, error)
+    with error None on success or when the content was unchanged.
+    """
+
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.hashes = {}  # path -> digest of the last content written
+        self.stats = {'saved': 0, 'skipped': 0, 'failed': 0, 'bytes_written': 0,
+                      'last_latency': 0.0, 'max_latency': 0.0, 'total_latency': 0.0}
+        self.worker = None
+
+    def submit(self, key, path, text, encoding='utf-8'):
+        # The worker is only started once there is something to write
+        if self.worker is None:
+            self.worker = threading.Thread(target=self._work, daemon=True)
+            self.worker.start()
+        self.jobs.put((key, path, text, encoding))
+
+    def _work(self):
+        while True:
+            key, path, text, encoding = self.jobs.get()
+            try:
+                with perf.span('auto-save write'):
+                    self._save(path, text, encoding)
+                self.results.put((key, path, None))
+            except Exception as e:
+                self.stats['failed'] += 1
+                self.results.put((key, path, e))
+
+    def _save(self, path, text, encoding):
+        started = time.perf_counter()
+        data = b''.join(encoded_chunks(text, encoding))
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        if self.hashes.get(path) == digest and os.path.exists(path):
+            self.stats['skipped'] += 1
+            return
+        atomic_write(path, data)
+        self.hashes[path] = digest
+        latency = time.perf_counter() - started
+        self.stats['saved'] += 1
+        self.stats['bytes_written'] += len(data)
+        self.stats['last_latency'] = latency
+        self.stats['max_latency'] = max(self.stats['max_latency'], latency)
+        self.stats['total_latency'] += latency
@@ -0,0 +1,267 @@
+"""Headless batch mode: find, replace, PDF export and highlighting for many
+files at once, without starting Tk.
+
+Files are handled in parallel by a process pool and read in chunks of whole
+lines, so no file is ever held in memory at once. Matches spanning two
+chunks are not found and \\A and \\Z match at the ends of each chunk, while
+^ and $ match at every line. Examples:
+    python batch.py find "TODO|FIXME" --regex src/*.py
+    python batch.py replace colour color --whole-word docs/*.txt
+    python batch.py pdf --line-numbers --colours -o out/ *.py
+    python batch.py highlight -o out/ *.py *.json
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import file_loader
+import search_engine
+
+CHUNK_LINES = 10000  # lines read from a file at a time
+LINE_END = re.compile(r'\r\n|\r|\n')
+
+
+def open_source(path, encoding=None):
+    # Undecodable bytes and line endings survive a rewrite unchanged
+    encoding = encoding or file_loader.detect_encoding(path)
+    return open(path, encoding=encoding, errors='surrogateescape', newline='')
+
+
+def iter_line_chunks(f, keep_ends=False):
+    # Chunks of whole lines, each with the number of its first line
+    first_line = 1
+    lines = []
+    for line in f:
+        lines.append(line if keep_ends else line.rstrip('\r\n'))
+        if len(lines) == CHUNK_LINES:
+            yield first_line, ''.join(lines) if keep_ends else '\n'.join(lines)
+            first_line += len(lines)
+            lines = []
+    if lines or first_line == 1:
+        yield first_line, ''.join(lines) if keep_ends else '\n'.join(lines)
+
+
+def replace_chunk(pattern, template, text, regex=False):
+    """Replace the matches in a chunk of lines that keep their line endings,
+    returning (text, count).
+
+    The pattern sees the lines without their endings joined by '\\n', the
+    text find searches, and the same matches are replaced. The original
+    line endings are put back around the replacements.
+    """
+    lines = LINE_END.split(text)
+    endings = LINE_END.findall(text) + ['']
+    if len(lines) > 1 and not lines[-1]:
+        lines.pop()  # the chunk ends with a line ending, not with an empty line
+    joined = '\n'.join(lines)
+    parts = []
+    line = 0
+
+    def restore(segment):
+        nonlocal line
+        pieces = segment.split('\n')
+        for piece in pieces[:-1]:
+            parts.append(piece)
+            parts.append(endings[line])
+            line += 1
+        parts.append(pieces[-1])
+
+    count = 0
+    position = 0
+    for _, _, match in search_engine.iter_matches(pattern, joined):
+        restore(joined[position:match.start()])
+        parts.append(match.expand(template) if regex else template)
+        line += match.group().count('\n')  # endings inside a match are replaced with it
+        position = match.end()
+        count += 1
+    restore(joined[position:])
+    parts.append(endings[line])
+    return ''.join(parts), count
+
+
+def output_path(path, output_dir, suffix):
+    directory = output_dir or os.path.dirname(path)
+    return os.path.join(directory, os.path.basename(path) + suffix)
+
+
+def find_file(path, options):
+    pattern = search_engine.compile_pattern(options.pattern, options.regex, not options.ignore_case,
+                                            options.whole_word)
+    hits = []
+    with open_source(path) as f:
+        for first_line, text in iter_line_chunks(f):
+            lines = text.split('\n')
+            for line, column, match in search_engine.iter_matches(pattern, text, first_line):
+                hits.append(f'{path}:{line}:{column + 1}: {lines[line - first_line]}')
+    return hits
+
+
+def replace_file(path, options):
+    pattern = search_engine.compile_pattern(options.pattern, options.regex, not options.ignore_case,
+                                            options.whole_word)
+    encoding = file_loader.detect_encoding(path)
+    count = 0
+
+    # Stream into a temporary file next to the original and swap it in
+    # only if something changed
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with open_source(path, encoding) as source, \
+                open(fd, 'w', encoding=encoding, errors='surrogateescape', newline='') as target:
+            for _, text in iter_line_chunks(source, keep_ends=True):
+                text, replaced = replace_chunk(pattern, options.replacement, text, options.regex)
+                count += replaced
+                if not options.dry_run:
+                    target.write(text)
+        if count and not options.dry_run:
+            os.chmod(temp_path, os.stat(path).st_mode & 0o7777)
+            os.replace(temp_path, path)
+        else:
+            os.unlink(temp_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    verb = 'would be replaced' if options.dry_run else 'replaced'
+    return [f'{path}: {count} occurrences {verb}'] if count else []
+
+
+def lexer_for(path):
+    from pygments.lexers import get_lexer_for_filename, TextLexer
+    try:
+        return get_lexer_for_filename(path)
+    except Exception:
+        return TextLexer()
+
+
+def count_lines(path):
+    # Lines iter_line_chunks gives for path, an empty file has one
+    with open_source(path) as f:
+        return max(sum(1 for _ in f), 1)
+
+
+def pdf_file(path, options):
+    import pdf_export
+    lexer = style = None
+    if options.colours:
+        from pygments.styles import get_style_by_name
+        lexer, style = lexer_for(path), get_style_by_name(options.style)
+    target = output_path(path, options.output_dir, '.pdf')
+    line_count = count_lines(path) if options.line_numbers else None
+    export = pdf_export.PdfExport(target, options.line_numbers, lexer, style, line_count=line_count)
+    with open_source(path) as f:
+        for _, text in iter_line_chunks(f):
+            export.put(text)
+    export.put(None)
+    while not export.done:
+        time.sleep(0.01)
+    if export.error is not None:
+        raise export.error
+    return [f'{path}: {export.pages} pages written to {target}']
+
+
+def highlight_file(path, options):
+    from pygments.formatters import HtmlFormatter
+    from pygments.token import Text
+    from highlighter import lex_chunks
+
+    def tokens(f):
+        # Per-line tokens turned back into the stream a formatter expects
+        for line, line_tokens in lex_chunks(lexer_for(path), (text for _, text in iter_line_chunks(f))):
+            for column, length, ttype in line_tokens:
+                yield ttype, line[column:column + length]
+            yield Text, '\n'
+
+    target = output_path(path, options.output_dir, '.html')
+    formatter = HtmlFormatter(full=True, style=options.style, title=os.path.basename(path))
+    with open_source(path) as f, open(target, 'w', encoding='utf-8') as out:
+        formatter.format(tokens(f), out)
+    return [f'{path}: highlighted into {target}']
+
+
+COMMANDS = {
+    'find': find_file,
+    'replace': replace_file,
+    'pdf': pdf_file,
+    'highlight': highlight_file,
+}
+
+
+def run_one(args):
+    command, path, options = args
+    try:
+        return path, os.path.getsize(path), COMMANDS[command](path, options), None
+    except Exception as e:
+        return path, 0, [], e
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Process many files without starting the editor.")
+    parser.add_argument('-j', '--jobs', type=int, default=None, help="worker processes (default: CPU count)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def search_options(command):
+        command.add_argument('--regex', action='store_true', help="treat the pattern as a regular expression")
+        command.add_argument('-i', '--ignore-case', action='store_true')
+        command.add_argument('-w', '--whole-word', action='store_true')
+
+    find = commands.add_parser('find', help="print every match as path:line:column: text")
+    find.add_argument('pattern')
+    search_options(find)
+    find.add_argument('files', nargs='+')
+
+    replace = commands.add_parser('replace', help="replace every match in place")
+    replace.add_argument('pattern')
+    replace.add_argument('replacement', help="may use \\1 or \\g<name> with --regex")
+    search_options(replace)
+    replace.add_argument('--dry-run', action='store_true', help="only count the matches")
+    replace.add_argument('files', nargs='+')
+
+    pdf = commands.add_parser('pdf', help="export every file to PDF")
+    pdf.add_argument('--line-numbers', action='store_true')
+    pdf.add_argument('--colours', action='store_true', help="colour the text by syntax")
+    pdf.add_argument('--style', default='default', help="Pygments style used for colours")
+    pdf.add_argument('-o', '--output-dir', help="default: next to each file")
+    pdf.add_argument('files', nargs='+')
+
+    highlight = commands.add_parser('highlight', help="write syntax highlighted HTML for every file")
+    highlight.add_argument('--style', default='default', help="Pygments style")
+    highlight.add_argument('-o', '--output-dir', help="default: next to each file")
+    highlight.add_argument('files', nargs='+')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    if getattr(options, 'output_dir', None):
+        os.makedirs(options.output_dir, exist_ok=True)
+
+    started = time.perf_counter()
+    total_bytes = 0
+    failed = 0
+    jobs = [(options.command, path, options) for path in options.files]
+    with ProcessPoolExecutor(max_workers=options.jobs) as pool:
+        # Results come back in file order while later files are still running
+        for path, size, lines, error in pool.map(run_one, jobs):
+            if error is not None:
+                failed += 1
+                print(f"{path}: {error}", file=sys.stderr)
+                continue
+            total_bytes += size
+            for line in lines:
+                print(line)
+    elapsed = max(time.perf_counter() - started, 1e-9)
+
+    done = len(jobs) - failed
+    megabytes = total_bytes / (1024 * 1024)
+    print(f"{done} files, {megabytes:.1f} MB in {elapsed:.2f} s "
+          f"({done / elapsed:.1f} files/s, {megabytes / elapsed:.1f} MB/s)", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
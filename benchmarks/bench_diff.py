@@ -0,0 +1,80 @@
+"""Speed of the split screen's line diff.
+
+Builds a document of LINES lines and a copy with CHANGES scattered
+insertions, deletions and changed lines, then times interning the lines,
+the full diff and single-line updates like the ones typing sends. The
+hunks are checked to turn the document into its copy. No display is
+needed. Run from the repository root:
+    python benchmarks/bench_diff.py [--lines 1000000] [--changes 2000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import diff
+
+UPDATES = 200
+WORDS = ('alpha', 'beta', 'gamma', 'delta', 'value', 'index', 'buffer', 'return', 'self', 'line')
+
+
+def apply_hunks(a, b, hunks):
+    result = []
+    position = 0
+    for a0, a1, b0, b1 in hunks:
+        result += a[position:a0]
+        result += b[b0:b1]
+        position = a1
+    return result + a[position:]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the line diff")
+    parser.add_argument('--lines', type=int, default=1_000_000)
+    parser.add_argument('--changes', type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    a = [f"{' '.join(rng.choice(WORDS) for _ in range(6))} {number}" for number in range(args.lines)]
+    b = list(a)
+    for _ in range(args.changes):
+        i = rng.randrange(len(b))
+        kind = rng.random()
+        if kind < 1 / 3:
+            b.insert(i, f"inserted {i}")
+        elif kind < 2 / 3:
+            del b[i]
+        else:
+            b[i] += " changed"
+
+    started = time.perf_counter()
+    line_diff = diff.LineDiff(a, b)
+    interned = time.perf_counter()
+    first = None
+    for hunk in line_diff.run():
+        if first is None:
+            first = time.perf_counter()
+    done = time.perf_counter()
+    assert apply_hunks(a, b, line_diff.hunks) == b
+
+    updates = []
+    for _ in range(UPDATES):
+        line = rng.randrange(len(line_diff.a))
+        began = time.perf_counter()
+        line_diff.update((line, line + 1, [f"typed {line}"]), None)
+        updates.append(time.perf_counter() - began)
+    updates.sort()
+
+    print(f"{args.lines} lines, {args.changes} changes, {len(line_diff.hunks)} hunks after the updates")
+    print(f"intern lines       {(interned - started) * 1000:9.1f} ms")
+    print(f"first hunk         {((first or done) - interned) * 1000:9.1f} ms")
+    print(f"full diff          {(done - interned) * 1000:9.1f} ms")
+    print(f"update p50         {updates[len(updates) // 2] * 1000:9.3f} ms")
+    print(f"update max         {updates[-1] * 1000:9.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
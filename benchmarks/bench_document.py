@@ -0,0 +1,73 @@
+"""Microbenchmarks for the piece-table document model.
+
+Times building the model and the median cost of insert, delete, slice and
+line lookup at several document sizes. No display is needed. Run from the
+repository root:
+    python benchmarks/bench_document.py [size_mb ...]
+"""
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from document import Document
+
+SIZES_MB = (1, 100, 1024)
+OPERATIONS = 2000
+SLICE_CHARS = 4096
+
+
+def build_text(size_mb):
+    line = 'the quick brown fox jumps over the lazy dog 0123456789\n'
+    return line * (size_mb * 1024 * 1024 // len(line))
+
+
+def median_us(operation, count=OPERATIONS):
+    samples = []
+    for _ in range(count):
+        started = time.perf_counter()
+        operation()
+        samples.append((time.perf_counter() - started) * 1e6)
+    return statistics.median(samples)
+
+
+def main(sizes):
+    rng = random.Random(1)
+    for size_mb in sizes:
+        text = build_text(size_mb)
+        started = time.perf_counter()
+        doc = Document(text)
+        build = time.perf_counter() - started
+        del text
+
+        def insert():
+            line = rng.randint(1, doc.line_count)
+            doc.insert(doc.offset(line, 3), 'typed text\n')
+
+        def typing():
+            # Consecutive keystrokes extend one buffer
+            doc.insert(doc.run if doc.run is not None else 0, 'a')
+
+        def delete():
+            start = rng.randint(0, len(doc) - 100)
+            doc.delete(start, start + rng.randint(1, 100))
+
+        def slice_text():
+            start = rng.randint(0, len(doc) - SLICE_CHARS)
+            doc.slice(start, start + SLICE_CHARS)
+
+        def line_lookup():
+            doc.line(rng.randint(1, doc.line_count))
+
+        results = [('insert', median_us(insert)), ('typing', median_us(typing)),
+                   ('delete', median_us(delete)), ('slice 4k', median_us(slice_text)),
+                   ('line', median_us(line_lookup)), ('snapshot', median_us(doc.snapshot, 100))]
+        timings = '  '.join(f'{name} {us:8.1f} us' for name, us in results)
+        print(f'{size_mb:>5} MB  build {build:7.2f} s  pieces {sum(map(len, doc.blocks)):5d}  {timings}')
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or SIZES_MB)
@@ -0,0 +1,79 @@
+"""Cost of watching many open files for outside changes.
+
+Watches FILES files spread over a few directories, first through inotify
+(where available) and then with stat polling only, and reports the CPU
+time the process spends while nothing changes, how long an append takes to
+be noticed and how long reading it back takes. No display is needed. Run
+from the repository root:
+    python benchmarks/bench_file_watcher.py [--files 500] [--seconds 10]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import document
+import file_watcher
+
+DIRECTORIES = 10
+LINE = 'INFO request handled in 12 ms\n'
+
+
+def measure(paths, seconds, use_inotify):
+    if not use_inotify:
+        file_watcher.open_inotify = lambda: None
+    watcher = file_watcher.FileWatcher()
+    for path in paths:
+        watcher.watch(path)
+    label = 'inotify' if watcher.inotify is not None else 'stat polling'
+
+    # Idle cost, the first pass over the files is left out
+    time.sleep(file_watcher.SETTLE_SECONDS * 2)
+    cpu = time.process_time()
+    time.sleep(seconds)
+    idle_ms = (time.process_time() - cpu) * 1000 / seconds
+
+    path = paths[len(paths) // 2]
+    started = time.perf_counter()
+    with open(path, 'a') as f:
+        f.write(LINE)
+    while watcher.changes.get() != path:
+        pass
+    noticed_ms = (time.perf_counter() - started) * 1000
+
+    signature, tail = watcher.state(path)
+    snapshot = document.Document(LINE * 1000).snapshot()
+    started = time.perf_counter()
+    kind, change, state = file_watcher.read_change(path, signature, tail, 'utf-8', snapshot)
+    read_ms = (time.perf_counter() - started) * 1000
+    watcher.settle(path, state)
+    print(f"{label:14}{idle_ms:10.2f}{noticed_ms:12.1f}{read_ms:10.3f}  ({kind})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the file watcher")
+    parser.add_argument('--files', type=int, default=500)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        paths = []
+        for number in range(args.files):
+            directory = os.path.join(root, f'dir{number % DIRECTORIES}')
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f'file{number}.log')
+            with open(path, 'w') as f:
+                f.write(LINE * 1000)
+            paths.append(path)
+
+        print(f"{args.files} files, idle for {args.seconds:g} s")
+        print(f"{'':14}{'CPU ms/s':>10}{'noticed ms':>12}{'read ms':>10}")
+        measure(paths, args.seconds, use_inotify=True)
+        measure(paths, args.seconds, use_inotify=False)
+
+
+if __name__ == "__main__":
+    main()
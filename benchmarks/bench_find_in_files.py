@@ -0,0 +1,72 @@
+"""Find in Files over a generated source tree.
+
+Times a plain scan of every file, the first indexed search (which builds
+the trigram index) and a repeated indexed search after a few files changed.
+No display is needed. Run from the repository root:
+    python benchmarks/bench_find_in_files.py [files]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import file_search
+import search_engine
+
+FILES = 5000
+LINES = 200
+CHANGED = 10
+PATTERN = 'needle_4242'
+
+
+def build_tree(root, files):
+    for number in range(files):
+        directory = os.path.join(root, f'package_{number % 50}')
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f'module_{number}.py'), 'w') as f:
+            f.write(''.join(f'def function_{number}_{line}(value):  # identifier_{number * line % 9973}\n'
+                            for line in range(LINES)))
+            if number % 500 == 0:
+                f.write(f'{PATTERN} = {number}\n')
+
+
+def run(root, index_path):
+    pattern = search_engine.compile_pattern(PATTERN)
+    search = file_search.FileSearch(root, pattern, 20 * 1024 * 1024,
+                                    file_search.required_trigrams(PATTERN), index_path)
+    while True:
+        kind, *payload = search.results.get()
+        if kind == 'done':
+            return payload[0]
+        if kind == 'error':
+            raise payload[0]
+
+
+def report(label, stats):
+    print(f"{label:<22} {stats['seconds']:8.3f} s  {stats['hits']} hits, "
+          f"{stats['scanned']} of {stats['files']} files scanned, {stats['indexed']} indexed")
+
+
+def main(files):
+    with tempfile.TemporaryDirectory() as directory:
+        root = os.path.join(directory, 'tree')
+        index_path = os.path.join(directory, 'tree.idx')
+        started = time.perf_counter()
+        build_tree(root, files)
+        print(f"{files} files written in {time.perf_counter() - started:.1f} s")
+
+        report("scan", run(root, None))
+        report("indexed, first run", run(root, index_path))
+        report("indexed, repeat", run(root, index_path))
+
+        for number in range(CHANGED):
+            path = os.path.join(root, f'package_{number % 50}', f'module_{number}.py')
+            with open(path, 'a') as f:
+                f.write('# edited\n')
+        report(f"indexed, {CHANGED} changed", run(root, index_path))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else FILES)
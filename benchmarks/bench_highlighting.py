@@ -0,0 +1,90 @@
+"""Per-keystroke syntax highlighting cost on large Python and JSON files.
+
+Run from the repository root with a display available, e.g.
+    xvfb-run python benchmarks/bench_highlighting.py
+"""
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import notepad
+from tkinter import INSERT
+from pygments import highlight
+from pygments.formatters import BBCodeFormatter
+from pygments.lexers import JsonLexer, PythonLexer
+from pygments.styles import get_style_by_name
+
+SIZES = (10_000, 100_000)
+KEYSTROKES = 30
+LEGACY_KEYSTROKES = 3
+
+
+def python_document(lines):
+    block = (
+        'class Item{0}(Base):\n'
+        '    """Docstring for item {0}."""\n'
+        '\n'
+        '    def value(self, x):\n'
+        '        return x * {0} + len("item {0}")  # comment\n'
+    )
+    return ''.join(block.format(i) for i in range(lines // 5))
+
+
+def json_document(lines):
+    record = {'id': 0, 'name': 'item', 'tags': ['a', 'b'], 'price': 1.5}
+    records = [dict(record, id=i) for i in range(lines // 8)]
+    return json.dumps(records, indent=2)
+
+
+def legacy_highlight(text_area, lexer):
+    # The previous implementation re-lexed the whole buffer into markup
+    content = text_area.get('1.0', 'end-1c')
+    highlight(content, lexer, BBCodeFormatter(style=get_style_by_name('monokai')))
+
+
+def measure(text_area, refresh, keystrokes):
+    samples = []
+    for _ in range(keystrokes):
+        start = time.perf_counter()
+        text_area.insert(INSERT, 'a')
+        refresh()
+        notepad.win.update_idletasks()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[-1]
+
+
+def main():
+    notepad.win.update()
+    for name, make, lexer in (('python', python_document, PythonLexer()),
+                              ('json', json_document, JsonLexer())):
+        for size in SIZES:
+            text_area = notepad.new_file()
+            text_area.insert('1.0', make(size))
+            text_area.mark_set(INSERT, f'{size // 2}.4')
+            text_area.see(INSERT)
+            notepad.win.update()
+
+            started = time.perf_counter()
+            notepad.start_highlighting(text_area, lexer)
+            while text_area.highlighter.busy:
+                notepad.run_highlighting(text_area)
+            full = time.perf_counter() - started
+            print(f"{name:>6} {size:>7} lines  initial highlight {full:8.2f} s")
+
+            median, worst = measure(text_area, lambda: notepad.run_highlighting(text_area), KEYSTROKES)
+            print(f"{name:>6} {size:>7} lines  incremental  median {median:8.2f} ms  max {worst:8.2f} ms")
+
+            median, worst = measure(text_area, lambda: legacy_highlight(text_area, lexer), LEGACY_KEYSTROKES)
+            print(f"{name:>6} {size:>7} lines  full re-lex  median {median:8.2f} ms  max {worst:8.2f} ms")
+
+            notepad.notebook.forget(notepad.notebook.select())
+            notepad.win.update()
+
+
+if __name__ == "__main__":
+    main()
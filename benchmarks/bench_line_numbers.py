@@ -0,0 +1,65 @@
+"""Keystroke-to-repaint latency of the line number gutter.
+
+Run from the repository root with a display available, e.g.
+    xvfb-run python benchmarks/bench_line_numbers.py
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import notepad
+from tkinter import END, INSERT, Text
+
+SIZES = (1_000, 100_000, 1_000_000)
+KEYSTROKES = 50
+
+
+def legacy_update_line_numbers(text_area, gutter):
+    # The previous implementation, kept here as the baseline
+    gutter.configure(state='normal')
+    gutter.delete('1.0', END)
+    contents = text_area.get('1.0', END)
+    num_lines = contents.count('\n') + (not contents.endswith('\n'))
+    gutter.insert('1.0', '\n'.join(f'{i:4d}' for i in range(1, num_lines + 1)))
+    gutter.yview_moveto(text_area.yview()[0])
+    gutter.configure(state='disabled')
+
+
+def measure(text_area, refresh):
+    samples = []
+    for _ in range(KEYSTROKES):
+        start = time.perf_counter()
+        text_area.insert(INSERT, 'a')
+        refresh()
+        notepad.win.update_idletasks()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    notepad.win.update()
+    for size in SIZES:
+        text_area = notepad.new_file()
+        text_area.insert('1.0', ''.join(f'line {i} of the benchmark document\n' for i in range(size)))
+        text_area.mark_set(INSERT, f'{size // 2}.0')
+        text_area.see(INSERT)
+        notepad.win.update()
+
+        median, p95 = measure(text_area, lambda: notepad.update_line_numbers(text_area))
+        print(f"{size:>9} lines  viewport gutter  median {median:8.2f} ms  p95 {p95:8.2f} ms")
+
+        legacy_gutter = Text(notepad.win, width=6)
+        median, p95 = measure(text_area, lambda: legacy_update_line_numbers(text_area, legacy_gutter))
+        print(f"{size:>9} lines  legacy gutter    median {median:8.2f} ms  p95 {p95:8.2f} ms")
+        legacy_gutter.destroy()
+
+        notepad.close_tab(notepad.notebook.index('current'))
+        notepad.win.update()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Typing and scrolling on a file that is one long line.
+
+Opens a minified JSON file of a single line (20 MB by default, see
+corpus.py) twice, each time in a fresh process: once as a plain Text widget
+line with long-line mode turned off, and once in long-line mode with its
+soft-wrapped segments. In both it times keystrokes in the middle of the
+line and page scrolls, including the edit jobs and the redraw, and prints
+the percentiles side by side. The plain widget can take minutes on the
+full size, so try a smaller one first. When there is no display an Xvfb
+server is started. Run from the repository root:
+    python benchmarks/bench_long_lines.py [--size 20MB] [--corpus DIRECTORY]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import corpus
+import suite
+
+KEYSTROKES = 100
+SCROLLS = 50
+TIMEOUT = 1800  # seconds before a run is killed
+
+
+def measure(path, long_line_mode):
+    """Run inside the child process with the editor imported."""
+    import long_lines
+    if not long_line_mode:
+        long_lines.has_long_line = lambda text, column=0: False
+    import notepad
+    suite.notepad = notepad
+
+    text_area = suite.open_tab(path)
+    notepad.win.update()
+    length = notepad.document_position(text_area, 'end-1c')[1]  # the file is line 1
+    text_area.mark_set('insert', notepad.widget_index(text_area, 1, length // 2))
+    text_area.see('insert')
+    text_area.focus_force()
+    notepad.win.update()
+
+    def keystroke(char):
+        text_area.insert('insert', char)
+        text_area.see('insert')
+        suite.flush_edit_jobs(text_area)
+
+    def scroll(direction):
+        text_area.yview_scroll(direction, 'pages')
+        notepad.win.update_idletasks()
+
+    typing = sorted(suite.timed(lambda: keystroke(char)) for char in ('abc ' * KEYSTROKES)[:KEYSTROKES])
+    scrolling = sorted(suite.timed(lambda: scroll(1 if i % 20 < 10 else -1)) for i in range(SCROLLS))
+    return {'typing': typing, 'scroll': scrolling}
+
+
+def run_child(path, long_line_mode):
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            process = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', path,
+                                      '--long-line-mode' if long_line_mode else '--plain'],
+                                     cwd=directory, capture_output=True, text=True, timeout=TIMEOUT)
+        except subprocess.TimeoutExpired:
+            return None
+    lines = process.stdout.strip().splitlines()
+    if process.returncode != 0 or not lines:
+        sys.stderr.write(process.stderr)
+        return None
+    return json.loads(lines[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark long-line mode")
+    parser.add_argument('--size', default='20MB')
+    parser.add_argument('--corpus', default=os.path.join(tempfile.gettempdir(), 'notepad_bench_corpus'))
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--long-line-mode', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--plain', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.long_line_mode)))
+        return
+
+    suite.ensure_display()
+    path = corpus.generate('longline', corpus.parse_size(args.size), args.corpus)
+    print(f"{os.path.basename(path)}, {KEYSTROKES} keystrokes and {SCROLLS} page scrolls")
+    print(f"{'':24}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for label, long_line_mode in (('plain line', False), ('long-line mode', True)):
+        result = run_child(path, long_line_mode)
+        for action in ('typing', 'scroll'):
+            name = f"{label}, {action}"
+            if result is None:
+                print(f"{name:24}{'failed or timed out':>30}")
+                continue
+            samples = result[action]
+            print(f"{name:24}{suite.percentile(samples, 0.5):10.2f}"
+                  f"{suite.percentile(samples, 0.95):10.2f}{samples[-1]:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
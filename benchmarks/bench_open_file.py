@@ -0,0 +1,71 @@
+"""Time to first paint, total load time and peak RSS when opening files.
+
+Each case runs in its own process so peak RSS is not shared between cases.
+Run from the repository root with a display available, e.g.
+    xvfb-run python benchmarks/bench_open_file.py [size_mb ...]
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SIZES_MB = (1, 50, 500)
+
+
+def make_corpus(directory, size_mb):
+    path = os.path.join(directory, f'corpus_{size_mb}mb.txt')
+    line = 'the quick brown fox jumps over the lazy dog 0123456789\n'
+    with open(path, 'w') as f:
+        for _ in range(size_mb * 1024 * 1024 // len(line)):
+            f.write(line)
+    return path
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_case(path, mode):
+    import notepad
+    notepad.win.update()
+    started = time.perf_counter()
+    if mode == 'legacy':
+        text_area = notepad.new_file()
+        with open(path, 'r') as f:
+            text_area.insert(1.0, f.read())
+        notepad.win.update()
+        first_paint = total = time.perf_counter() - started
+    else:
+        text_area = notepad.load_file(path)
+        while text_area.load_stats['first_paint'] is None:
+            notepad.win.update()
+        notepad.win.update_idletasks()
+        first_paint = time.perf_counter() - started
+        while text_area.load_stats['total'] is None:
+            notepad.win.update()
+        total = time.perf_counter() - started
+    print(f'{first_paint:.3f} {total:.3f} {peak_rss_mb():.1f}')
+
+
+def main(sizes):
+    with tempfile.TemporaryDirectory() as directory:
+        for size_mb in sizes:
+            path = make_corpus(directory, size_mb)
+            for mode in ('legacy', 'streaming'):
+                output = subprocess.run([sys.executable, __file__, '--case', path, mode],
+                                        capture_output=True, text=True, check=True).stdout
+                first_paint, total, rss = output.split()[-3:]
+                print(f'{size_mb:>5} MB  {mode:<9}  first paint {float(first_paint):7.3f} s  '
+                      f'total {float(total):7.3f} s  peak RSS {float(rss):8.1f} MB')
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--case']:
+        run_case(sys.argv[2], sys.argv[3])
+    else:
+        main([int(size) for size in sys.argv[1:]] or SIZES_MB)
@@ -0,0 +1,99 @@
+"""PDF export throughput and peak RSS, old implementation against the new one.
+
+Each case runs in its own process so peak RSS is not shared between cases.
+No display is needed, the document is fed to the exporter the way the
+editor feeds it, one chunk of lines at a time. Run from the repository root:
+    python benchmarks/bench_pdf_export.py [lines]
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+LINES = 100_000
+CHUNK_LINES = 2000
+
+
+def document_lines(count):
+    for i in range(count):
+        if i % 10 == 0:
+            yield f'def function_{i}(argument, other={i}):  # ' + 'a long comment that needs wrapping ' * 3
+        else:
+            yield f'    return argument * other + {i}'
+
+
+def legacy_export(path, count):
+    # The previous implementation, kept here as the baseline
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+    pdf_canvas = canvas.Canvas(path, pagesize=letter)
+    text = '\n'.join(document_lines(count)) + '\n'
+    pdf_canvas.setFont("Helvetica", 12)
+    y = 750
+    pages = 1
+    for line in text.split('\n'):
+        if y < 50:
+            pdf_canvas.showPage()
+            pages += 1
+            y = 750
+            pdf_canvas.setFont("Helvetica", 12)
+        pdf_canvas.drawString(72, y, line)
+        y -= 15
+    pdf_canvas.save()
+    return pages
+
+
+def engine_export(path, count, colors):
+    import pdf_export
+    lexer = style = None
+    if colors:
+        from pygments.lexers import PythonLexer
+        from pygments.styles import get_style_by_name
+        lexer, style = PythonLexer(), get_style_by_name('default')
+    export = pdf_export.PdfExport(path, line_numbers=colors, lexer=lexer, style=style, line_count=count)
+    chunk = []
+    for line in document_lines(count):
+        chunk.append(line)
+        if len(chunk) == CHUNK_LINES:
+            export.put('\n'.join(chunk))
+            chunk = []
+    export.put('\n'.join(chunk))
+    export.put(None)
+    while not export.done:
+        time.sleep(0.01)
+    if export.error:
+        raise export.error
+    return export.pages
+
+
+def run_case(mode, count):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'export.pdf')
+        started = time.perf_counter()
+        if mode == 'legacy':
+            pages = legacy_export(path, count)
+        else:
+            pages = engine_export(path, count, mode == 'colours')
+        elapsed = time.perf_counter() - started
+    print(f'{pages} {elapsed:.3f} {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f}')
+
+
+def main(count):
+    for mode in ('legacy', 'engine', 'colours'):
+        output = subprocess.run([sys.executable, __file__, '--case', mode, str(count)],
+                                capture_output=True, text=True, check=True).stdout
+        pages, elapsed, rss = output.split()[-3:]
+        pages, elapsed = int(pages), float(elapsed)
+        print(f'{count} lines  {mode:<7}  {pages:6d} pages  {elapsed:7.2f} s  '
+              f'{pages / elapsed:8.1f} pages/s  peak RSS {float(rss):8.1f} MB')
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--case']:
+        run_case(sys.argv[2], int(sys.argv[3]))
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else LINES)
@@ -0,0 +1,50 @@
+"""Cost of the perf instrumentation hooks.
+
+Times a trivial function called plainly, through a perf.timed wrapper with
+recording off and on, and inside a perf.span block. No display is needed.
+Run from the repository root:
+    python benchmarks/bench_perf_overhead.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import perf
+
+CALLS = 1_000_000
+
+
+def work(value):
+    return value + 1
+
+
+timed_work = perf.timed('work')(work)
+
+
+def measure(call):
+    started = time.perf_counter()
+    for value in range(CALLS):
+        call(value)
+    return (time.perf_counter() - started) / CALLS * 1e9
+
+
+def in_span(value):
+    with perf.span('work'):
+        return work(value)
+
+
+def main():
+    plain = measure(work)
+    print(f"plain call             {plain:7.1f} ns")
+    for enabled in (False, True):
+        perf.enabled = enabled
+        perf.clear()
+        state = "on " if enabled else "off"
+        print(f"timed, recording {state}   {measure(timed_work) - plain:7.1f} ns extra")
+        print(f"span, recording {state}    {measure(in_span) - plain:7.1f} ns extra")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Replace-all time and peak RSS on a large buffer, old path against new.
+
+Each case runs in its own process so peak RSS is not shared between cases.
+Run from the repository root with a display available, e.g.
+    xvfb-run python benchmarks/bench_replace_all.py [size_mb]
+"""
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SIZE_MB = 50
+
+
+def build_document(size_mb):
+    # Roughly 1% of the lines contain the search term
+    lines = []
+    line = 'the quick brown fox jumps over the lazy dog {}\n'
+    for i in range(size_mb * 1024 * 1024 // len(line)):
+        lines.append(line.format('NEEDLE' if i % 100 == 0 else i))
+    return ''.join(lines)
+
+
+def run_case(mode, size_mb):
+    import notepad
+    from tkinter import END
+    text_area = notepad.new_file()
+    text_area.insert('1.0', build_document(size_mb))
+    notepad.win.update()
+    started = time.perf_counter()
+    if mode == 'legacy':
+        content = text_area.get(1.0, END)
+        text_area.delete(1.0, END)
+        text_area.insert(1.0, content.replace('NEEDLE', 'PIN'))
+    else:
+        pattern = notepad.search_engine.compile_pattern('NEEDLE')
+        notepad.replace_all(text_area, pattern, 'PIN')
+    notepad.win.update_idletasks()
+    elapsed = time.perf_counter() - started
+    print(f'{elapsed:.3f} {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f}')
+
+
+def main(size_mb):
+    for mode in ('legacy', 'engine'):
+        output = subprocess.run([sys.executable, __file__, '--case', mode, str(size_mb)],
+                                capture_output=True, text=True, check=True).stdout
+        elapsed, rss = output.split()[-2:]
+        print(f'{size_mb} MB  {mode:<6}  replace all {float(elapsed):7.3f} s  peak RSS {float(rss):8.1f} MB')
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--case']:
+        run_case(sys.argv[2], int(sys.argv[3]))
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else SIZE_MB)
@@ -0,0 +1,56 @@
+"""Time to restore a crashed session from the recovery journals.
+
+Builds a session of journaled tabs backed by large files, each with a batch
+of unsaved edits, then times restore_session. Run from the repository root
+with a display available, e.g.
+    xvfb-run python benchmarks/bench_session_restore.py [tabs] [size_mb]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import notepad
+import journal
+
+TABS = 20
+SIZE_MB = 2
+EDITS = 1000
+
+
+def build_session(directory, tabs, size_mb):
+    line = 'the quick brown fox jumps over the lazy dog 0123456789\n'
+    for number in range(tabs):
+        path = os.path.join(directory, f'file_{number}.txt')
+        with open(path, 'w') as f:
+            f.write(line * (size_mb * 1024 * 1024 // len(line)))
+        log = journal.Journal(notepad.JOURNAL_DIR)
+        log.rebase_on_file(path, 'utf-8', meta={'title': os.path.basename(path), 'path': path})
+        for edit in range(EDITS):
+            log.record((edit + 1, 0), (edit + 1, 0), 'typed ')
+        log.flush({'title': os.path.basename(path), 'path': path, 'cursor': f'{EDITS}.0', 'view': 0.0})
+    journal.wait()
+
+
+def main(tabs, size_mb):
+    with tempfile.TemporaryDirectory() as directory:
+        notepad.JOURNAL_DIR = os.path.join(directory, 'journal')
+        build_session(directory, tabs, size_mb)
+        notepad.win.update()
+
+        started = time.perf_counter()
+        restored = notepad.restore_session()
+        notepad.win.update()
+        elapsed = time.perf_counter() - started
+        # Only the tab on screen is built, the others start hibernated
+        awake = sum(tab.text_area is not None for tab in notepad.tabs.values())
+        memory = sum(map(notepad.tab_memory, notepad.tabs.values())) / (1024 * 1024)
+        print(f"{restored} tabs of {size_mb} MB restored in {elapsed:.3f} s, "
+              f"{awake} awake, {memory:.1f} MB estimated")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else TABS,
+         int(sys.argv[2]) if len(sys.argv) > 2 else SIZE_MB)
@@ -0,0 +1,68 @@
+"""Cold and warm start time-to-interactive of the editor.
+
+Time-to-interactive is measured from launching the interpreter until the
+window is drawn and the deferred startup work has run. Cold starts use an
+empty bytecode cache so every module is compiled again, warm starts reuse
+it. Run from the repository root with a display available, e.g.
+    xvfb-run python benchmarks/bench_startup.py [runs]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNS = 10
+
+
+def child():
+    sys.path.insert(0, ROOT)
+    started = time.perf_counter()
+    import notepad
+    imported = time.perf_counter() - started
+
+    def ready():
+        notepad.win.update_idletasks()
+        print(f'{imported:.6f}', flush=True)
+        notepad.win.destroy()
+
+    # Queued ahead of finish_startup, so ready runs in the idle pass after it
+    notepad.win.after_idle(lambda: notepad.win.after_idle(ready))
+    notepad.main()
+
+
+def launch(env):
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, __file__, '--child'], env=env, cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    return time.perf_counter() - started, float(output.split()[-1])
+
+
+def report(label, samples):
+    total = sorted(s[0] * 1000 for s in samples)
+    imports = sorted(s[1] * 1000 for s in samples)
+    print(f"{label}  time-to-interactive median {statistics.median(total):8.1f} ms  "
+          f"max {total[-1]:8.1f} ms  import notepad median {statistics.median(imports):7.1f} ms")
+
+
+def main(runs):
+    env = dict(os.environ)
+    cold = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as cache:
+            cold.append(launch(dict(env, PYTHONPYCACHEPREFIX=cache)))
+    report('cold', cold)
+
+    with tempfile.TemporaryDirectory() as cache:
+        env['PYTHONPYCACHEPREFIX'] = cache
+        launch(env)
+        report('warm', [launch(env) for _ in range(runs)])
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        child()
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else RUNS)
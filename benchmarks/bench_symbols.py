@@ -0,0 +1,117 @@
+"""Speed of the symbol index behind the outline and Go To Symbol.
+
+Builds a Python document of CLASSES classes with METHODS methods each, so
+about 100,000 symbols by default, and times indexing it from scratch,
+making a table, fuzzy lookups of different kinds, an edit inside a method
+and one adding lines near the top, then writing and reading the on-disk
+cache. A lookup has to come back within a frame (16 ms). No display is
+needed. Run from the repository root:
+    python benchmarks/bench_symbols.py [--classes 20000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pygments.lexers import PythonLexer
+
+import document
+import symbols
+
+METHODS = 4
+QUERIES = ('h', 'handler', 'render_', 'widget1234', 'rndrwdgt', 'zzzz', 'cls_77_rnd')
+ROUNDS = 20
+FRAME_MS = 16
+
+
+def build(classes):
+    parts = []
+    for number in range(classes):
+        parts.append(f"class Widget{number}(Base):\n"
+                     f"    '''Widget number {number}.'''\n\n"
+                     f"    def __init__(self, parent):\n"
+                     f"        super().__init__(parent)\n"
+                     f"        self.value = {number}\n\n"
+                     f"    def render_widget_{number}(self):\n"
+                     f"        return self.value * 2\n\n"
+                     f"    def handle_event_{number % 97}(self, event):\n"
+                     f"        return event\n\n"
+                     f"    def cls_{number % 100}_resize(self, width, height):\n"
+                     f"        pass\n\n\n")
+    return ''.join(parts)
+
+
+def index_document(lexer, doc):
+    started = time.perf_counter()
+    index = symbols.Symbols(lexer, doc.line_count)
+    while not index.run(doc):
+        pass
+    return index, (time.perf_counter() - started) * 1000
+
+
+def timed_edit(index, doc, line, column, text, table):
+    started = time.perf_counter()
+    offset = doc.offset(line, column)
+    doc.insert(offset, text)
+    end = (line + text.count('\n'), column + len(text) if '\n' not in text else len(text) - text.rfind('\n') - 1)
+    index.note_edit((line, column), (line, column), end)
+    while not index.run(doc.snapshot()):
+        pass
+    table = index.table(table)
+    return table, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the symbol index")
+    parser.add_argument('--classes', type=int, default=20000)
+    args = parser.parse_args()
+
+    lexer = PythonLexer()
+    doc = document.Document(build(args.classes))
+    index, build_ms = index_document(lexer, doc)
+    started = time.perf_counter()
+    table = index.table()
+    table_ms = (time.perf_counter() - started) * 1000
+    assert len(table) == args.classes * (1 + METHODS)
+
+    print(f"{doc.line_count} lines, {len(table)} symbols")
+    print(f"index from scratch {build_ms:10.1f} ms")
+    print(f"make table         {table_ms:10.1f} ms")
+    worst = 0
+    for query in QUERIES:
+        times = []
+        for _ in range(ROUNDS):
+            started = time.perf_counter()
+            found = table.find(query)
+            times.append((time.perf_counter() - started) * 1000)
+        times.sort()
+        worst = max(worst, times[-1])
+        print(f"find {query!r:14}{times[len(times) // 2]:10.2f} ms p50{times[-1]:8.2f} ms max  {len(found)} found")
+
+    table, typing_ms = timed_edit(index, doc, doc.line_count // 2 + 4, 8, 'x', table)
+    print(f"edit in a method   {typing_ms:10.2f} ms  reshaped {table.reshaped}")
+    table, lines_ms = timed_edit(index, doc, 3, 0, 'def added():\n    pass\n\n', table)
+    print(f"add a function     {lines_ms:10.2f} ms  reshaped {table.reshaped}")
+    assert index.symbols == index_document(lexer, doc)[0].symbols
+
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot = doc.snapshot()
+        started = time.perf_counter()
+        path = os.path.join(directory, symbols.content_key(lexer, snapshot))
+        hashed = time.perf_counter()
+        index.save(path)
+        saved = time.perf_counter()
+        loaded = symbols.Symbols.load(path, lexer, snapshot.line_count)
+        done = time.perf_counter()
+        assert loaded is not None and loaded.symbols == index.symbols and not loaded.busy
+        print(f"hash text          {(hashed - started) * 1000:10.1f} ms")
+        print(f"save cache         {(saved - hashed) * 1000:10.1f} ms  {os.path.getsize(path) / 1024:.0f} KB")
+        print(f"load cache         {(done - saved) * 1000:10.1f} ms")
+    print(f"slowest lookup {worst:.2f} ms, {'within' if worst <= FRAME_MS else 'over'} a {FRAME_MS} ms frame")
+
+
+if __name__ == "__main__":
+    main()
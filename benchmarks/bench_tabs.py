@@ -0,0 +1,58 @@
+"""Cost of whole-editor operations with many tabs open.
+
+Times switching the theme, toggling line numbers and looking up the current
+tab with 10, 100 and 500 tabs. Run from the repository root with a display
+available, e.g.
+    xvfb-run python benchmarks/bench_tabs.py
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import notepad
+
+TAB_COUNTS = (10, 100, 500)
+REPEATS = 20
+
+
+def median_ms(operation):
+    samples = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        operation()
+        notepad.win.update_idletasks()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def toggle_theme():
+    notepad.set_theme('dark' if notepad.current_theme == 'light' else 'light')
+
+
+def toggle_line_numbers():
+    notepad.show_line_numbers = not notepad.show_line_numbers
+    notepad.apply_line_numbers()
+
+
+def main():
+    notepad.win.update()
+    for count in TAB_COUNTS:
+        while len(notepad.tabs) < count:
+            notepad.new_file().insert('1.0', 'benchmark line\n' * 100)
+        notepad.win.update()
+        theme = median_ms(toggle_theme)
+        numbers = median_ms(toggle_line_numbers)
+        lookup = median_ms(notepad.get_current_text_area)
+        print(f"{count:>4} tabs  theme {theme:8.2f} ms  line numbers {numbers:8.2f} ms  "
+              f"current tab {lookup * 1000:7.2f} us")
+    for tab in list(notepad.tabs.values()):
+        if tab.text_area.journal is not None:
+            tab.text_area.journal.discard()
+    notepad.journal.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Memory and latency of the undo history on documents of different sizes.
+
+For every size a document is built and edited like a session would:
+REPLACE_ALLS replace alls of MATCHES matches each, then a run of typing. The
+history's memory is printed next to the document size. Undo and redo of the
+typing are timed, applying the deltas to the document the way the editor
+applies them to the widget, and so is undoing everything afterwards. The
+same is then done with a cap small enough to spill most steps to disk. No
+display is needed. Run from the repository root:
+    python benchmarks/bench_undo.py [--sizes 1,10,100] (megabytes)
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import document
+import undo_history
+
+LINE = 'the quick brown fox jumps over the lazy dog 0123456789\n'
+TYPED = 2000
+REPLACE_ALLS = 10
+MATCHES = 1000
+ROUNDS = 50
+MB = 1024 * 1024
+
+
+def edit(doc, history, line, column, old, new):
+    offset = doc.offset(line, column)
+    history.record((line, column), doc.slice(offset, offset + len(old)), new)
+    doc.replace(offset, offset + len(old), new)
+
+
+def apply(doc, deltas):
+    for line, column, old, new in deltas:
+        offset = doc.offset(line, column)
+        doc.replace(offset, offset + len(old), new)
+
+
+def measure(size_mb, budget):
+    rng = random.Random(0)
+    lines = size_mb * MB // len(LINE)
+    doc = document.Document(LINE * lines)
+    history = undo_history.History(budget)
+
+    for _ in range(REPLACE_ALLS):
+        history.begin_step()
+        for match_line in sorted(rng.sample(range(1, lines + 1), MATCHES), reverse=True):
+            edit(doc, history, match_line, 4, 'quick', 'slow')
+        history.end_step()
+    line = lines // 2
+    for column in range(TYPED):
+        edit(doc, history, line, column, '', 'x')
+    memory, disk = history.size, history.spill_size
+
+    undo_ms, redo_ms = [], []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        apply(doc, history.undo())
+        undo_ms.append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        apply(doc, history.redo())
+        redo_ms.append((time.perf_counter() - started) * 1000)
+    # All the way back, through the spilled steps
+    started = time.perf_counter()
+    steps = 0
+    while True:
+        deltas = history.undo()
+        if deltas is None:
+            break
+        apply(doc, deltas)
+        steps += 1
+    back_ms = (time.perf_counter() - started) * 1000
+    assert doc.slice(0, len(LINE) * 2) == LINE * 2 and steps == REPLACE_ALLS + 1
+
+    undo_ms.sort()
+    redo_ms.sort()
+    print(f"{size_mb:6} MB{memory / MB:11.2f}{disk / MB:10.2f}"
+          f"{undo_ms[len(undo_ms) // 2]:10.3f}{redo_ms[len(redo_ms) // 2]:10.3f}{back_ms / steps:14.3f}")
+    history.discard()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the undo history")
+    parser.add_argument('--sizes', default='1,10,100')
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    header = f"{'document':9}{'memory MB':>11}{'disk MB':>10}{'undo ms':>10}{'redo ms':>10}{'back ms/step':>14}"
+    print(f"{REPLACE_ALLS} replace alls of {MATCHES} matches, then {TYPED} typed characters")
+    print(header)
+    for size_mb in sizes:
+        measure(size_mb, undo_history.Budget(64 * MB, 256 * MB))
+    print("with a 64 KB cap, spilling to disk")
+    print(header)
+    for size_mb in sizes:
+        measure(size_mb, undo_history.Budget(64 * 1024, 256 * MB))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Synthetic files for the benchmark suite.
+
+generate(kind, size, directory) writes a file of about size bytes and
+returns its path, reusing the file when an earlier run already wrote it.
+The content only depends on the kind, so runs on different machines read
+the same bytes. Kinds:
+    text      prose-like lines
+    python    functions and classes
+    json      pretty printed records
+    longline  minified JSON on a single line
+Files are written a block at a time, so even 1 GB ones never have to fit in
+memory as a whole. To fill a directory ahead of a run:
+    python benchmarks/corpus.py DIRECTORY [--kinds text,json] [size ...]
+"""
+import argparse
+import json
+import os
+import random
+
+KINDS = {'text': '.txt', 'python': '.py', 'json': '.json', 'longline': '.min.json'}
+UNITS = {'GB': 1024 ** 3, 'MB': 1024 ** 2, 'KB': 1024, 'B': 1}
+BLOCK_BYTES = 1024 * 1024  # generated once and written repeatedly for large files
+# Text wrapped around the pieces, the closing {} keeps the last comma valid
+HEADS = {'json': '[\n', 'longline': '['}
+TAILS = {'json': '{}\n]\n', 'longline': '{}]'}
+
+WORDS = ('the', 'quick', 'brown', 'fox', 'jumps', 'over', 'lazy', 'dog', 'value', 'editor',
+         'buffer', 'line', 'search', 'window', 'theme', 'number', 'file', 'save', 'open', 'tab',
+         'text', 'widget', 'event', 'loop', 'chunk', 'index', 'token', 'style', 'page', 'export')
+
+
+def parse_size(text):
+    # '10MB' -> 10485760
+    text = text.strip().upper()
+    for unit, factor in UNITS.items():
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * factor)
+    return int(text)
+
+
+def format_size(size):
+    for unit, factor in UNITS.items():
+        if size >= factor and size % factor == 0:
+            return f'{size // factor}{unit}'
+    return f'{size}B'
+
+
+def words(rng, count):
+    return ' '.join(rng.choice(WORDS) for _ in range(count))
+
+
+def record(rng, number):
+    return {'id': number, 'name': words(rng, 2), 'value': rng.randint(0, 10 ** 6),
+            'tags': [rng.choice(WORDS) for _ in range(3)], 'active': rng.random() < 0.5}
+
+
+def pieces(kind, rng):
+    # Endless stream of the pieces a file of kind is made of
+    number = 0
+    while True:
+        number += 1
+        if kind == 'text':
+            yield words(rng, rng.randint(4, 16)).capitalize() + '.\n'
+        elif kind == 'python':
+            name = f'{rng.choice(WORDS)}_{number}'
+            yield (f'class {name.title().replace("_", "")}:\n'
+                   f'    """{words(rng, 8).capitalize()}."""\n\n'
+                   f'    def {name}(self, value, count={rng.randint(0, 99)}):\n'
+                   f'        # {words(rng, 6)}\n'
+                   f'        result = [value * i for i in range(count) if i % {rng.randint(2, 9)}]\n'
+                   f'        return {{"{rng.choice(WORDS)}": result, "total": sum(result)}}\n\n\n')
+        elif kind == 'json':
+            yield json.dumps(record(rng, number), indent=2) + ',\n'
+        else:
+            yield json.dumps(record(rng, number), separators=(',', ':')) + ','
+
+
+def generate(kind, size, directory):
+    path = os.path.join(directory, f'{kind}_{format_size(size)}{KINDS[kind]}')
+    if os.path.exists(path):
+        return path
+    os.makedirs(directory, exist_ok=True)
+
+    head, tail = HEADS.get(kind, ''), TAILS.get(kind, '')
+    budget = size - len(head) - len(tail)
+    stream = pieces(kind, random.Random(kind))
+    block = []
+    block_size = 0
+    while block_size < min(BLOCK_BYTES, budget):
+        piece = next(stream)
+        block.append(piece)
+        block_size += len(piece)
+    block = ''.join(block)
+
+    # Written under a temporary name, so an interrupted run is not reused
+    part_path = path + '.part'
+    with open(part_path, 'w', encoding='ascii', newline='\n') as f:
+        f.write(head)
+        written = 0
+        while written + len(block) <= budget:
+            f.write(block)
+            written += len(block)
+        for piece in stream:
+            if written + len(piece) > budget:
+                break
+            f.write(piece)
+            written += len(piece)
+        f.write(tail)
+    os.replace(part_path, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write the benchmark corpus")
+    parser.add_argument('directory')
+    parser.add_argument('sizes', nargs='*', default=['1KB', '1MB', '10MB'])
+    parser.add_argument('--kinds', default=','.join(KINDS))
+    args = parser.parse_args()
+    for kind in args.kinds.split(','):
+        for size in args.sizes:
+            print(generate(kind, parse_size(size), args.directory))
+
+
+if __name__ == "__main__":
+    main()
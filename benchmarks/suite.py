@@ -0,0 +1,474 @@
+"""Scenario benchmarks of the real editor, headless under Xvfb.
+
+Each scenario opens a copy of a synthetic file (see corpus.py) in the
+editor and drives it the way a user would: opening, typing bursts, find
+all, replace all, pasting, syntax highlighting, saving, auto-save, PDF
+export and theme switching. Every scenario runs in its own process from an empty
+working directory, so Tk state, settings and peak memory never carry over.
+When there is no display an Xvfb server is started for the run.
+
+Results are written as JSON with latency percentiles, throughput and peak
+RSS per scenario, file kind and size. compare flags every figure that got
+worse than a stored baseline by more than the threshold and exits with
+status 1 when there is one. Run from the repository root, e.g.
+    python benchmarks/suite.py run --output baseline.json
+    python benchmarks/suite.py run --sizes 1KB,1MB,100MB,1GB --kinds text,longline --scenarios open,typing
+    python benchmarks/suite.py run --baseline baseline.json
+    python benchmarks/suite.py compare baseline.json results.json
+"""
+import argparse
+import atexit
+import json
+import math
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import corpus
+import file_loader
+
+SCENARIOS = ('open', 'typing', 'find_all', 'replace_all', 'paste', 'highlight', 'save', 'auto_save',
+             'pdf_export', 'theme')
+DEFAULT_SIZES = '1KB,1MB,10MB'
+REPEAT = 5  # samples per scenario, typing takes KEYSTROKES instead
+KEYSTROKES = 200
+SCENARIO_TIMEOUT = 600  # seconds before a scenario process is killed
+# Larger files are skipped by the scenarios that would take minutes on them
+MAX_BYTES = {'highlight': 100 * 1024 * 1024, 'pdf_export': 16 * 1024 * 1024}
+SEARCH_WORD = 'value'  # in every kind of corpus file
+# Figures compared against a baseline, with 1 when higher is worse
+METRICS = {'p50_ms': 1, 'p95_ms': 1, 'throughput_mb_s': -1, 'peak_rss_mb': 1}
+THRESHOLD = 0.10  # relative change counted as a regression
+NOISE_MS = 1.0  # latency changes smaller than this are never flagged
+NOISE_MB = 5.0  # same for memory
+
+
+# Scenario side, runs inside the child process with the editor imported
+
+def pump(done, timeout=SCENARIO_TIMEOUT):
+    # Run the event loop until done() holds
+    deadline = time.perf_counter() + timeout
+    while not done():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("scenario did not finish")
+        notepad.win.update()
+        time.sleep(0.0005)
+
+
+def loaded(text_area):
+    if hasattr(text_area, 'huge_index'):
+        return text_area.huge_index.done
+    return text_area.load_stats['total'] is not None
+
+
+def open_tab(path):
+    notepad.open_path(path)
+    text_area = notepad.get_current_text_area()
+    pump(lambda: loaded(text_area))
+    notepad.win.update()
+    return text_area
+
+
+def flush_edit_jobs(text_area):
+    # Run the debounced edit jobs now instead of waiting for their timer
+    tab = text_area.tab
+    if tab.refresh_after_id is not None:
+        notepad.win.after_cancel(tab.refresh_after_id)
+        notepad.run_edit_jobs(text_area)
+    notepad.win.update_idletasks()
+
+
+def timed(action):
+    started = time.perf_counter()
+    action()
+    return (time.perf_counter() - started) * 1000
+
+
+def scenario_open(path, repeat):
+    samples = []
+    first_paint = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        text_area = open_tab(path)
+        samples.append((time.perf_counter() - started) * 1000)
+        if not hasattr(text_area, 'huge_index'):
+            first_paint.append(text_area.load_stats['first_paint'] * 1000)
+        notepad.close_tab(notepad.notebook.index('current'))
+        notepad.win.update()
+    extra = {'first_paint_p50_ms': percentile(sorted(first_paint), 0.5)} if first_paint else {}
+    return samples, os.path.getsize(path) * repeat, extra
+
+
+def scenario_typing(text_area, path, repeat):
+    last_line = notepad.parse_index(text_area.index('end-1c'))[0]
+    text_area.mark_set('insert', f'{max(last_line // 2, 1)}.0')
+    text_area.see('insert')
+    text_area.focus_force()
+    notepad.win.update()
+
+    def keystroke(char):
+        text_area.insert('insert', char)
+        text_area.see('insert')
+        flush_edit_jobs(text_area)
+
+    # Words with a newline now and then, like someone typing prose
+    burst = ('typing burst ' * (KEYSTROKES // 13 + 1))[:KEYSTROKES]
+    samples = [timed(lambda: keystroke('\n' if i % 40 == 39 else char)) for i, char in enumerate(burst)]
+    return samples, None, {}
+
+
+def scenario_find_all(text_area, path, repeat):
+    pattern = notepad.search_engine.compile_pattern(SEARCH_WORD)
+    samples = []
+    found = []
+    for _ in range(repeat):
+        finished = []
+        started = time.perf_counter()
+        notepad.start_search(text_area, pattern, on_done=finished.append)
+        pump(lambda: finished)
+        samples.append((time.perf_counter() - started) * 1000)
+        found.append(len(finished[0]))
+    return samples, os.path.getsize(path) * repeat, {'matches': found[0]}
+
+
+def scenario_replace_all(text_area, path, repeat):
+    samples = []
+    # Alternate between both spellings so every pass replaces the same matches
+    for number in range(repeat):
+        old, new = (SEARCH_WORD, SEARCH_WORD.upper()) if number % 2 == 0 else (SEARCH_WORD.upper(), SEARCH_WORD)
+        pattern = notepad.search_engine.compile_pattern(old)
+
+        def replace():
+            notepad.replace_all(text_area, pattern, new)
+            flush_edit_jobs(text_area)
+
+        samples.append(timed(replace))
+    return samples, os.path.getsize(path) * repeat, {}
+
+
+def scenario_paste(text_area, path, repeat):
+    # The whole file pasted into its middle and undone again. The longest
+    # pass of the event loop meanwhile is how long a keystroke would wait.
+    text = text_area.tab.document.text()
+    middle = max(notepad.document_position(text_area, 'end-1c')[0] // 2, 1)
+    samples = []
+    longest = []
+    for _ in range(repeat):
+        text_area.mark_set('insert', notepad.widget_index(text_area, middle, 0))
+        started = time.perf_counter()
+        passes = [timed(lambda: notepad.insert_text(text_area, 'insert', text))]
+        while text_area.large_insert is not None:
+            passes.append(timed(notepad.win.update))
+        flush_edit_jobs(text_area)
+        samples.append((time.perf_counter() - started) * 1000)
+        longest.append(max(passes))
+        notepad.step_history(text_area)
+        flush_edit_jobs(text_area)
+    return samples, len(text) * repeat, {'longest_pass_p50_ms': percentile(sorted(longest), 0.5)}
+
+
+def scenario_highlight(text_area, path, repeat):
+    lexer = notepad.guess_lexer(text_area)
+    samples = []
+    first_viewport = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        notepad.start_highlighting(text_area, lexer)
+        notepad.win.update_idletasks()
+        first_viewport.append((time.perf_counter() - started) * 1000)
+        pump(lambda: not text_area.highlighter.busy)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples, os.path.getsize(path) * repeat, {
+        'first_viewport_p50_ms': percentile(sorted(first_viewport), 0.5)}
+
+
+def scenario_save(text_area, path, repeat):
+    tab = text_area.tab
+    samples = [timed(lambda: notepad.save_tab(tab, path)) for _ in range(repeat)]
+    return samples, os.path.getsize(path) * repeat, {}
+
+
+def scenario_auto_save(text_area, path, repeat):
+    tab = text_area.tab
+    samples = []
+    for number in range(repeat):
+        # Each pass writes new content, an unchanged one would be skipped
+        text_area.insert('1.0', str(number % 10))
+        text_area.edit_modified(True)
+        started = time.perf_counter()
+        notepad.auto_save_tab(tab)
+        _, _, error = notepad.auto_saver.results.get(timeout=SCENARIO_TIMEOUT)
+        if error is not None:
+            raise error
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples, os.path.getsize(path) * repeat, {}
+
+
+def scenario_pdf_export(text_area, path, repeat):
+    import pdf_export
+    last_line = notepad.document_position(text_area, 'end-1c')[0]
+    samples = []
+    pages = 0
+    for _ in range(repeat):
+        export = pdf_export.PdfExport(path + '.pdf')
+        started = time.perf_counter()
+        # Fed in chunks from the buffer like the Save As PDF window does
+        for first in range(1, last_line + 1, notepad.PDF_CHUNK_LINES):
+            export.put(notepad.get_lines(text_area, first, min(first + notepad.PDF_CHUNK_LINES - 1, last_line)),
+                       timeout=SCENARIO_TIMEOUT)
+        export.put(None, timeout=SCENARIO_TIMEOUT)
+        pump(lambda: export.done)
+        if export.error is not None:
+            raise export.error
+        samples.append((time.perf_counter() - started) * 1000)
+        pages = export.pages
+    return samples, os.path.getsize(path) * repeat, {'pages': pages}
+
+
+def scenario_theme(text_area, path, repeat):
+    samples = []
+    for _ in range(repeat):
+        for theme in ('dark', 'light'):
+            def switch():
+                notepad.set_theme(theme)
+                notepad.win.update_idletasks()
+            samples.append(timed(switch))
+    return samples, None, {}
+
+
+def run_scenario(name, source, repeat):
+    """Run one scenario on a copy of source and return its result."""
+    global notepad
+    import notepad
+
+    # Skipped before copying, a copy of a huge file alone takes a while
+    size = os.path.getsize(source)
+    if size > MAX_BYTES.get(name, size):
+        return {'skipped': f"files over {corpus.format_size(MAX_BYTES[name])} are not run"}
+    if (name != 'open' and size > notepad.huge_file_threshold_mb * 1024 * 1024
+            and not file_loader.detect_encoding(source).startswith(('utf-16', 'utf-32'))):
+        return {'skipped': "opened in the read-only huge file viewer"}
+
+    # The copy is edited and saved over, the corpus file never is
+    path = os.path.join(os.getcwd(), os.path.basename(source))
+    shutil.copyfile(source, path)
+    notepad.win.update()
+
+    if name == 'open':
+        samples, processed, extra = scenario_open(path, repeat)
+    else:
+        text_area = open_tab(path)
+        if hasattr(text_area, 'huge_index'):
+            return {'skipped': "opened in the read-only huge file viewer"}
+        scenario = globals()[f'scenario_{name}']
+        samples, processed, extra = scenario(text_area, path, repeat)
+    return summarize(samples, processed, extra)
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return (peak if sys.platform == 'darwin' else peak * 1024) / (1024 * 1024)
+
+
+def percentile(samples, fraction):
+    # Nearest rank of sorted samples
+    if not samples:
+        return None
+    return samples[min(len(samples) - 1, max(math.ceil(fraction * len(samples)) - 1, 0))]
+
+
+def summarize(samples, processed, extra):
+    samples = sorted(samples)
+    total_seconds = sum(samples) / 1000
+    result = {
+        'samples': len(samples),
+        'mean_ms': sum(samples) / len(samples),
+        'p50_ms': percentile(samples, 0.50),
+        'p95_ms': percentile(samples, 0.95),
+        'p99_ms': percentile(samples, 0.99),
+        'max_ms': samples[-1],
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    if processed is not None and total_seconds > 0:
+        result['throughput_mb_s'] = processed / (1024 * 1024) / total_seconds
+    result.update(extra)
+    return result
+
+
+# Runner side, never imports the editor itself
+
+def ensure_display():
+    # Use the display already there, otherwise start an Xvfb server
+    if os.environ.get('DISPLAY'):
+        return
+    xvfb = shutil.which('Xvfb')
+    if xvfb is None:
+        sys.exit("No display available and Xvfb is not installed")
+    for number in range(99, 199):
+        if os.path.exists(f'/tmp/.X{number}-lock'):
+            continue
+        server = subprocess.Popen([xvfb, f':{number}', '-screen', '0', '1280x1024x24', '-nolisten', 'tcp'],
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        for _ in range(100):
+            if os.path.exists(f'/tmp/.X11-unix/X{number}'):
+                os.environ['DISPLAY'] = f':{number}'
+                atexit.register(server.terminate)
+                return
+            if server.poll() is not None:
+                break
+            time.sleep(0.05)
+        server.terminate()
+    sys.exit("Could not start Xvfb")
+
+
+def run_child(name, path, repeat):
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            process = subprocess.run([sys.executable, os.path.abspath(__file__), 'scenario', name, path, str(repeat)],
+                                     cwd=directory, capture_output=True, text=True, timeout=SCENARIO_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            return {'error': f"timed out after {SCENARIO_TIMEOUT} s"}
+    lines = process.stdout.strip().splitlines()
+    if process.returncode != 0 or not lines:
+        error = process.stderr.strip().splitlines()
+        return {'error': error[-1] if error else f"exit status {process.returncode}"}
+    return json.loads(lines[-1])
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(args):
+    ensure_display()
+    sizes = [corpus.parse_size(size) for size in args.sizes.split(',')]
+    kinds = args.kinds.split(',')
+    scenarios = args.scenarios.split(',')
+    import tkinter
+    report = {
+        'meta': {
+            'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'tk': tkinter.TkVersion,
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+        },
+        'results': [],
+    }
+
+    for kind in kinds:
+        for size in sizes:
+            path = corpus.generate(kind, size, args.corpus)
+            for name in scenarios:
+                result = {'scenario': name, 'kind': kind, 'size': corpus.format_size(size)}
+                result.update(run_child(name, path, args.repeat))
+                report['results'].append(result)
+                print(describe(result), flush=True)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            return compare(json.load(f), report, args.threshold)
+    return 0
+
+
+def describe(result):
+    name = f"{result['scenario']:<12} {result['kind']:<9} {result['size']:>6}"
+    if 'skipped' in result:
+        return f"{name}  skipped: {result['skipped']}"
+    if 'error' in result:
+        return f"{name}  failed: {result['error']}"
+    throughput = result.get('throughput_mb_s')
+    throughput = f"{throughput:9.1f} MB/s" if throughput is not None else ' ' * 14
+    rss = result['peak_rss_mb']
+    rss = f"{rss:7.1f} MB peak" if rss is not None else ''
+    return (f"{name}  p50 {result['p50_ms']:9.2f} ms  p95 {result['p95_ms']:9.2f} ms  "
+            f"{throughput}  {rss}")
+
+
+def result_key(result):
+    return result['scenario'], result['kind'], result['size']
+
+
+def compare(baseline, current, threshold=THRESHOLD):
+    """Print every figure that changed by more than threshold, return 1 if
+    any of them got worse."""
+    previous = {result_key(result): result for result in baseline['results']}
+    regressions = 0
+    for result in current['results']:
+        old = previous.get(result_key(result))
+        if old is None or 'p50_ms' not in old or 'p50_ms' not in result:
+            continue
+        for metric, direction in METRICS.items():
+            before, after = old.get(metric), result.get(metric)
+            if not before or after is None:
+                continue
+            noise = NOISE_MB if metric.endswith('_mb') else NOISE_MS if metric.endswith('_ms') else 0
+            if abs(after - before) < noise:
+                continue
+            change = (after - before) / before
+            if abs(change) <= threshold:
+                continue
+            worse = change * direction > 0
+            regressions += worse
+            label = "REGRESSION" if worse else "improved"
+            print(f"{label:<10} {' '.join(result_key(result)):<30} {metric:<16} "
+                  f"{before:10.2f} -> {after:10.2f} ({change:+.0%})")
+    print(f"{regressions} regressions against the baseline" if regressions else "No regressions against the baseline")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the editor under a virtual display")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help="run the scenarios and write the results")
+    run_parser.add_argument('--sizes', default=DEFAULT_SIZES, help="comma separated, e.g. 1KB,1MB,1GB")
+    run_parser.add_argument('--kinds', default=','.join(corpus.KINDS))
+    run_parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    run_parser.add_argument('--repeat', type=int, default=REPEAT)
+    run_parser.add_argument('--corpus', default=os.path.join(tempfile.gettempdir(), 'notepad_bench_corpus'),
+                            help="where the generated files are kept between runs")
+    run_parser.add_argument('--output', default='bench_results.json')
+    run_parser.add_argument('--baseline', help="results file to compare against once done")
+    run_parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    compare_parser = commands.add_parser('compare', help="compare two results files")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    scenario_parser = commands.add_parser('scenario', help=argparse.SUPPRESS)
+    scenario_parser.add_argument('name', choices=SCENARIOS)
+    scenario_parser.add_argument('path')
+    scenario_parser.add_argument('repeat', type=int)
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        sys.exit(run(args))
+    if args.command == 'compare':
+        with open(args.baseline) as baseline, open(args.current) as current:
+            sys.exit(compare(json.load(baseline), json.load(current), args.threshold))
+    print(json.dumps(run_scenario(args.name, args.path, args.repeat)))
+
+
+if __name__ == "__main__":
+    main()
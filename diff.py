@@ -0,0 +1,267 @@
+"""Line diff for the split screen's compare mode.
+
+Lines are interned into integers first, so the diff itself only compares
+small ints. A region is trimmed of its common prefix and suffix, then split
+at anchors: lines that occur exactly once on each side, of which the
+longest chain in the same order on both sides is kept (patience diff). The
+gaps between anchors are diffed the same way, and a gap without anchors
+goes to Myers' algorithm in its linear-space form, searching from both
+ends for the middle snake. Myers gives up on a region once the edit script
+would pass MYERS_MAX_COST lines, the region is then reported as replaced
+whole, so files with nothing in common cannot take quadratic time.
+
+Hunks are (a_start, a_end, b_start, b_end) line ranges numbered from 0 and
+come out in order, so they can be shown while the rest is still being
+worked out. LineDiff keeps the lines and hunks of both sides and updates
+them after edits by diffing again only the region around the edited lines.
+"""
+from bisect import bisect_left
+from collections import Counter
+
+PATIENCE_MIN_LINES = 32  # smaller regions go straight to Myers
+MYERS_MAX_COST = 2000  # edit script length searched for before a region is replaced whole
+
+
+def unique_matches(a, b, a_lo, a_hi, b_lo, b_hi):
+    """(i, j) positions of lines occurring once in a[a_lo:a_hi] and once in
+    b[b_lo:b_hi], the longest chain of them in the same order on both sides."""
+    a_slice = a[a_lo:a_hi]
+    b_slice = b[b_lo:b_hi]
+    a_counts = Counter(a_slice)
+    b_counts = Counter(b_slice)
+    where = {line: i for i, line in enumerate(a_slice, a_lo)
+             if a_counts[line] == 1 and b_counts.get(line) == 1}
+    pairs = [(where[line], j) for j, line in enumerate(b_slice, b_lo) if line in where]
+
+    # Longest increasing run of i over pairs in j order, by patience sorting
+    tails = []  # smallest last i of a chain of each length
+    tail_pairs = []  # index in pairs of that last element
+    previous = []
+    for index, (i, _) in enumerate(pairs):
+        k = bisect_left(tails, i)
+        if k == len(tails):
+            tails.append(i)
+            tail_pairs.append(index)
+        else:
+            tails[k] = i
+            tail_pairs[k] = index
+        previous.append(tail_pairs[k - 1] if k else -1)
+    chain = []
+    index = tail_pairs[-1] if tail_pairs else -1
+    while index >= 0:
+        chain.append(pairs[index])
+        index = previous[index]
+    chain.reverse()
+    return chain
+
+
+def middle_snake(a, b, a_lo, a_hi, b_lo, b_hi, max_cost=MYERS_MAX_COST):
+    """Point (x, y) on an optimal edit path between a[a_lo:a_hi] and
+    b[b_lo:b_hi], where the region can be split in two. None when the path
+    is longer than max_cost in both directions together."""
+    n = a_hi - a_lo
+    m = b_hi - b_lo
+    limit = min((n + m + 1) // 2, max_cost)
+    v_offset = limit
+    v_length = 2 * limit + 2
+    forward = [-1] * v_length
+    backward = [-1] * v_length
+    forward[v_offset + 1] = backward[v_offset + 1] = 0
+    delta = n - m
+    odd = delta % 2 != 0
+    # Diagonals that ran off the grid are skipped from then on
+    k1_start = k1_end = k2_start = k2_end = 0
+    for d in range(limit):
+        for k1 in range(-d + k1_start, d + 1 - k1_end, 2):
+            k1_offset = v_offset + k1
+            if k1 == -d or (k1 != d and forward[k1_offset - 1] < forward[k1_offset + 1]):
+                x1 = forward[k1_offset + 1]
+            else:
+                x1 = forward[k1_offset - 1] + 1
+            y1 = x1 - k1
+            while x1 < n and y1 < m and a[a_lo + x1] == b[b_lo + y1]:
+                x1 += 1
+                y1 += 1
+            forward[k1_offset] = x1
+            if x1 > n:
+                k1_end += 2
+            elif y1 > m:
+                k1_start += 2
+            elif odd:
+                k2_offset = v_offset + delta - k1
+                if 0 <= k2_offset < v_length and backward[k2_offset] != -1:
+                    if x1 >= n - backward[k2_offset]:
+                        return a_lo + x1, b_lo + y1
+        for k2 in range(-d + k2_start, d + 1 - k2_end, 2):
+            k2_offset = v_offset + k2
+            if k2 == -d or (k2 != d and backward[k2_offset - 1] < backward[k2_offset + 1]):
+                x2 = backward[k2_offset + 1]
+            else:
+                x2 = backward[k2_offset - 1] + 1
+            y2 = x2 - k2
+            while x2 < n and y2 < m and a[a_hi - 1 - x2] == b[b_hi - 1 - y2]:
+                x2 += 1
+                y2 += 1
+            backward[k2_offset] = x2
+            if x2 > n:
+                k2_end += 2
+            elif y2 > m:
+                k2_start += 2
+            elif not odd:
+                k1_offset = v_offset + delta - k2
+                if 0 <= k1_offset < v_length and forward[k1_offset] != -1:
+                    x1 = forward[k1_offset]
+                    if x1 >= n - x2:
+                        return a_lo + x1, b_lo + x1 - (k1_offset - v_offset)
+    return None
+
+
+def _hunks(a, b, a_lo, a_hi, b_lo, b_hi):
+    # Regions still to diff, the next one in order last, with whether
+    # anchors are worth looking for in it
+    stack = [(a_lo, a_hi, b_lo, b_hi, True)]
+    while stack:
+        a_lo, a_hi, b_lo, b_hi, anchors = stack.pop()
+        while a_lo < a_hi and b_lo < b_hi and a[a_lo] == b[b_lo]:
+            a_lo += 1
+            b_lo += 1
+        while a_lo < a_hi and b_lo < b_hi and a[a_hi - 1] == b[b_hi - 1]:
+            a_hi -= 1
+            b_hi -= 1
+        if a_lo == a_hi or b_lo == b_hi:
+            if a_lo < a_hi or b_lo < b_hi:
+                yield a_lo, a_hi, b_lo, b_hi
+            continue
+
+        if anchors and a_hi - a_lo + b_hi - b_lo >= PATIENCE_MIN_LINES:
+            matches = unique_matches(a, b, a_lo, a_hi, b_lo, b_hi)
+            if matches:
+                regions = []
+                for i, j in matches:
+                    regions.append((a_lo, i, b_lo, j, True))
+                    a_lo, b_lo = i + 1, j + 1
+                regions.append((a_lo, a_hi, b_lo, b_hi, True))
+                stack.extend(reversed(regions))
+                continue
+
+        split = middle_snake(a, b, a_lo, a_hi, b_lo, b_hi)
+        if split is None or split in ((a_lo, b_lo), (a_hi, b_hi)):
+            yield a_lo, a_hi, b_lo, b_hi
+            continue
+        x, y = split
+        stack.append((x, a_hi, y, b_hi, False))
+        stack.append((a_lo, x, b_lo, y, False))
+
+
+def diff_region(a, b, a_lo, a_hi, b_lo, b_hi):
+    """Yield the hunks between a[a_lo:a_hi] and b[b_lo:b_hi] in order,
+    hunks that touch merged into one."""
+    pending = None
+    for hunk in _hunks(a, b, a_lo, a_hi, b_lo, b_hi):
+        if pending is not None and pending[1] == hunk[0] and pending[3] == hunk[2]:
+            pending = (pending[0], hunk[1], pending[2], hunk[3])
+            continue
+        if pending is not None:
+            yield pending
+        pending = hunk
+    if pending is not None:
+        yield pending
+
+
+def count_before(hunks, line, field, inclusive=False):
+    # Number of hunks whose hunk[field] is below line (or equal too), the
+    # fields of hunks only ever grow
+    low, high = 0, len(hunks)
+    while low < high:
+        middle = (low + high) // 2
+        value = hunks[middle][field]
+        if value < line or (inclusive and value == line):
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def corresponding_line(hunks, line, side):
+    """Line of the other side shown next to line, side 0 for a and 2 for b."""
+    other = 2 - side
+    i = count_before(hunks, line, side, inclusive=True)
+    if not i:
+        return line
+    hunk = hunks[i - 1]
+    if line < hunk[side + 1]:
+        return hunk[other] + min(line - hunk[side], max(hunk[other + 1] - hunk[other] - 1, 0))
+    return line - hunk[side + 1] + hunk[other + 1]
+
+
+class LineDiff:
+    """Diff of two texts split into lines, kept up to date through update()."""
+
+    def __init__(self, a_lines, b_lines):
+        self.ids = {}  # line -> its number
+        self.a = self._intern(a_lines)
+        self.b = self._intern(b_lines)
+        self.hunks = []
+
+    def _intern(self, lines):
+        ids = self.ids
+        return [ids.setdefault(line, len(ids)) for line in lines]
+
+    def run(self):
+        """Yield the hunks of the whole diff as they are found."""
+        self.hunks = []
+        for hunk in diff_region(self.a, self.b, 0, len(self.a), 0, len(self.b)):
+            self.hunks.append(hunk)
+            yield hunk
+
+    def _bounds(self, lo, hi, side):
+        """((run, a position), (run, a position)) around lines lo to hi of
+        side. Run r is the unchanged stretch before hunk r, positions are on
+        side a, and hunks touching the lines are taken in."""
+        hunks = self.hunks
+        first = count_before(hunks, lo, side + 1)
+        last = count_before(hunks, hi, side, inclusive=True)
+        if first < len(hunks):
+            lo = min(lo, hunks[first][side])
+        if last:
+            hi = max(hi, hunks[last - 1][side + 1])
+        if side:
+            lo -= self._offset(first)
+            hi -= self._offset(last)
+        return (first, lo), (last, hi)
+
+    def _offset(self, run):
+        # b line minus a line all through run
+        if not run:
+            return 0
+        hunk = self.hunks[run - 1]
+        return hunk[3] - hunk[1]
+
+    def update(self, a_edit, b_edit):
+        """Replace lines and diff the region around them again. An edit is
+        None or (first, end, lines): lines first to end, numbered before
+        the edit, became lines. Returns the region (a_start, a_end, b_start,
+        b_end) in the new numbering and its hunks."""
+        bounds = [self._bounds(edit[0], edit[1], side)
+                  for edit, side in ((a_edit, 0), (b_edit, 2)) if edit is not None]
+        (first, a_lo), _ = min(bounds)
+        _, (last, a_hi) = max(bounds, key=lambda bound: bound[1])
+        b_lo = a_lo + self._offset(first)
+        b_hi = a_hi + self._offset(last)
+
+        shifts = []
+        for edit, lines in ((a_edit, self.a), (b_edit, self.b)):
+            if edit is None:
+                shifts.append(0)
+                continue
+            start, end, new_lines = edit
+            lines[start:end] = self._intern(new_lines)
+            shifts.append(len(new_lines) - (end - start))
+        a_shift, b_shift = shifts
+
+        region = list(diff_region(self.a, self.b, a_lo, a_hi + a_shift, b_lo, b_hi + b_shift))
+        after = [(a0 + a_shift, a1 + a_shift, b0 + b_shift, b1 + b_shift)
+                 for a0, a1, b0, b1 in self.hunks[last:]]
+        # A new list each time, so a reader on another thread can keep the old one
+        self.hunks = self.hunks[:first] + region + after
+        return (a_lo, a_hi + a_shift, b_lo, b_hi + b_shift), region
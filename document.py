@@ -0,0 +1,276 @@
+"""Piece-table document model kept in step with the Text widget.
+
+The widget reports every edit through its edit hook and the Document
+applies it too, so readers (search, auto-save, the journal, export) can
+take a snapshot or a slice without copying the buffer out of Tk. Text lives
+in immutable buffers, the original text and one buffer per run of inserted
+text, and the document is a sequence of (buffer, start, end, newlines)
+pieces pointing into them. Pieces are kept in blocks with their character
+and newline totals, so an edit only touches one block and the block sums.
+Every buffer keeps the offsets of its line starts, so a line is found with
+binary searches.
+"""
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, chain
+
+SCAN_BLOCK = 16 * 1024 * 1024  # characters scanned at a time when indexing a buffer
+RUN_LIMIT = 4096  # longest typing run appended to a single buffer
+BLOCK_PIECES = 64  # a block is split in two once it holds twice as many pieces
+CHUNK_SIZE = 256 * 1024  # characters yielded at a time by chunks()
+PIECE_BYTES = 96  # rough size of one piece tuple
+
+
+def line_starts(text, base=0):
+    # Offsets just after every newline in text, shifted by base
+    starts = array('Q')
+    for block_start in range(0, len(text), SCAN_BLOCK):
+        parts = text[block_start:block_start + SCAN_BLOCK].split('\n')
+        if len(parts) > 1:
+            ends = accumulate(map((1).__add__, map(len, parts[:-1])), initial=base + block_start)
+            next(ends)
+            starts.extend(ends)
+    return starts
+
+
+def piece_length(piece):
+    return piece[2] - piece[1]
+
+
+class Snapshot:
+    """Read-only view of a document.
+
+    Buffers are never changed in place, a typing run only ever extends the
+    newest one, so a snapshot shares them with the document and only copies
+    the block lists.
+    """
+
+    def __init__(self, buffers, starts, blocks, block_chars, block_lines):
+        self.buffers = buffers
+        self.starts = starts
+        self.blocks = blocks
+        self.block_chars = block_chars
+        self.block_lines = block_lines
+        self._offsets = None  # document offset of every block
+        self._lines = None  # newlines before every block
+
+    def _sums(self):
+        if self._offsets is None:
+            self._offsets = list(accumulate(self.block_chars, initial=0))
+            self._lines = list(accumulate(self.block_lines, initial=0))
+        return self._offsets, self._lines
+
+    @property
+    def pieces(self):
+        return chain.from_iterable(self.blocks)
+
+    def __len__(self):
+        return self._sums()[0][-1]
+
+    @property
+    def line_count(self):
+        return self._sums()[1][-1] + 1
+
+    def locate(self, offset):
+        """(block, index, piece offset) of the piece holding offset, offsets
+        past the end give the last piece."""
+        offsets = self._sums()[0]
+        b = min(max(bisect_right(offsets, offset) - 1, 0), len(self.blocks) - 1)
+        block = self.blocks[b]
+        position = offsets[b]
+        for j, piece in enumerate(block):
+            length = piece_length(piece)
+            if offset < position + length or j == len(block) - 1:
+                return b, j, position
+            position += length
+
+    def line_offset(self, line):
+        # Document offset of the start of line, numbered from 1 like Tk
+        if line <= 1 or not self.blocks:
+            return 0
+        offsets, lines = self._sums()
+        wanted = line - 1  # newlines before the line
+        if wanted > lines[-1]:
+            return offsets[-1]
+        b = bisect_left(lines, wanted) - 1
+        position = offsets[b]
+        seen = lines[b]
+        for buffer, start, end, newlines in self.blocks[b]:
+            if seen + newlines >= wanted:
+                starts = self.starts[buffer]
+                line_start = starts[bisect_right(starts, start) + wanted - seen - 1]
+                return position + line_start - start
+            seen += newlines
+            position += end - start
+
+    def offset(self, line, column):
+        return self.line_offset(line) + column
+
+    def slice(self, start, end):
+        if end <= start or not self.blocks:
+            return ''
+        b, j, position = self.locate(start)
+        parts = []
+        for block in self.blocks[b:]:
+            for buffer, piece_start, piece_end, _ in block[j:]:
+                if position >= end:
+                    return ''.join(parts)
+                low = piece_start + max(start - position, 0)
+                high = piece_start + min(end - position, piece_end - piece_start)
+                parts.append(self.buffers[buffer][low:high])
+                position += piece_end - piece_start
+            j = 0
+        return ''.join(parts)
+
+    def get(self, start, end):
+        # Like Text.get with (line, column) positions
+        return self.slice(self.offset(*start), self.offset(*end))
+
+    def lines(self, first, last):
+        # Text of the inclusive line range, without the final newline
+        if last >= self.line_count:
+            end = len(self)
+        else:
+            end = self.line_offset(last + 1) - 1
+        return self.slice(self.line_offset(first), end)
+
+    def line(self, number):
+        return self.lines(number, number)
+
+    def chunks(self, size=CHUNK_SIZE):
+        for buffer, start, end, _ in self.pieces:
+            for low in range(start, end, size):
+                yield self.buffers[buffer][low:min(low + size, end)]
+
+    def text(self):
+        return ''.join(self.chunks())
+
+    def memory(self):
+        # Rough bytes held by the buffers, their line starts and the pieces
+        return (sum(map(sys.getsizeof, self.buffers))
+                + sum(len(starts) * starts.itemsize for starts in self.starts)
+                + sum(map(len, self.blocks)) * PIECE_BYTES)
+
+
+class Document(Snapshot):
+    """Mutable piece table, offsets count characters like Tk indices."""
+
+    def __init__(self, text=''):
+        super().__init__([], [], [], [], [])
+        self.run = None  # document offset where the current typing run continues
+        self.version = 0  # grows with every edit
+        if text:
+            self.insert(0, text)
+
+    def snapshot(self):
+        return Snapshot(self.buffers, self.starts, [list(block) for block in self.blocks],
+                        list(self.block_chars), list(self.block_lines))
+
+    def _count(self, buffer, start, end):
+        starts = self.starts[buffer]
+        return bisect_right(starts, end) - bisect_right(starts, start)
+
+    def _retotal(self, b):
+        block = self.blocks[b]
+        self.block_chars[b] = sum(map(piece_length, block))
+        self.block_lines[b] = sum(piece[3] for piece in block)
+
+    def _changed(self):
+        self._offsets = None
+        self._lines = None
+        self.version += 1
+
+    def _split_at(self, offset):
+        """Make offset a piece boundary and return (block, index) of the
+        piece starting there, index may be one past the end of the block."""
+        b, j, position = self.locate(offset)
+        block = self.blocks[b]
+        buffer, start, end, _ = block[j]
+        if offset <= position:
+            return b, j
+        if offset >= position + end - start:
+            return b, j + 1
+        middle = start + offset - position
+        block[j:j + 1] = [(buffer, start, middle, self._count(buffer, start, middle)),
+                          (buffer, middle, end, self._count(buffer, middle, end))]
+        return b, j + 1
+
+    def _rebalance(self, b):
+        block = self.blocks[b]
+        if len(block) > 2 * BLOCK_PIECES:
+            self.blocks[b:b + 1] = [block[:BLOCK_PIECES], block[BLOCK_PIECES:]]
+            self.block_chars[b:b + 1] = [0, 0]
+            self.block_lines[b:b + 1] = [0, 0]
+            self._retotal(b)
+            self._retotal(b + 1)
+        elif not block:
+            del self.blocks[b], self.block_chars[b], self.block_lines[b]
+
+    def insert(self, offset, text):
+        if not text:
+            return
+        if self.run == offset and self._extend_run(offset, text):
+            return
+
+        buffer = len(self.buffers)
+        self.buffers.append(text)
+        self.starts.append(line_starts(text))
+        piece = (buffer, 0, len(text), len(self.starts[buffer]))
+        if not self.blocks:
+            self.blocks.append([piece])
+            self.block_chars.append(0)
+            self.block_lines.append(0)
+            b = 0
+        else:
+            b, j = self._split_at(offset)
+            self.blocks[b].insert(j, piece)
+        self._retotal(b)
+        self._rebalance(b)
+        self._changed()
+        self.run = offset + len(text) if len(text) < RUN_LIMIT else None
+
+    def _extend_run(self, offset, text):
+        # Typing right after the last insert grows its buffer in place
+        b, j, position = self.locate(offset - 1)
+        buffer, start, end, newlines = self.blocks[b][j]
+        if buffer != len(self.buffers) - 1 or end != len(self.buffers[buffer]) \
+                or position + end - start != offset or end + len(text) > RUN_LIMIT:
+            return False
+        self.buffers[buffer] += text
+        added = line_starts(text, end)
+        self.starts[buffer].extend(added)
+        self.blocks[b][j] = (buffer, start, end + len(text), newlines + len(added))
+        self.block_chars[b] += len(text)
+        self.block_lines[b] += len(added)
+        self._changed()
+        self.run = offset + len(text)
+        return True
+
+    def delete(self, start, end):
+        if end <= start or not self.blocks:
+            return
+        self.run = None
+        first_block, first = self._split_at(start)
+        self._changed()
+        last_block, last = self._split_at(end)
+        self._changed()
+
+        if first_block == last_block:
+            del self.blocks[first_block][first:last]
+        else:
+            del self.blocks[first_block][first:]
+            del self.blocks[last_block][:last]
+            # Blocks in between are dropped whole
+            del self.blocks[first_block + 1:last_block]
+            del self.block_chars[first_block + 1:last_block]
+            del self.block_lines[first_block + 1:last_block]
+            self._retotal(first_block + 1)
+            self._rebalance(first_block + 1)
+        self._retotal(first_block)
+        self._rebalance(first_block)
+        self._changed()
+
+    def replace(self, start, end, text):
+        self.delete(start, end)
+        self.insert(start, text)
@@ -0,0 +1,112 @@
+"""Streaming file reading shared by the editor and the batch tools.
+
+Files are read in fixed size chunks on a background thread and handed over
+through a bounded queue so a large file never has to be held in memory
+twice.
+"""
+import codecs
+import io
+import queue
+import threading
+
+import perf
+
+CHUNK_SIZE = 256 * 1024  # characters handed to the editor per chunk
+SAMPLE_SIZE = 64 * 1024  # bytes inspected when detecting the encoding
+QUEUE_SIZE = 16  # chunks buffered ahead of the consumer
+
+# Byte order marks, longest first so UTF-32 is not mistaken for UTF-16
+BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+
+def detect_encoding(path):
+    with open(path, 'rb') as f:
+        return sample_encoding(f.read(SAMPLE_SIZE))
+
+
+def sample_encoding(sample):
+    # Encoding of a file starting with sample, at most SAMPLE_SIZE bytes
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding
+
+    # The sample may end in the middle of a multi-byte character, so decode
+    # it incrementally without flushing the decoder
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'latin-1'
+
+
+def error_handler(encoding):
+    # Bytes that do not decode are kept as lone surrogates so saving writes
+    # them back unchanged. UTF-16 and UTF-32 only carry unpaired surrogates
+    # through, any other bytes there are still an error.
+    if codecs.lookup(encoding).name.startswith(('utf-16', 'utf-32')):
+        return 'surrogatepass'
+    return 'surrogateescape'
+
+
+def open_text(path, encoding=None):
+    # Text stream with incremental decoding and universal newlines
+    if encoding is None:
+        encoding = detect_encoding(path)
+    return io.TextIOWrapper(open(path, 'rb'), encoding=encoding, errors=error_handler(encoding), newline=None)
+
+
+def iter_chunks(path, encoding=None, chunk_size=CHUNK_SIZE):
+    with open_text(path, encoding) as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def start_reader(path, encoding=None, chunk_size=CHUNK_SIZE):
+    """Read path on a background thread.
+
+    Returns (chunks, cancel) where chunks is a queue receiving
+    ('data', text, bytes_read), then ('done', None, bytes_read) or
+    ('error', exception, bytes_read), and cancel is an Event that stops the
+    reader early.
+    """
+    chunks = queue.Queue(maxsize=QUEUE_SIZE)
+    cancel = threading.Event()
+
+    def put(item):
+        # Block while the consumer is behind, but keep checking for cancel
+        while not cancel.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def read():
+        bytes_read = 0
+        try:
+            with open_text(path, encoding) as f:
+                raw = f.buffer
+                while not cancel.is_set():
+                    with perf.span('file read'):
+                        chunk = f.read(chunk_size)
+                    if not chunk:
+                        break
+                    bytes_read = raw.tell()
+                    if not put(('data', chunk, bytes_read)):
+                        return
+            put(('done', None, bytes_read))
+        except Exception as e:
+            put(('error', e, bytes_read))
+
+    threading.Thread(target=read, daemon=True).start()
+    return chunks, cancel
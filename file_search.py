@@ -0,0 +1,331 @@
+"""Find in Files: search a directory tree without opening the files.
+
+walk lists the files under a root, skipping version control and cache
+directories and files over the size limit. Files are scanned in batches on
+a thread pool, binary files (a NUL byte near the start) are skipped and
+text is decoded like the editor does. A process pool would have to
+re-import the editor's main module, which creates the Tk window, so threads
+are used. A FileSearch runs on a background thread and streams its hits
+through a queue.
+
+TrigramIndex keeps the lower-cased three character sequences of every file
+on disk, refreshed from file sizes and mtimes, so a search only scans the
+files containing every trigram the pattern needs.
+"""
+import json
+import os
+import queue
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import file_loader
+import perf
+import search_engine
+from autosave import atomic_write
+
+SKIP_DIRS = {'.git', '.hg', '.svn', '__pycache__', 'node_modules'}
+BINARY_SAMPLE = 8192  # bytes checked for a NUL byte
+BATCH_FILES = 64  # files handed to a worker at a time
+POOL_MIN_FILES = 256  # fewer files than this are scanned on the search thread
+MAX_LINE_CHARS = 200  # characters of a matching line kept for display
+INDEX_VERSION = 2
+
+
+def walk(root, max_bytes):
+    # (path, size, mtime_ns) of every file under root small enough to search
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in SKIP_DIRS:
+                        subdirs.append(entry.path)
+                elif entry.is_file():
+                    stat = entry.stat()
+                    if stat.st_size <= max_bytes:
+                        yield entry.path, stat.st_size, stat.st_mtime_ns
+            except OSError:
+                continue
+        stack.extend(reversed(subdirs))
+
+
+def read_text(path):
+    # Decoded text of path with universal newlines, None for binary files
+    with open(path, 'rb') as f:
+        data = f.read()
+    encoding = file_loader.sample_encoding(data[:file_loader.SAMPLE_SIZE])
+    if b'\0' in data[:BINARY_SAMPLE] and not encoding.startswith(('utf-16', 'utf-32')):
+        return None
+    text = data.decode(encoding, errors='replace')
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+
+def scan_file(path, pattern):
+    # (line, column, length, line text) of every match in path
+    try:
+        text = read_text(path)
+    except OSError:
+        return []
+    if text is None:
+        return []
+    hits = []
+    for line, column, match in search_engine.iter_matches(pattern, text):
+        line_start = match.start() - column
+        line_end = text.find('\n', match.start())
+        if line_end < 0:
+            line_end = len(text)
+        hits.append((line, column, match.end() - match.start(),
+                     text[line_start:min(line_end, line_start + MAX_LINE_CHARS)]))
+    return hits
+
+
+def scan_batch(paths, pattern):
+    with perf.span('find in files batch'):
+        return [(path, scan_file(path, pattern)) for path in paths]
+
+
+def trigrams(text):
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def trigram_batch(paths):
+    # (path, trigrams) for every path, None for binary or unreadable files
+    results = []
+    for path in paths:
+        try:
+            text = read_text(path)
+        except OSError:
+            text = None
+        results.append((path, None if text is None else trigrams(text)))
+    return results
+
+
+def regex_literals(text):
+    # Runs of literal characters every match of the regex must contain
+    try:
+        from re import _parser as parser
+    except ImportError:
+        import sre_parse as parser
+    try:
+        parsed = parser.parse(text)
+    except Exception:
+        return []
+    runs = []
+    run = []
+    for op, value in parsed:
+        if op == parser.LITERAL:
+            run.append(chr(value))
+        else:
+            # Anything else may match a varying text, the run ends here
+            runs.append(''.join(run))
+            run = []
+    runs.append(''.join(run))
+    return [run for run in runs if len(run) >= 3]
+
+
+def required_trigrams(text, regex=False):
+    """Lower-cased trigrams every match of the pattern contains, None when
+    the pattern gives none away."""
+    found = set()
+    for literal in regex_literals(text) if regex else [text]:
+        found |= trigrams(literal)
+    return found or None
+
+
+# Worker threads shared by every search, started on first use
+pool = None
+
+
+def map_batches(function, paths, cancel, *args):
+    """Yield function's (path, result) pairs for batches of paths, on the
+    pool unless there are only a few paths. Stops early once cancel is set."""
+    global pool
+    if len(paths) < POOL_MIN_FILES:
+        for start in range(0, len(paths), BATCH_FILES):
+            if cancel.is_set():
+                return
+            yield from function(paths[start:start + BATCH_FILES], *args)
+        return
+
+    if pool is None:
+        pool = ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) + 4))
+    futures = [pool.submit(function, paths[start:start + BATCH_FILES], *args)
+               for start in range(0, len(paths), BATCH_FILES)]
+    try:
+        for future in as_completed(futures):
+            if cancel.is_set():
+                return
+            yield from future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+class TrigramIndex:
+    """Trigrams of every text file under root, stored in path.
+
+    update re-reads only files whose size or mtime changed. A changed or
+    deleted file just loses its id, stale ids left in the postings are
+    ignored and cleared out once they outnumber the live ones.
+    """
+
+    def __init__(self, path, root):
+        self.path = path
+        self.root = root
+        self.files = {}  # path -> (id, size, mtime_ns), id -1 when not indexed
+        self.postings = {}  # trigram -> array of file ids
+        self.next_id = 0
+        self.load()
+
+    def load(self):
+        # An unreadable, cut short or foreign file just means starting over
+        try:
+            with open(self.path, 'rb') as f:
+                state = json.loads(f.readline())
+                if state['version'] != INDEX_VERSION or state['root'] != self.root:
+                    return
+                ids = array('I')
+                ids.frombytes(f.read())
+            files = {str(path): (int(file_id), int(size), int(mtime_ns))
+                     for path, file_id, size, mtime_ns in state['files']}
+            postings = {}
+            start = 0
+            for trigram, count in state['trigrams']:
+                postings[str(trigram)] = ids[start:start + count]
+                start += count
+            if start != len(ids):
+                return
+            next_id = int(state['next_id'])
+        except Exception:
+            return
+        self.files = files
+        self.postings = postings
+        self.next_id = next_id
+
+    def save(self):
+        # A line of JSON followed by the file ids of every trigram's
+        # postings, one after the other, as raw array bytes
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        state = {'version': INDEX_VERSION, 'root': self.root, 'next_id': self.next_id,
+                 'files': [(path,) + entry for path, entry in self.files.items()],
+                 'trigrams': [(trigram, len(ids)) for trigram, ids in self.postings.items()]}
+        ids = array('I')
+        for postings in self.postings.values():
+            ids.extend(postings)
+        atomic_write(self.path, json.dumps(state, separators=(',', ':')).encode('utf-8') + b'\n' + ids.tobytes())
+
+    def update(self, listing, cancel):
+        """Bring the index in line with listing, the (path, size, mtime_ns)
+        of every file, and return the number of files read."""
+        stamps = {path: (size, mtime_ns) for path, size, mtime_ns in listing}
+        removed = [path for path in self.files if path not in stamps]
+        for path in removed:
+            del self.files[path]
+        stale = [path for path, stamp in stamps.items()
+                 if path not in self.files or self.files[path][1:] != stamp]
+
+        read = 0
+        for path, found in map_batches(trigram_batch, stale, cancel):
+            read += 1
+            if found is None:
+                self.files[path] = (-1,) + stamps[path]
+                continue
+            file_id = self.next_id
+            self.next_id += 1
+            self.files[path] = (file_id,) + stamps[path]
+            for trigram in found:
+                postings = self.postings.get(trigram)
+                if postings is None:
+                    self.postings[trigram] = array('I', (file_id,))
+                else:
+                    postings.append(file_id)
+        if read or removed:
+            self.compact()
+            self.save()
+        return read
+
+    def compact(self):
+        live = {entry[0]: path for path, entry in self.files.items() if entry[0] >= 0}
+        if self.next_id < 2 * len(live) + 1024:
+            return
+        # Renumber the live files and drop every stale id
+        renumbered = {old: new for new, old in enumerate(sorted(live))}
+        for path, (file_id, size, mtime_ns) in self.files.items():
+            self.files[path] = (renumbered.get(file_id, -1), size, mtime_ns)
+        postings = {}
+        for trigram, ids in self.postings.items():
+            ids = array('I', (renumbered[i] for i in ids if i in renumbered))
+            if ids:
+                postings[trigram] = ids
+        self.postings = postings
+        self.next_id = len(renumbered)
+
+    def candidates(self, required):
+        # Paths of the indexed files containing every required trigram
+        paths = {entry[0]: path for path, entry in self.files.items() if entry[0] >= 0}
+        if required:
+            postings = []
+            for trigram in required:
+                ids = self.postings.get(trigram)
+                if ids is None:
+                    return []
+                postings.append(ids)
+            postings.sort(key=len)
+            ids = set(postings[0]) & paths.keys()
+            for other in postings[1:]:
+                if not ids:
+                    break
+                ids.intersection_update(other)
+            paths = {file_id: paths[file_id] for file_id in ids}
+        return sorted(paths.values())
+
+
+class FileSearch:
+    """One Find in Files run on a background thread.
+
+    results receives ('hits', path, hits) for every file with matches, then
+    ('done', stats) or ('error', exception). Setting cancel stops the run.
+    """
+
+    def __init__(self, root, pattern, max_bytes, required=None, index_path=None):
+        self.root = root
+        self.pattern = pattern
+        self.max_bytes = max_bytes
+        self.required = required
+        self.index_path = index_path
+        self.results = queue.Queue()
+        self.cancel = threading.Event()
+        self.stats = {'files': 0, 'indexed': 0, 'scanned': 0, 'hits': 0, 'seconds': 0.0}
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        started = time.perf_counter()
+        try:
+            listing = list(walk(self.root, self.max_bytes))
+            self.stats['files'] = len(listing)
+            if self.index_path is None:
+                paths = [path for path, _, _ in listing]
+            else:
+                index = TrigramIndex(self.index_path, self.root)
+                self.stats['indexed'] = index.update(listing, self.cancel)
+                paths = index.candidates(self.required)
+            for path, hits in map_batches(scan_batch, paths, self.cancel, self.pattern):
+                self.stats['scanned'] += 1
+                if hits:
+                    self.stats['hits'] += len(hits)
+                    self.results.put(('hits', path, hits))
+            self.stats['seconds'] = time.perf_counter() - started
+            self.results.put(('done', self.stats))
+        except Exception as e:
+            self.results.put(('error', e))
@@ -0,0 +1,390 @@
+"""Notice files changed by other programs and work out what changed.
+
+FileWatcher keeps the files of the open tabs under watch from one daemon
+thread. On Linux it asks inotify about their directories, which also sees
+a file replaced by a rename, and only falls back to comparing stat results
+every POLL_SECONDS elsewhere or when inotify is unavailable. With inotify
+a slow poll still runs as a safety net for network file systems, where
+changes made on other machines raise no events. Events are settled for
+SETTLE_SECONDS so a program writing in many small pieces is reported once.
+
+For every file the watcher remembers the state the editor last agreed
+with: its stat signature and last TAIL_BYTES bytes. read_change() compares
+a file with that state and returns either the text appended to it, when
+the old content is still there unchanged, or the line edits that turn the
+document into the new content.
+"""
+import codecs
+import ctypes
+import ctypes.util
+import difflib
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+import time
+
+import file_loader
+
+POLL_SECONDS = 1.0  # stat interval without inotify
+SAFETY_POLL_SECONDS = 10.0  # stat interval with inotify, for changes it cannot see
+SETTLE_SECONDS = 0.1  # quiet time after an event before the file is checked
+TAIL_BYTES = 4096  # end of the file kept to recognise an append
+DIFF_MAX_LINES = 50000  # changed regions longer than this are replaced whole
+
+# inotify event bits, from <sys/inotify.h>
+IN_MODIFY = 0x2
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x1000000
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, name length
+
+# Encodings whose appended bytes cannot be decoded on their own
+WHOLE_FILE_ENCODINGS = ('utf-16', 'utf-32')
+
+
+class Inotify:
+    """Directory watches on one inotify descriptor."""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+        self.libc = libc
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add(self, directory):
+        # Watch descriptor, None when the directory cannot be watched
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        return wd if wd >= 0 else None
+
+    def remove(self, wd):
+        self.libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self):
+        # (wd, mask, name) of the events waiting
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        position = 0
+        while position < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, position)
+            position += EVENT_HEADER.size
+            name = data[position:position + length].rstrip(b'\0')
+            position += length
+            events.append((wd, mask, os.fsdecode(name)))
+        return events
+
+
+def open_inotify():
+    # Inotify instance, None where the platform has none
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        return Inotify()
+    except (OSError, AttributeError):
+        return None
+
+
+def file_state(path):
+    """(signature, tail) of a file, (None, b'') when it does not exist."""
+    try:
+        with open(path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            f.seek(max(st.st_size - TAIL_BYTES, 0))
+            tail = f.read(TAIL_BYTES)
+    except FileNotFoundError:
+        return None, b''
+    return signature_of(st, st.st_size), tail
+
+
+def signature_of(st, size):
+    return st.st_dev, st.st_ino, size, st.st_mtime_ns
+
+
+def stat_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return signature_of(st, st.st_size)
+
+
+class Watched:
+    __slots__ = ('path', 'users', 'paused', 'signature', 'tail', 'reported', 'directory', 'name')
+
+    def __init__(self, path):
+        self.path = path
+        self.users = 0  # tabs showing the file
+        self.paused = 0  # writes of the editor itself in progress
+        self.signature, self.tail = file_state(path)
+        self.reported = None  # signature last put on the changes queue
+        self.directory, self.name = os.path.split(os.path.abspath(path))
+
+
+class FileWatcher:
+    """Watches files for changes made by other programs.
+
+    Paths are put on the changes queue, once per change, when their file no
+    longer matches the state last agreed with through watch(), resume() or
+    settle(). While paused, a file's own writes go unreported.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.files = {}  # path -> Watched
+        self.directories = {}  # directory -> [wd, number of watched files in it]
+        self.by_wd = {}  # wd -> directory
+        self.names = {}  # (directory, file name) -> path
+        self.pending = {}  # path -> time it is due to be checked
+        self.changes = queue.Queue()
+        self.inotify = None
+        self.poll_seconds = POLL_SECONDS
+        self.next_poll = 0
+        self.worker = None
+
+    def watch(self, path):
+        with self.lock:
+            watched = self.files.get(path)
+            if watched is None:
+                watched = self.files[path] = Watched(path)
+                self.names[watched.directory, watched.name] = path
+                self._watch_directory(watched.directory)
+            watched.users += 1
+        # The thread is only started once there is something to watch
+        if self.worker is None:
+            self.inotify = open_inotify()
+            if self.inotify is not None:
+                self.poll_seconds = SAFETY_POLL_SECONDS
+                with self.lock:
+                    for directory in self.directories:
+                        self._watch_directory(directory, added=False)
+            self.worker = threading.Thread(target=self._work, name='file watcher', daemon=True)
+            self.worker.start()
+
+    def unwatch(self, path):
+        with self.lock:
+            watched = self.files.get(path)
+            if watched is None:
+                return
+            watched.users -= 1
+            if watched.users > 0:
+                return
+            del self.files[path]
+            self.names.pop((watched.directory, watched.name), None)
+            self.pending.pop(path, None)
+            entry = self.directories[watched.directory]
+            entry[1] -= 1
+            if not entry[1]:
+                del self.directories[watched.directory]
+                if entry[0] is not None:
+                    del self.by_wd[entry[0]]
+                    self.inotify.remove(entry[0])
+
+    def _watch_directory(self, directory, added=True):
+        # Called with the lock held
+        entry = self.directories.setdefault(directory, [None, 0])
+        if added:
+            entry[1] += 1
+        if entry[0] is None and self.inotify is not None:
+            entry[0] = self.inotify.add(directory)
+            if entry[0] is not None:
+                self.by_wd[entry[0]] = directory
+
+    def state(self, path):
+        with self.lock:
+            watched = self.files.get(path)
+            return (watched.signature, watched.tail) if watched else (None, b'')
+
+    def pause(self, path):
+        # The editor is about to write the file itself
+        with self.lock:
+            watched = self.files.get(path)
+            if watched is not None:
+                watched.paused += 1
+
+    def resume(self, path):
+        # Its own write is done, the file as it is now is the agreed state
+        with self.lock:
+            watched = self.files.get(path)
+            if watched is None or not watched.paused:
+                return
+            watched.paused -= 1
+            if not watched.paused:
+                watched.signature, watched.tail = file_state(path)
+                watched.reported = None
+
+    def settle(self, path, state):
+        """Agree on state, from read_change(), as the file's content. The
+        file is checked again since it may have changed after being read."""
+        with self.lock:
+            watched = self.files.get(path)
+            if watched is None:
+                return
+            watched.signature, watched.tail = state
+            watched.reported = None
+        self._check(path)
+
+    def _check(self, path):
+        signature = stat_signature(path)
+        with self.lock:
+            watched = self.files.get(path)
+            if watched is None or watched.paused:
+                return
+            if signature in (watched.signature, watched.reported):
+                return
+            watched.reported = signature
+        self.changes.put(path)
+
+    def _events(self):
+        # Mark the files named by waiting inotify events as due for a check
+        due = time.monotonic() + SETTLE_SECONDS
+        events = self.inotify.read()
+        with self.lock:
+            for wd, mask, name in events:
+                if mask & IN_Q_OVERFLOW:
+                    for path in self.files:
+                        self.pending.setdefault(path, due)
+                elif mask & IN_IGNORED:
+                    # The directory went away, polling covers its files now
+                    directory = self.by_wd.pop(wd, None)
+                    if directory in self.directories:
+                        self.directories[directory][0] = None
+                else:
+                    path = self.names.get((self.by_wd.get(wd), name))
+                    # A file written to all the time is still checked every
+                    # SETTLE_SECONDS, the first event starts the wait
+                    if path is not None:
+                        self.pending.setdefault(path, due)
+
+    def _work(self):
+        while True:
+            now = time.monotonic()
+            with self.lock:
+                due = {path for path, when in self.pending.items() if when <= now}
+                for path in due:
+                    del self.pending[path]
+                if now >= self.next_poll:
+                    due.update(self.files)
+                    self.next_poll = now + self.poll_seconds
+                    # Directories that could not be watched may exist by now
+                    if self.inotify is not None:
+                        for directory in self.directories:
+                            self._watch_directory(directory, added=False)
+            for path in due:
+                self._check(path)
+            with self.lock:
+                timeout = min(self.pending.values(), default=self.next_poll)
+            timeout = max(min(timeout, self.next_poll) - time.monotonic(), 0)
+            if self.inotify is None:
+                time.sleep(timeout)
+            elif select.select([self.inotify.fd], [], [], timeout)[0]:
+                self._events()
+
+
+def normalize_newlines(text):
+    # Same as reading in universal newlines mode
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+
+def read_change(path, signature, tail, encoding, snapshot, allow_append=True):
+    """What became of the file at path, last agreed to have signature and
+    to end in the bytes tail, while the document was snapshot.
+
+    Returns (kind, change, state) with state the (signature, tail) to settle
+    on. kind is 'append' with the text added to the end of the file, 'edits'
+    with the list of line edits from line_edits(), or 'gone' with None.
+    """
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return 'gone', None, (None, b'')
+    with f:
+        st = os.fstat(f.fileno())
+        if allow_append and signature is not None and st.st_size > signature[2] \
+                and signature[:2] == (st.st_dev, st.st_ino):
+            size = signature[2]
+            f.seek(size - len(tail))
+            if f.read(len(tail)) == tail and ends_with(snapshot, tail, size, encoding):
+                data = f.read()
+                text, used = decode_appended(data, encoding, tail.endswith(b'\r'))
+                state = (signature_of(st, size + used), (tail + data[:used])[-TAIL_BYTES:])
+                return 'append', text, state
+        f.seek(0)
+        data = f.read()
+    text = normalize_newlines(data.decode(encoding, errors=file_loader.error_handler(encoding)))
+    return 'edits', line_edits(snapshot.text(), text), (signature_of(st, len(data)), data[-TAIL_BYTES:])
+
+
+def stream_encoding(encoding):
+    # Codec for bytes from the middle of a file, None if there is none
+    name = codecs.lookup(encoding).name
+    if name in WHOLE_FILE_ENCODINGS:
+        return None
+    return 'utf-8' if name == 'utf-8-sig' else name
+
+
+def ends_with(snapshot, tail, size, encoding):
+    # Whether the document still ends with the text of the file's old tail
+    encoding = stream_encoding(encoding)
+    if encoding is None:
+        return False
+    text = normalize_newlines(tail.decode(encoding, errors=file_loader.error_handler(encoding)))
+    if size > len(tail):
+        text = text[4:]  # the tail may start inside a character
+    end = len(snapshot)
+    return snapshot.slice(end - len(text), end) == text
+
+
+def decode_appended(data, encoding, after_cr):
+    """(text, bytes used) of data appended to a file. A character cut off at
+    the end is left for the next read."""
+    skip = 1 if after_cr and data.startswith(b'\n') else 0  # second half of a \r\n
+    encoding = stream_encoding(encoding)
+    decoder = codecs.getincrementaldecoder(encoding)(errors=file_loader.error_handler(encoding))
+    text = decoder.decode(data[skip:], final=False)
+    return normalize_newlines(text), len(data) - len(decoder.getstate()[0])
+
+
+def split_lines(text):
+    # Lines with their newline, the last one may have none
+    lines = text.split('\n')
+    last = lines.pop()
+    lines = [line + '\n' for line in lines]
+    if last:
+        lines.append(last)
+    return lines
+
+
+def line_edits(old, new):
+    """Edits turning the text old into new, as (line, old text, new text)
+    replacements in document order. line numbers the first line replaced,
+    from 1 like Tk, in old."""
+    a = split_lines(old)
+    b = split_lines(new)
+    start = 0
+    while start < min(len(a), len(b)) and a[start] == b[start]:
+        start += 1
+    a_end, b_end = len(a), len(b)
+    while a_end > start and b_end > start and a[a_end - 1] == b[b_end - 1]:
+        a_end -= 1
+        b_end -= 1
+    if a_end == start and b_end == start:
+        return []
+    if max(a_end, b_end) - start > DIFF_MAX_LINES:
+        return [(start + 1, ''.join(a[start:a_end]), ''.join(b[start:b_end]))]
+    matcher = difflib.SequenceMatcher(None, a[start:a_end], b[start:b_end], autojunk=False)
+    return [(start + i1 + 1, ''.join(a[start + i1:start + i2]), ''.join(b[start + j1:start + j2]))
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal']
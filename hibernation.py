@@ -0,0 +1,71 @@
+"""Compressed copies of the documents in hibernated tabs.
+
+A tab that has not been looked at for a while drops its widgets and keeps
+its content as a SleepingText. The text is compressed by one background
+worker, until that is done the uncompressed text is kept so the tab can be
+woken at any time.
+"""
+import queue
+import sys
+import threading
+import zlib
+
+LEVEL = 1  # zlib level, compressing must stay much faster than reading the file
+
+
+class SleepingText:
+    """Content of a hibernated tab, given as a str or a document.Snapshot."""
+
+    def __init__(self, text):
+        self.content = text
+        submit(self)
+
+    def _compress(self):
+        content = self.content
+        if isinstance(content, bytes):
+            return
+        if not isinstance(content, str):
+            content = content.text()
+        self.content = zlib.compress(content.encode('utf-8', 'surrogatepass'), LEVEL)
+
+    def text(self):
+        content = self.content
+        if isinstance(content, bytes):
+            return zlib.decompress(content).decode('utf-8', 'surrogatepass')
+        return content if isinstance(content, str) else content.text()
+
+    @property
+    def compressed(self):
+        return isinstance(self.content, bytes)
+
+    @property
+    def size(self):
+        # Bytes held right now, a snapshot only counts its own character data
+        content = self.content
+        if isinstance(content, bytes):
+            return len(content)
+        if isinstance(content, str):
+            return sys.getsizeof(content)
+        return len(content)
+
+
+# One worker compresses for every tab, started on first use
+jobs = queue.Queue()
+worker = None
+
+
+def submit(sleeping):
+    global worker
+    if worker is None:
+        worker = threading.Thread(target=work, daemon=True)
+        worker.start()
+    jobs.put(sleeping)
+
+
+def work():
+    while True:
+        sleeping = jobs.get()
+        try:
+            sleeping._compress()
+        except Exception as e:
+            print(f"Compressing a hibernated tab failed: {e}")
@@ -0,0 +1,226 @@
+"""Incremental syntax highlighting on top of Pygments.
+
+The lexer state (the RegexLexer state stack) is cached at every line start,
+so after an edit only the lines from the edit onwards are lexed again, and
+only until the state at a line start matches the cached one. The editor
+turns the per-line tokens into Text widget tags.
+"""
+from pygments.lexer import RegexLexer
+from pygments.token import Error, Text, _TokenType
+
+ROOT = ('root',)
+
+
+def is_stateful(lexer):
+    # Only plain RegexLexers can be resumed from a cached state stack, other
+    # lexers (ExtendedRegexLexer, hand written ones) are run line by line
+    return isinstance(lexer, RegexLexer) and \
+        type(lexer).get_tokens_unprocessed is RegexLexer.get_tokens_unprocessed
+
+
+def regex_tokens(lexer, text, stack, checkpoints):
+    """RegexLexer.get_tokens_unprocessed, recording the state stack in
+    checkpoints[pos] whenever a token ends right after a newline."""
+    pos = 0
+    tokendefs = lexer._tokens
+    statestack = list(stack)
+    statetokens = tokendefs[statestack[-1]]
+    while 1:
+        for rexmatch, action, new_state in statetokens:
+            m = rexmatch(text, pos)
+            if m:
+                if action is not None:
+                    if type(action) is _TokenType:
+                        yield pos, action, m.group()
+                    else:
+                        yield from action(lexer, m)
+                pos = m.end()
+                if new_state is not None:
+                    if isinstance(new_state, tuple):
+                        for state in new_state:
+                            if state == '#pop':
+                                if len(statestack) > 1:
+                                    statestack.pop()
+                            elif state == '#push':
+                                statestack.append(statestack[-1])
+                            else:
+                                statestack.append(state)
+                    elif isinstance(new_state, int):
+                        if abs(new_state) >= len(statestack):
+                            del statestack[1:]
+                        else:
+                            del statestack[new_state:]
+                    elif new_state == '#push':
+                        statestack.append(statestack[-1])
+                    statetokens = tokendefs[statestack[-1]]
+                if text[pos - 1:pos] == '\n':
+                    checkpoints[pos] = tuple(statestack)
+                break
+        else:
+            if pos >= len(text):
+                break
+            if text[pos] == '\n':
+                # At EOL the state goes back to root
+                statestack = ['root']
+                statetokens = tokendefs['root']
+                yield pos, Text, '\n'
+                pos += 1
+                checkpoints[pos] = ROOT
+                continue
+            yield pos, Error, text[pos]
+            pos += 1
+
+
+def lex_lines(lexer, text, first_line, stack):
+    """Yield (line, tokens, end_stack) for every line of text.
+
+    tokens is a list of (column, length, tokentype) and end_stack the state
+    at the start of the next line, or None when a token runs on into it.
+    """
+    if not is_stateful(lexer):
+        for offset, line_text in enumerate(text.split('\n')):
+            tokens = [(pos, len(value), ttype)
+                      for pos, ttype, value in lexer.get_tokens_unprocessed(line_text)]
+            yield first_line + offset, tokens, ROOT
+        return
+
+    checkpoints = {}
+    line = first_line
+    line_start = 0
+    tokens = []
+    finished = []
+    for pos, ttype, value in regex_tokens(lexer, text, stack, checkpoints):
+        # The checkpoint for a line end is only recorded once the token that
+        # ends it has been consumed, so finished lines are handed out when the
+        # next token arrives
+        for item in finished:
+            yield item[0], item[1], checkpoints.get(item[2])
+        finished = []
+
+        # Split tokens that contain newlines into one piece per line
+        while True:
+            newline = value.find('\n')
+            if newline == -1:
+                if value:
+                    tokens.append((pos - line_start, len(value), ttype))
+                break
+            if newline:
+                tokens.append((pos - line_start, newline, ttype))
+            pos += newline + 1
+            value = value[newline + 1:]
+            finished.append((line, tokens, pos))
+            line += 1
+            line_start = pos
+            tokens = []
+    for item in finished:
+        yield item[0], item[1], checkpoints.get(item[2])
+    yield line, tokens, None
+
+
+def lex_chunks(lexer, chunks):
+    """Yield (text, tokens) for every line of a document given as chunks of
+    whole lines joined by '\n'.
+
+    The last line of each chunk is held back and lexed again with the next
+    one, so tokens that run over a chunk boundary keep their state.
+    """
+    carry = None
+    stack = ROOT
+    for chunk in chunks:
+        text = chunk if carry is None else carry + '\n' + chunk
+        lines = text.split('\n')
+        lexed = list(lex_lines(lexer, text, 0, stack))[:-1]
+        if lexed:
+            stack = lexed[-1][2] or ROOT
+        for number, tokens, _ in lexed:
+            yield lines[number], tokens
+        carry = lines[-1]
+    if carry is not None:
+        for _, tokens, _ in lex_lines(lexer, carry, 0, stack):
+            yield carry, tokens
+
+
+class Highlighter:
+    """Per-document lexer state cache and the range still to be lexed.
+
+    A rule that looks ahead over several lines (such as Pygments' Python
+    docstring rule) can be affected by an edit below the line it starts on,
+    those lines are only corrected when they are lexed again.
+    """
+
+    def __init__(self, lexer, line_count):
+        self.lexer = lexer
+        # states[line] is the stack at the start of that line, index 0 unused
+        self.states = [None, ROOT] + [None] * (line_count - 1)
+        self.dirty_from = 1  # first line that needs lexing
+        self.must_reach = line_count  # lex at least up to here
+
+    @property
+    def busy(self):
+        return self.dirty_from is not None
+
+    def note_edit(self, start, old_end, new_end):
+        first, old_last, new_last = start[0], old_end[0], new_end[0]
+        delta = new_last - old_last
+        self.states[first + 1:old_last + 1] = [None] * (new_last - first)
+        if self.dirty_from is None:
+            self.dirty_from, self.must_reach = first, new_last
+        else:
+            if self.must_reach > old_last:
+                self.must_reach += delta
+            elif self.must_reach > new_last:
+                self.must_reach = new_last
+            if self.dirty_from > old_last:
+                self.dirty_from += delta
+            self.dirty_from = min(self.dirty_from, first)
+            self.must_reach = max(self.must_reach, new_last)
+
+    def resume_line(self, line):
+        # Closest line at or above line whose start state is known
+        while self.states[line] is None:
+            line -= 1
+        return line
+
+    def run(self, get_lines, apply, max_lines, chunk_lines=500):
+        """Lex about max_lines lines from dirty_from on.
+
+        get_lines(first, last) returns the text of that inclusive range and
+        apply(first, last, lines) receives the tokens of each lexed line.
+        Returns True once the state has converged.
+        """
+        if self.dirty_from is None:
+            return True
+        states = self.states
+        last_line = len(states) - 1
+        line = self.resume_line(min(self.dirty_from, last_line))
+        budget = max_lines
+
+        while budget > 0:
+            chunk_last = min(line + chunk_lines - 1, last_line)
+            lexed = []
+            converged = False
+            for number, tokens, end_stack in lex_lines(self.lexer, get_lines(line, chunk_last), line, states[line]):
+                lexed.append(tokens)
+                if number >= chunk_last:
+                    # A token may carry on past the chunk, so the state after
+                    # its last line is not trusted unless the document ends
+                    converged = number == last_line
+                    break
+                if number >= self.must_reach and end_stack is not None and states[number + 1] == end_stack:
+                    converged = True
+                    break
+                states[number + 1] = end_stack
+            apply(line, line + len(lexed) - 1, lexed)
+            budget -= len(lexed)
+            if converged:
+                self.dirty_from = None
+                return True
+
+            next_line = self.resume_line(line + len(lexed) - 1)
+            if next_line <= line:
+                # One token spans the whole chunk, retry with a bigger one
+                chunk_lines *= 2
+            else:
+                line = next_line
+        self.dirty_from = line
+        return False
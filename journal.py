@@ -0,0 +1,215 @@
+"""Crash-recovery journal for open documents.
+
+Every document gets an append-only log. Edits are collected on the Tk
+thread as (start, old_end, text) deltas and handed over in batches to one
+background writer, so typing never waits for the disk. A log starts from a
+base, either the file the document was loaded from or a full text snapshot,
+and is rewritten as a single base once it grows past COMPACT_BYTES or the
+document is saved. replay rebuilds a document from a log left behind by a
+crash.
+"""
+import json
+import os
+import queue
+import threading
+import uuid
+
+import file_loader
+import perf
+from autosave import atomic_write
+
+SUFFIX = '.journal'
+COMPACT_BYTES = 4 * 1024 * 1024  # logged bytes after which a new base is written
+
+
+class Journal:
+    """Log of one document, the underscore methods run on the writer thread."""
+
+    def __init__(self, directory, doc_id=None):
+        self.directory = directory
+        self.doc_id = doc_id or uuid.uuid4().hex
+        self.path = os.path.join(directory, self.doc_id + SUFFIX)
+        self.pending = []  # edits not handed to the writer yet
+        self.size = 0  # rough bytes logged since the last base
+        self.tag = 0  # bumped whenever a new base is requested
+        # Writer thread state
+        self.file = None
+        self.records = []  # (tag, line) logged since the last base
+        self.base_tag = 0
+        self.meta = None
+
+    def record(self, start, old_end, text):
+        self.pending.append((start[0], start[1], old_end[0], old_end[1], text))
+        self.size += len(text) + 32
+
+    def flush(self, meta=None):
+        if self.pending or meta:
+            record = {'edits': self.pending}
+            if meta:
+                record['meta'] = meta
+            submit(self._append, record, self.tag)
+        self.pending = []
+
+    def mark(self):
+        """Flush and return a tag to pass to rebase_on_file once the content
+        at this point has been saved."""
+        self.flush()
+        self.tag += 1
+        return self.tag
+
+    def compact(self, text, meta=None):
+        # text (a str or a document.Snapshot) already contains the pending edits
+        self.pending = []
+        self.size = 0
+        self.tag += 1
+        submit(self._rebase, {'text': text}, self.tag, meta)
+
+    def rebase_on_file(self, path, encoding, tag=None, meta=None):
+        """Start the log again from path, which holds the content the
+        document had at tag (now if None)."""
+        if tag is None:
+            tag = self.mark()
+            self.size = 0
+        submit(self._rebase, {'file': path, 'encoding': encoding}, tag, meta)
+
+    def discard(self):
+        self.pending = []
+        submit(self._discard)
+
+    def _write_line(self, line):
+        if self.file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self.file = open(self.path, 'a', encoding='utf-8')
+        self.file.write(line)
+        self.file.flush()
+
+    def _append(self, record, tag):
+        if 'meta' in record:
+            self.meta = record['meta']
+        line = json.dumps(record) + '\n'
+        self.records.append((tag, line))
+        self._write_line(line)
+
+    def _rebase(self, base, tag, meta=None):
+        if tag < self.base_tag:
+            return  # a newer base has already been written
+        if 'text' in base and not isinstance(base['text'], str):
+            base = {'text': base['text'].text()}
+        if 'file' in base:
+            stat = os.stat(base['file'])
+            base = dict(base, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+        if meta:
+            self.meta = meta
+        self.base_tag = tag
+        self.records = [(t, line) for t, line in self.records if t >= tag]
+
+        lines = [json.dumps({'base': base}) + '\n']
+        if self.meta:
+            lines.append(json.dumps({'edits': [], 'meta': self.meta}) + '\n')
+        lines += [line for _, line in self.records]
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        os.makedirs(self.directory, exist_ok=True)
+        atomic_write(self.path, ''.join(lines).encode('utf-8'))
+
+    def _discard(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.records = []
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+# One writer thread serves every journal, started on first use
+jobs = queue.Queue()
+writer = None
+
+
+def submit(method, *args):
+    global writer
+    if writer is None:
+        writer = threading.Thread(target=work, daemon=True)
+        writer.start()
+    jobs.put((method, args))
+
+
+def work():
+    while True:
+        method, args = jobs.get()
+        try:
+            with perf.span('journal write'):
+                method(*args)
+        except Exception as e:
+            print(f"Journal write failed: {e}")
+        jobs.task_done()
+
+
+def wait():
+    # Block until everything submitted so far has been written
+    if writer is not None:
+        jobs.join()
+
+
+def find(directory):
+    # (doc_id, path) of every journal left in directory
+    if not os.path.isdir(directory):
+        return []
+    return [(name[:-len(SUFFIX)], os.path.join(directory, name))
+            for name in sorted(os.listdir(directory)) if name.endswith(SUFFIX)]
+
+
+def apply_edit(lines, start_line, start_column, end_line, end_column, text):
+    # Replace the range like Tk would, lines and columns as in Tk indices
+    head = lines[start_line - 1][:start_column]
+    tail = lines[end_line - 1][end_column:]
+    lines[start_line - 1:end_line] = (head + text + tail).split('\n')
+
+
+def replay(path):
+    """Rebuild the document logged in path.
+
+    Returns (text, meta, edited, stale). stale is True when the base file
+    changed on disk since it was logged, the edits are then not applied and
+    text is the current file content, or None if the file is gone.
+    """
+    base = None
+    batches = []
+    meta = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break  # the last write was cut short by the crash
+            if 'base' in record:
+                base = record['base']
+            else:
+                batches.append(record['edits'])
+                meta = record.get('meta') or meta
+
+    if base is None:
+        text = ''
+    elif 'file' in base:
+        if not os.path.exists(base['file']):
+            return None, meta, False, True
+        stat = os.stat(base['file'])
+        with file_loader.open_text(base['file'], base['encoding']) as f:
+            text = f.read()
+        if (stat.st_size, stat.st_mtime_ns) != (base['size'], base['mtime_ns']):
+            return text, meta, False, True
+    else:
+        text = base['text']
+
+    edited = base is not None and 'text' in base
+    if any(batches):
+        edited = True
+        lines = text.split('\n')
+        for edits in batches:
+            for edit in edits:
+                apply_edit(lines, *edit)
+        text = '\n'.join(lines)
+    return text, meta, edited, False
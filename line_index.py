@@ -0,0 +1,79 @@
+"""Line-offset index over a memory-mapped file.
+
+Used by the read-only huge file viewer, the offsets of every line start are
+collected on a background thread into a compact array so any line can be
+fetched in O(1) without reading the rest of the file.
+"""
+import mmap
+import os
+import threading
+from array import array
+
+SCAN_BLOCK = 16 * 1024 * 1024  # bytes scanned between progress updates
+MAX_LINE_CHARS = 4096  # longer lines are cut when displayed
+
+
+class LineIndex:
+    def __init__(self, path, encoding='utf-8'):
+        self.path = path
+        self.encoding = encoding
+        self.size = os.path.getsize(path)
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+        self.offsets = array('Q', [0])
+        self.scanned = 0
+        self.done = False
+        self.cancelled = False
+        threading.Thread(target=self._build, daemon=True).start()
+
+    def _build(self):
+        data = self.map
+        offsets = self.offsets
+        pos = 0
+        try:
+            while pos < self.size and not self.cancelled:
+                block_end = min(pos + SCAN_BLOCK, self.size)
+                found = []
+                newline = data.find(b'\n', pos, block_end)
+                while newline != -1:
+                    found.append(newline + 1)
+                    newline = data.find(b'\n', newline + 1, block_end)
+                offsets.extend(found)
+                pos = block_end
+                self.scanned = pos
+        except ValueError:
+            # The map was closed while scanning
+            return
+        self.done = True
+
+    @property
+    def line_count(self):
+        # The last offset only starts a complete line once the scan is over
+        if self.done:
+            return len(self.offsets)
+        return max(len(self.offsets) - 1, 1)
+
+    @property
+    def progress(self):
+        return self.scanned / self.size if self.size else 1.0
+
+    def line(self, number):
+        # Zero based line number
+        offsets = self.offsets
+        start = offsets[number]
+        end = offsets[number + 1] - 1 if number + 1 < len(offsets) else self.size
+        end = min(end, start + MAX_LINE_CHARS * 4)
+        raw = self.map[start:end]
+        if raw.endswith(b'\r'):
+            raw = raw[:-1]
+        return raw.decode(self.encoding, errors='replace')[:MAX_LINE_CHARS]
+
+    def lines(self, first, count):
+        last = min(first + count, self.line_count)
+        return [self.line(number) for number in range(first, last)]
+
+    def close(self):
+        self.cancelled = True
+        if self.size:
+            self.map.close()
+        self.file.close()
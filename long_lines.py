@@ -0,0 +1,171 @@
+"""Soft-wrap layout for documents with very long lines.
+
+Tk lays a logical line out as a whole, so a minified file or a log with
+multi-megabyte lines makes every keystroke, scroll and gutter redraw cost
+time proportional to the line. In long-line mode such lines are cut into
+segments of SEGMENT_CHARS characters with a newline between them in the
+Text widget only, the document keeps the real text. SoftWrap remembers which
+widget lines continue the line above (the rows after a soft break) and the
+logical column each of them starts at, and translates positions both ways.
+"""
+import re
+from bisect import bisect_left, bisect_right
+
+LONG_LINE_CHARS = 10000  # a line longer than this switches a tab to long-line mode
+SEGMENT_CHARS = 1000  # characters per widget line in long-line mode
+MAX_SEGMENT_CHARS = 4 * SEGMENT_CHARS  # a segment grown past this by edits is split again
+
+LONG_LINE = re.compile('[^\n]{%d}' % (LONG_LINE_CHARS + 1))
+LONG_SEGMENT = re.compile('[^\n]{%d}' % (SEGMENT_CHARS + 1))
+OVERLONG_SEGMENT = re.compile('[^\n]{%d}' % (MAX_SEGMENT_CHARS + 1))
+
+
+def tail_column(text, column=0):
+    # Column at the end of text inserted at column
+    newline = text.rfind('\n')
+    return column + len(text) if newline < 0 else len(text) - newline - 1
+
+
+def has_long_line(text, column=0):
+    """True when text, inserted at column of a line, leaves a line longer
+    than LONG_LINE_CHARS."""
+    first = text.find('\n')
+    if column + (len(text) if first < 0 else first) > LONG_LINE_CHARS:
+        return True
+    return LONG_LINE.search(text) is not None
+
+
+class SoftWrap:
+    """Soft breaks of one document, positions are (line, column) like Tk.
+
+    rows holds the widget lines that start right after a soft break, in
+    order, and cols the logical column each of them starts at. The rows
+    after a soft break are always consecutive, so the widget lines of one
+    logical line are a run in rows.
+    """
+
+    def __init__(self):
+        self.rows = []
+        self.cols = []
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _row_line(self, j):
+        # Logical line of the continuation row rows[j]
+        return self.rows[j] - j - 1
+
+    def _first_of_line(self, line):
+        # Index in rows of the first continuation row of line or later
+        low, high = 0, len(self.rows)
+        while low < high:
+            middle = (low + high) // 2
+            if self._row_line(middle) < line:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def to_logical(self, row, column):
+        i = bisect_right(self.rows, row)
+        if i and self.rows[i - 1] == row:
+            return row - i, self.cols[i - 1] + column
+        return row - i, column
+
+    def to_widget(self, line, column):
+        """Widget position of a logical one, a position at a soft break is
+        given as the start of the row after it."""
+        first = self._first_of_line(line)
+        row = line + first
+        # Continuation rows of this line are rows[first:last]
+        last = first
+        while last < len(self.rows) and self.rows[last] == row + 1 + last - first:
+            last += 1
+        if last == first:
+            return row, column
+        j = bisect_right(self.cols, column, first, last) - 1
+        if j < first:
+            return row, column
+        return self.rows[j], column - self.cols[j]
+
+    def is_continuation(self, row):
+        i = bisect_left(self.rows, row)
+        return i < len(self.rows) and self.rows[i] == row
+
+    def run_after(self, row):
+        # Index range in rows of the continuation rows right below row
+        start = end = bisect_right(self.rows, row)
+        while end < len(self.rows) and self.rows[end] == row + 1 + end - start:
+            end += 1
+        return start, end
+
+    def note_edit(self, start, old_end, new_end, column_change):
+        """Follow an edit of the widget from start to old_end replaced by
+        text ending at new_end, all widget positions. column_change is how
+        far the logical column at old_end moved."""
+        first = bisect_right(self.rows, start[0])
+        removed_end = bisect_right(self.rows, old_end[0])
+        # Soft breaks inside the edited range are gone
+        del self.rows[first:removed_end], self.cols[first:removed_end]
+        run_start, run_end = self.run_after(old_end[0])
+        for j in range(run_start, run_end):
+            self.cols[j] += column_change
+        shift = new_end[0] - old_end[0]
+        if shift:
+            for j in range(first, len(self.rows)):
+                self.rows[j] += shift
+
+    def add_breaks(self, row, column, lengths):
+        """Record soft breaks splitting widget line row, starting at logical
+        column, into segments of the given lengths."""
+        count = len(lengths) - 1
+        i = bisect_right(self.rows, row)
+        for j in range(i, len(self.rows)):
+            self.rows[j] += count
+        new_rows = []
+        new_cols = []
+        for length in lengths[:-1]:
+            column += length
+            row += 1
+            new_rows.append(row)
+            new_cols.append(column)
+        self.rows[i:i] = new_rows
+        self.cols[i:i] = new_cols
+
+    def segment(self, text, row, column, row_start):
+        """Widget text for text appended at the end of the document, with
+        a soft break wherever a row would pass SEGMENT_CHARS. row is the
+        last widget line, column the logical column at its end and
+        row_start the logical column the row starts at."""
+        first = text.find('\n')
+        if column - row_start + (len(text) if first < 0 else first) <= SEGMENT_CHARS \
+                and not LONG_SEGMENT.search(text):
+            return text
+        parts = []
+        for number, line in enumerate(text.split('\n')):
+            if number:
+                parts.append('\n')
+                row += 1
+                column = row_start = 0
+            position = 0
+            while len(line) - position > SEGMENT_CHARS - (column - row_start):
+                # A row loaded before long-line mode began may already be longer
+                take = max(SEGMENT_CHARS - (column - row_start), 0)
+                parts.append(line[position:position + take])
+                parts.append('\n')
+                position += take
+                column += take
+                row += 1
+                row_start = column
+                self.rows.append(row)
+                self.cols.append(column)
+            parts.append(line[position:])
+            column += len(line) - position
+        return ''.join(parts)
+
+    def row_start(self, row):
+        # Logical column the widget line row starts at
+        i = bisect_left(self.rows, row)
+        if i < len(self.rows) and self.rows[i] == row:
+            return self.cols[i]
+        return 0
@@ -1,18 +1,81 @@
 from tkinter import *
-from tkinter import ttk, filedialog, simpledialog, messagebox
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
+from tkinter import ttk, filedialog, simpledialog, messagebox, font
 from datetime import datetime
+from bisect import bisect_left, bisect_right
+import hashlib
+import importlib
 import os
 import json
-from pygments import highlight
-from pygments.lexers import get_lexer_for_filename, TextLexer
-from pygments.formatters import BBCodeFormatter
-from pygments.styles import get_style_by_name
+import queue
+import re
+import sys
+import threading
+import time
+from collections import deque
+import autosave
+import diff
+import document
+import file_loader
+import file_search
+import file_watcher
+import hibernation
+import journal
+import long_lines
+import perf
+import search_engine
+import undo_history
+from line_index import LineIndex
 
 # Configuration
 CONFIG_FILE = "notepad_config.json"
+JOURNAL_DIR = "notepad_journal"  # crash-recovery logs of the open documents
+INDEX_DIR = "notepad_index"  # trigram indexes used by Find in Files
+SYMBOL_DIR = "notepad_symbols"  # symbol indexes cached by the text they were made for
 AUTO_SAVE_INTERVAL = 300000  # 5 minutes in milliseconds
+AUTO_SAVE_POLL_MS = 100  # how often finished auto-saves are checked for errors
+WATCH_POLL_MS = 250  # how often files changed by other programs are looked for
+RELOAD_POLL_MS = 20  # how often a reload being worked out in the background is checked
+JOURNAL_FLUSH_MS = 500  # how long edits are batched before they are journaled
+EDIT_DEBOUNCE_MS = 16  # default delay used to coalesce edit driven refreshes
+LOAD_POLL_MS = 10  # how often chunks read in the background are fed to the editor
+LOAD_BATCH_MS = 20  # time budget for inserting chunks per poll
+LARGE_INSERT_KB = 512  # default size above which pastes and inserts are added in chunks
+INSERT_CHUNK_CHARS = 64 * 1024  # characters a chunked paste or insert adds at a time
+HUGE_FILE_THRESHOLD_MB = 100  # default size above which files open in the read-only viewer
+SEARCH_POLL_MS = 20  # how often a background search is checked for results
+FIND_MAX_FILE_MB = 20  # files larger than this are skipped by Find in Files
+FIND_MAX_RESULTS = 10000  # matches listed by Find in Files before the rest are only counted
+HIGHLIGHT_BATCH_LINES = 2000  # lines lexed per pass by the syntax highlighter
+HIGHLIGHT_STYLES = {'light': 'default', 'dark': 'monokai'}  # Pygments style per theme
+PDF_CHUNK_LINES = 2000  # lines handed to the PDF export worker at a time
+PDF_POLL_MS = 50  # how often a running PDF export is fed and its progress shown
+DIFF_POLL_MS = 30  # how often a running comparison is checked for results
+DIFF_UPDATE_MS = 300  # quiet time after an edit before a comparison is brought up to date
+DIFF_STREAM_SECONDS = 0.05  # longest the diff worker holds on to hunks before handing them over
+# Background of the lines only in the left pane, only in the right one, and changed
+DIFF_COLORS = {'light': {'diff_removed': '#f8d7d7', 'diff_added': '#d7f5d7', 'diff_changed': '#fdf1c7'},
+               'dark': {'diff_removed': '#4a2326', 'diff_added': '#1f3d24', 'diff_changed': '#4a4120'}}
+SYMBOL_POLL_MS = 50  # how often a symbol index being brought up to date is checked
+GOTO_SYMBOL_RESULTS = 200  # symbols listed by Go To Symbol
+OUTLINE_WIDTH = 220  # width of the outline panel in pixels
+SYMBOL_MARKS = {'class': '◆', 'function': 'ƒ', 'heading': '§', 'key': '•'}  # shown before a symbol's name
+PREWARM_DELAY_MS = 1000  # idle time after startup before heavy modules are imported
+HIBERNATE_IDLE_MINUTES = 30  # default time a tab stays unviewed before its widgets are dropped
+HIBERNATE_CHECK_MS = 60000  # how often idle tabs are looked for
+UNDO_MEMORY_MB = 64  # default undo history kept in memory per tab
+UNDO_TOTAL_MEMORY_MB = 256  # default undo history kept in memory for all tabs together
+TK_LINE_BYTES = 80  # rough memory the Text widget spends per line on top of the text
+SHIFT_MASK = 0x0001  # event.state bit of the Shift key
+WORD_KEY_MASK = 0x0004 | 0x0008  # Control and Alt (Command on macOS), held to act on words
+PERF_HEARTBEAT_MS = 50  # how often the event loop is checked for stalls while recording
+PERF_STALL_MS = 100  # heartbeat delay recorded as an event loop stall
+PERF_MEMORY_MS = 1000  # how often memory use is sampled while recording
+PERF_OVERLAY_MS = 250  # how often the performance overlay is redrawn
+# Only needed by syntax highlighting, the outline and PDF export, so they
+# are imported on first use and optionally pre-warmed in the background
+PREWARM_MODULES = ('highlighter', 'symbols', 'pygments.lexers', 'pygments.styles',
+                   'pygments.styles.default', 'pygments.styles.monokai',
+                   'pdf_export')
 
 # Define the main application window
 win = Tk()
@@ -20,6 +83,9 @@ win.geometry("600x600")
 win.title('Notepad')
 #win.iconbitmap('notepad_icon.ico')
 
+# Fixed width font shared by every line number gutter
+gutter_font = font.Font(family="Courier New", size=12)
+
 # Create a notebook for tabs
 notebook = ttk.Notebook(win)
 notebook.pack(expand=1, fill=BOTH)
@@ -28,23 +94,93 @@ notebook.pack(expand=1, fill=BOTH)
 current_theme = "light"  # default theme
 show_line_numbers = True  # default line numbers setting
 auto_save_enabled = True  # default auto-save setting
+edit_debounce_ms = EDIT_DEBOUNCE_MS  # default edit refresh delay
+huge_file_threshold_mb = HUGE_FILE_THRESHOLD_MB  # default huge file viewer threshold
+prewarm_imports = True  # default for importing heavy modules in the background
+hibernate_idle_minutes = HIBERNATE_IDLE_MINUTES  # default idle time before a tab hibernates, 0 never
+performance_recording = False  # default for recording timing spans from startup
+large_insert_kb = LARGE_INSERT_KB  # default size above which pastes are added in chunks
+undo_memory_mb = UNDO_MEMORY_MB  # default undo memory cap per tab
+undo_total_memory_mb = UNDO_TOTAL_MEMORY_MB  # default undo memory cap for all tabs
+undo_spill_to_disk = True  # default for moving old undo steps to disk instead of forgetting them
+
+class Tab:
+    """Everything the editor keeps about one open tab.
+    
+    Tabs are registered under the Tk path of their frame, which is what the
+    notebook reports and stays the same however tabs are moved or closed.
+    The widgets only exist while the tab is awake, a hibernated tab keeps
+    its content and view in sleeping instead.
+    """
+    __slots__ = ('id', 'frame', 'text_area', 'line_numbers', 'document', 'journal', 'history', 'sleeping',
+                 'last_active', 'path', 'encoding', 'dirty', 'load_cancel',
+                 'pending_jobs', 'refresh_after_id', 'journal_after_id', 'highlight_after_id')
+    
+    def __init__(self, frame):
+        self.id = str(frame)
+        self.frame = frame
+        self.text_area = None  # widgets are built when the tab is first shown
+        self.line_numbers = None
+        self.document = None  # Python side copy of the content while awake
+        self.journal = None  # log used to restore the tab after a crash
+        self.history = undo_history.History(undo_budget)  # undo and redo steps, kept while hibernated
+        self.sleeping = None  # content, cursor and view while hibernated
+        self.last_active = time.monotonic()
+        self.path = None  # file the tab was loaded from or last saved to
+        self.encoding = 'utf-8'  # replaced by the detected encoding when a file is opened
+        self.dirty = False
+        self.load_cancel = None  # stops the reader of a file still streaming in
+        self.pending_jobs = {}  # edit jobs waiting for the next coalesced pass
+        self.refresh_after_id = None
+        self.journal_after_id = None
+        self.highlight_after_id = None
+    
+    def cancel_timers(self):
+        for name in ('refresh_after_id', 'journal_after_id', 'highlight_after_id'):
+            after_id = getattr(self, name)
+            if after_id is not None:
+                win.after_cancel(after_id)
+                setattr(self, name, None)
+
+# Open tabs by id, in the order they were opened
+tabs = {}
+
+# Memory caps shared by the undo histories of every tab
+undo_budget = undo_history.Budget(UNDO_MEMORY_MB * 1024 * 1024, UNDO_TOTAL_MEMORY_MB * 1024 * 1024)
 
-# Dictionary to track file paths for each tab
-tab_file_paths = {}
+def current_tab():
+    return tabs.get(str(notebook.select()))
+
+def tab_at(index):
+    return tabs[str(notebook.tabs()[index])]
 
 # Variable to track split screen state
 split_screen_active = False
 split_screen_window = None
+sync_split_scrolling = True  # default for scrolling both split panes together
 
 def load_config():
     try:
         if os.path.exists(CONFIG_FILE):
             with open(CONFIG_FILE, 'r') as f:
                 config = json.load(f)
-                global current_theme, show_line_numbers, auto_save_enabled
+                global current_theme, show_line_numbers, auto_save_enabled, edit_debounce_ms
+                global huge_file_threshold_mb, prewarm_imports, sync_split_scrolling, hibernate_idle_minutes
+                global performance_recording, undo_memory_mb, undo_total_memory_mb, undo_spill_to_disk
+                global large_insert_kb
                 current_theme = config.get('theme', 'light')
                 show_line_numbers = config.get('show_line_numbers', True)
                 auto_save_enabled = config.get('auto_save', True)
+                edit_debounce_ms = config.get('edit_debounce_ms', EDIT_DEBOUNCE_MS)
+                huge_file_threshold_mb = config.get('huge_file_threshold_mb', HUGE_FILE_THRESHOLD_MB)
+                prewarm_imports = config.get('prewarm_imports', True)
+                sync_split_scrolling = config.get('sync_split_scrolling', True)
+                hibernate_idle_minutes = config.get('hibernate_idle_minutes', HIBERNATE_IDLE_MINUTES)
+                performance_recording = config.get('performance_recording', False)
+                undo_memory_mb = config.get('undo_memory_mb', UNDO_MEMORY_MB)
+                undo_total_memory_mb = config.get('undo_total_memory_mb', UNDO_TOTAL_MEMORY_MB)
+                undo_spill_to_disk = config.get('undo_spill_to_disk', True)
+                large_insert_kb = config.get('large_insert_kb', LARGE_INSERT_KB)
     except Exception as e:
         print(f"Error loading config: {e}")
 
@@ -53,31 +189,55 @@ def save_config():
         config = {
             'theme': current_theme,
             'show_line_numbers': show_line_numbers,
-            'auto_save': auto_save_enabled
+            'auto_save': auto_save_enabled,
+            'edit_debounce_ms': edit_debounce_ms,
+            'huge_file_threshold_mb': huge_file_threshold_mb,
+            'prewarm_imports': prewarm_imports,
+            'sync_split_scrolling': sync_split_scrolling,
+            'hibernate_idle_minutes': hibernate_idle_minutes,
+            'performance_recording': performance_recording,
+            'undo_memory_mb': undo_memory_mb,
+            'undo_total_memory_mb': undo_total_memory_mb,
+            'undo_spill_to_disk': undo_spill_to_disk,
+            'large_insert_kb': large_insert_kb
         }
         with open(CONFIG_FILE, 'w') as f:
             json.dump(config, f)
     except Exception as e:
         print(f"Error saving config: {e}")
 
-# Function to create a new tab
-def new_file():
-    # Create a frame to hold text area and line numbers
+def new_tab(title="New Untitled Document"):
+    # Notebook page and registry entry, the widgets are built separately
     frame = Frame(notebook)
     frame.pack(fill='both', expand=True)
+    tab = Tab(frame)
+    tabs[tab.id] = tab
+    notebook.add(frame, text=title)
+    return tab
+
+# Function to create a new tab
+def new_file():
+    tab = new_tab()
+    tab.journal = journal.Journal(JOURNAL_DIR)
+    return build_tab(tab)
+
+def build_tab(tab):
+    # Create the widgets of a tab, for a new tab or one woken from hibernation
+    frame = tab.frame
     
     # Create a sub-frame for better control of widget placement
     text_frame = Frame(frame)
     text_frame.pack(side='left', fill='both', expand=True)
     
-    # Create main text area
-    text_area = Text(text_frame, wrap="word", undo=True, font=("Arial", 12))
+    # Create main text area, its undo is done by the tab's history
+    text_area = Text(text_frame, wrap="word", undo=False, font=("Arial", 12))
     text_area.pack(side='left', fill='both', expand=True)
     
-    # Create line numbers text widget with fixed width font
-    line_numbers = Text(frame, width=6, padx=3, takefocus=0, border=0,
-                       background='#f0f0f0', state='disabled',
-                       font=("Courier New", 12))
+    # Create line numbers canvas, only the visible numbers are drawn on it
+    line_numbers = Canvas(frame, width=gutter_font.measure('0' * 6), takefocus=0,
+                          border=0, highlightthickness=0, background='#f0f0f0')
+    line_numbers.foreground = 'gray'
+    line_numbers.digits = 0
     if show_line_numbers:
         line_numbers.pack(side='right', fill='y')
 
@@ -87,153 +247,1005 @@ def new_file():
     
     # Configure text area scrolling
     def on_text_scroll(*args):
-        if show_line_numbers:
-            line_numbers.yview_moveto(args[0])
         scrollbar.set(*args)
+        update_line_numbers(text_area)
+        if text_area.match_cache is not None:
+            schedule_edit_job(text_area, 'matches', highlight_visible_matches)
+        if text_area.highlighter is not None and text_area.highlighter.busy:
+            schedule_edit_job(text_area, 'highlight', run_highlighting)
     
     text_area.configure(yscrollcommand=on_text_scroll)
-    line_numbers.configure(yscrollcommand=lambda *args: None)
     
     # Store references for later use
-    frame.text_area = text_area
-    frame.line_numbers = line_numbers
-    text_area.line_numbers = line_numbers
-    
-    # Add the frame to a new tab
-    notebook.add(frame, text="New Untitled Document")
-    
-    # Create a right-click menu for the tab
-    create_tab_menu(text_area)
+    tab.text_area = text_area
+    tab.line_numbers = line_numbers
+    tab.last_active = time.monotonic()
+    text_area.tab = tab
+    text_area.scrollbar = scrollbar
+    text_area.line_offset = 0  # first line shown by the huge file viewer
+    text_area.match_cache = None  # results of the last Find All
+    text_area.highlighter = None  # set once syntax highlighting is applied
+    text_area.soft_wrap = None  # layout of the soft breaks in long-line mode
+    text_area.reloading = False  # set while a change on disk is being read
+    text_area.large_insert = None  # paste or insert being added in chunks
+    text_area.held_by = set()  # windows using the text area, the tab stays awake while any are open
+    text_area.symbol_index = None  # started once the outline or Go To Symbol needs it
+    text_area.symbols_after_id = None
     
     # Create context menu for text area
     create_context_menu(text_area)
     
     # Apply current theme to new tab
-    set_theme(current_theme)
+    apply_theme(tab)
     
-    # Bind events for line numbers
-    text_area.bind('<KeyPress>', lambda e: win.after(1, lambda: update_line_numbers(text_area)))
-    text_area.bind('<KeyRelease>', lambda e: win.after(1, lambda: update_line_numbers(text_area)))
-    text_area.bind('<MouseWheel>', lambda e: line_numbers.yview_moveto(text_area.yview()[0]) if show_line_numbers else None)
-    text_area.bind('<Return>', lambda e: win.after(1, lambda: update_line_numbers(text_area)))
-    text_area.bind('<BackSpace>', lambda e: win.after(1, lambda: update_line_numbers(text_area)))
-    text_area.bind('<Delete>', lambda e: win.after(1, lambda: update_line_numbers(text_area)))
+    # Edits only mark the tab dirty, the refresh jobs run once per coalesced pass
+    install_edit_hook(text_area)
+    # Python side copy of the content, kept in step first so the other
+    # listeners can read from it. Only the undo history comes before it,
+    # it needs the text the edit removed.
+    tab.document = document.Document()
+    text_area.edit_listeners.append(track_undo_edits)
+    text_area.edit_listeners.append(track_document_edits)
+    text_area.edit_listeners.append(track_match_edits)
+    text_area.edit_listeners.append(track_highlight_edits)
+    text_area.edit_listeners.append(track_symbol_edits)
+    text_area.edit_listeners.append(track_journal_edits)
+    text_area.edit_listeners.append(lambda text_area, *edit: mark_dirty(text_area))
+    text_area.bind('<Configure>', lambda e: update_line_numbers(text_area))
     
     # Initial line numbers
     update_line_numbers(text_area)
     
-    # Setup auto-save
-    if auto_save_enabled:
-        setup_auto_save(text_area)
-    
     return text_area
 
+@perf.timed('line numbers')
 def update_line_numbers(text_area):
     if not show_line_numbers:
         return
         
-    line_numbers = text_area.line_numbers
-    line_numbers.configure(state='normal')
-    line_numbers.delete('1.0', END)
+    line_numbers = text_area.tab.line_numbers
+    line_numbers.delete('all')
     
-    # Get the total number of lines
-    contents = text_area.get('1.0', END)
-    num_lines = contents.count('\n') + (not contents.endswith('\n'))
+    # The Text widget keeps its own line index, so reading the line count
+    # does not depend on the size of the document
+    last_line = int(text_area.index('end-1c').split('.')[0])
+    layout = text_area.soft_wrap
     
-    # Create line numbers content with proper alignment
-    line_numbers_content = '\n'.join(f'{i:4d}' for i in range(1, num_lines + 1))
+    # Widen the gutter only when the number of digits changes
+    if layout is None:
+        digits = max(4, len(str(last_line + text_area.line_offset)))
+    else:
+        digits = max(4, len(str(layout.to_logical(last_line, 0)[0])))
+    if digits != line_numbers.digits:
+        line_numbers.digits = digits
+        line_numbers.configure(width=gutter_font.measure('0' * (digits + 2)))
+    x = gutter_font.measure('0' * (digits + 1))
     
-    # Insert line numbers
-    line_numbers.insert('1.0', line_numbers_content)
+    # Draw numbers only for the lines inside the viewport
+    index = text_area.index('@0,0')
+    while True:
+        dline = text_area.dlineinfo(index)
+        if dline is None:
+            break
+        line = int(index.split('.')[0])
+        # Rows after a soft break carry on the numbered line above
+        if layout is None:
+            line_numbers.create_text(x, dline[1], anchor='ne', text=str(line + text_area.line_offset),
+                                     fill=line_numbers.foreground, font=gutter_font)
+        elif not layout.is_continuation(line):
+            line_numbers.create_text(x, dline[1], anchor='ne', text=str(layout.to_logical(line, 0)[0]),
+                                     fill=line_numbers.foreground, font=gutter_font)
+        if line >= last_line:
+            break
+        index = f'{line + 1}.0'
+
+def parse_index(index):
+    line, column = index.split('.')
+    return int(line), int(column)
+
+def end_of_insert(start, chars):
+    # Position right after chars once inserted at start
+    newlines = chars.count('\n')
+    if newlines:
+        return start[0] + newlines, len(chars) - chars.rfind('\n') - 1
+    return start[0], start[1] + len(chars)
+
+def widget_index(text_area, line, column):
+    # Tk index of a document position, the two differ in long-line mode
+    if text_area.soft_wrap is not None:
+        line, column = text_area.soft_wrap.to_widget(line, column)
+    return f'{line}.{column}'
+
+def widget_range(text_area, line, column, length):
+    # Tk indices around length characters from a document position
+    if text_area.soft_wrap is None:
+        start = f'{line}.{column}'
+        return start, f'{start}+{length}c'
+    doc = text_area.tab.document
+    offset = doc.offset(line, column)
+    end = end_of_insert((line, column), doc.slice(offset, offset + length))
+    return widget_index(text_area, line, column), widget_index(text_area, *end)
+
+def document_position(text_area, index, view=None):
+    # (line, column) in the document of a Tk index of text_area or its peer view
+    position = parse_index((view or text_area).index(index))
+    if text_area.soft_wrap is not None:
+        return text_area.soft_wrap.to_logical(*position)
+    return position
+
+def append_text(text_area, text):
+    # Add text at the end, like a file being loaded. A line too long for Tk
+    # to lay out quickly switches the tab to long-line mode, where the widget
+    # gets a soft break every few thousand characters and the document is
+    # kept up to date directly.
+    layout = text_area.soft_wrap
+    row, column = parse_index(text_area.index('end-1c'))
+    if layout is None:
+        if not long_lines.has_long_line(text, column):
+            text_area.insert('end-1c', text)
+            return
+        layout = start_long_lines(text_area)
+    start = layout.to_logical(row, column)
+    widget_text = layout.segment(text, row, start[1], layout.row_start(row))
+    win.tk.call(str(text_area) + '_widget', 'insert', 'end-1c', widget_text)
+    text_area.edit_chars = text
+    end = end_of_insert(start, text)
+    for listener in text_area.edit_listeners:
+        listener(text_area, start, start, end)
+
+def start_long_lines(text_area):
+    text_area.soft_wrap = long_lines.SoftWrap()
+    bind_soft_breaks(text_area, text_area)
+    return text_area.soft_wrap
+
+def bind_soft_breaks(view, text_area):
+    # Keys that would only step over or delete a soft break act on the
+    # character beyond it, and copies never include soft breaks. Shift
+    # still extends the selection, with Control or Alt Tk acts on words.
+    layout = text_area.soft_wrap
+    
+    def at_row_start():
+        row, column = parse_index(view.index(INSERT))
+        return column == 0 and layout.is_continuation(row)
+    
+    def at_row_end():
+        row = parse_index(view.index(INSERT))[0]
+        return view.compare(INSERT, '==', f'{row}.end') and layout.is_continuation(row + 1)
+    
+    def beside(offset):
+        line, column = document_position(text_area, INSERT, view)
+        return widget_index(text_area, line, column + offset)
+    
+    def move(event, offset, check):
+        if event.state & WORD_KEY_MASK or not check():
+            return None
+        if event.state & SHIFT_MASK:
+            view.tk.call('tk::TextKeySelect', view, beside(offset))
+        else:
+            view.tag_remove('sel', '1.0', END)
+            view.mark_set(INSERT, beside(offset))
+        view.see(INSERT)
+        return 'break'
+    
+    def delete(event, offset, check):
+        if event.state & WORD_KEY_MASK or view.tag_ranges('sel') or not check():
+            return None
+        index = beside(offset)
+        view.delete(index, f'{index}+1c')
+        return 'break'
+    
+    def copy_selection(cut):
+        if view.tag_ranges('sel'):
+            text = text_area.tab.document.get(document_position(text_area, 'sel.first', view),
+                                              document_position(text_area, 'sel.last', view))
+            view.clipboard_clear()
+            view.clipboard_append(text)
+            if cut:
+                view.delete('sel.first', 'sel.last')
+        return 'break'
+    
+    view.bind('<Left>', lambda e: move(e, -1, at_row_start))
+    view.bind('<Right>', lambda e: move(e, 1, at_row_end))
+    view.bind('<BackSpace>', lambda e: delete(e, -1, at_row_start))
+    view.bind('<Delete>', lambda e: delete(e, 0, at_row_end))
+    view.bind('<<Copy>>', lambda e: copy_selection(False))
+    view.bind('<<Cut>>', lambda e: copy_selection(True))
+
+def install_edit_hook(text_area, owner=None):
+    # Route the widget's Tcl command through Python so every insert and
+    # delete, typed or programmatic, is reported to the edit listeners as
+    # (text_area, start, old_end, new_end) with (line, column) positions.
+    # A peer view reports its edits to the listeners of the tab it shows.
+    owner = owner or text_area
+    widget = str(text_area)
+    original = widget + '_widget'
+    win.tk.call('rename', widget, original)
+    if owner is text_area:
+        text_area.edit_listeners = []
     
-    # Sync scrolling
-    text_area.yview_moveto(text_area.yview()[0])
-    line_numbers.yview_moveto(text_area.yview()[0])
+    def resolve(index):
+        return parse_index(win.tk.call(original, 'index', index))
     
-    line_numbers.configure(state='disabled')
+    def notify(start, old_end, new_end):
+        for listener in owner.edit_listeners:
+            listener(owner, start, old_end, new_end)
+    
+    def split_long_rows(layout, first_row, last_row, chars):
+        # Cut rows an edit made too long back into segments, bottom up so
+        # the rows still to be checked keep their numbers
+        if long_lines.OVERLONG_SEGMENT.search(chars):
+            rows = range(last_row, first_row - 1, -1)
+        else:
+            rows = sorted({first_row, last_row}, reverse=True)
+        for row in rows:
+            length = resolve(f'{row}.end')[1]
+            if length <= long_lines.MAX_SEGMENT_CHARS:
+                continue
+            lengths = [long_lines.SEGMENT_CHARS] * (length // long_lines.SEGMENT_CHARS)
+            if length % long_lines.SEGMENT_CHARS:
+                lengths.append(length % long_lines.SEGMENT_CHARS)
+            column = layout.to_logical(row, 0)[1]
+            for position in range(len(lengths) - 1, 0, -1):
+                win.tk.call(original, 'insert', f'{row}.{position * long_lines.SEGMENT_CHARS}', '\n')
+            layout.add_breaks(row, column, lengths)
+    
+    def soft_wrapped_edit(layout, args, start, old_end, chars):
+        # The listeners get document positions, the soft breaks inside the
+        # edited range disappear with it
+        logical_start = layout.to_logical(*start)
+        logical_old_end = layout.to_logical(*old_end)
+        result = win.tk.call((original,) + args)
+        new_end = end_of_insert(start, chars)
+        logical_new_end = end_of_insert(logical_start, chars)
+        layout.note_edit(start, old_end, new_end, logical_new_end[1] - logical_old_end[1])
+        split_long_rows(layout, start[0], new_end[0], chars)
+        if logical_start != logical_old_end or chars:
+            owner.edit_chars = chars
+            notify(logical_start, logical_old_end, logical_new_end)
+        else:
+            # Only a soft break went, the rows still need renumbering
+            schedule_edit_job(owner, 'line_numbers', update_line_numbers)
+        return result
+    
+    def proxy(*args):
+        command = args[0] if args else None
+        layout = owner.soft_wrap
+        if command == 'edit' and args[1:2] in (('undo',), ('redo',), ('separator',), ('reset',)):
+            # Tk's own undo is off, the tab's history answers instead
+            history_command(owner, args[1], text_area)
+            return ''
+        if command not in ('insert', 'delete', 'replace'):
+            return win.tk.call((original,) + args)
+        if win.tk.call(original, 'cget', '-state') == 'disabled':
+            # Tk drops the edit, so there is nothing to report
+            return win.tk.call((original,) + args)
+        if owner.large_insert is not None and not owner.large_insert['writing']:
+            # Read only until a large insert is done or cancelled, its undo
+            # step must not take in other edits
+            win.bell()
+            return ''
+        
+        # Tk never edits past the final newline
+        last = resolve('end-1c')
+        start = min(resolve(args[1]), last)
+        if command == 'insert':
+            old_end = start
+            chars = ''.join(args[2::2])
+        else:
+            old_end = resolve(args[2]) if len(args) > 2 else resolve(f'{args[1]}+1c')
+            old_end = max(min(old_end, last), start)
+            chars = ''.join(args[3::2]) if command == 'replace' else ''
+        
+        if layout is not None:
+            return soft_wrapped_edit(layout, args, start, old_end, chars)
+        result = win.tk.call((original,) + args)
+        new_end = end_of_insert(start, chars)
+        if start != old_end or chars:
+            notify(start, old_end, new_end)
+        return result
+    
+    def undo_key(redo):
+        # Handled here once, the window's own Ctrl+Z binding would undo again
+        step_history(owner, redo, text_area)
+        return 'break'
+    
+    win.tk.createcommand(widget, proxy)
+    text_area.bind('<Destroy>', lambda e: win.tk.deletecommand(widget), add='+')
+    text_area.bind('<<Undo>>', lambda e: undo_key(False))
+    text_area.bind('<<Redo>>', lambda e: undo_key(True))
+    text_area.bind('<<Paste>>', lambda e: paste_clipboard(owner, text_area))
+
+def history_command(text_area, action, view=None):
+    # edit undo, redo, separator and reset of the widget, applied to the history
+    history = text_area.tab.history
+    if history is None:
+        return
+    if action == 'separator':
+        history.close_run()
+    elif action == 'reset':
+        history.clear()
+    else:
+        step_history(text_area, action == 'redo', view)
+
+@perf.timed('undo')
+def step_history(text_area, redo=False, view=None):
+    # Undo or redo one step of the tab's history and put the cursor where
+    # it changed, in view when it came from a peer. Only the characters of
+    # the step are touched, so this takes as long on any size of file.
+    history = text_area.tab.history
+    if history is None:
+        return False
+    deltas = history.redo() if redo else history.undo()
+    if not deltas:
+        return False
+    replay_deltas(text_area, deltas)
+    if history.at_saved():
+        text_area.edit_modified(False)
+    line, column, old, new = deltas[-1]
+    view = view or text_area
+    view.tag_remove('sel', '1.0', END)
+    view.mark_set(INSERT, widget_index(text_area, *end_of_insert((line, column), new)))
+    view.see(INSERT)
+    return True
+
+def replay_deltas(text_area, deltas):
+    # Apply (line, column, old, new) deltas from the history without
+    # recording them again
+    history = text_area.tab.history
+    history.replaying = True
+    try:
+        for line, column, old, new in deltas:
+            text_area.replace(widget_index(text_area, line, column),
+                              widget_index(text_area, *end_of_insert((line, column), old)), new)
+    finally:
+        history.replaying = False
+
+def paste_clipboard(text_area, view):
+    # Paste like Tk does, but through insert_text so a large clipboard does
+    # not freeze the window
+    if view.cget('state') == 'disabled':
+        return 'break'
+    try:
+        text = view.clipboard_get()
+    except TclError:
+        return 'break'
+    begin_undo_step(text_area)
+    if win.tk.call('tk', 'windowingsystem') != 'x11' and view.tag_ranges('sel'):
+        view.delete('sel.first', 'sel.last')
+    insert_text(text_area, INSERT, text, view)
+    end_undo_step(text_area)
+    view.see(INSERT)
+    return 'break'
+
+def insert_text(text_area, index, text, view=None):
+    # Insert text at index of view, text_area or one of its peers, as one
+    # undo step. Above the large insert threshold the text is added in
+    # chunks over several passes of the event loop instead.
+    view = view or text_area
+    if len(text) <= large_insert_kb * 1024:
+        begin_undo_step(text_area)
+        view.insert(index, text)
+        end_undo_step(text_area)
+    elif text_area.large_insert is not None:
+        win.bell()  # one at a time
+    else:
+        start_large_insert(text_area, document_position(text_area, index, view), text)
+
+def start_large_insert(text_area, position, text):
+    # The chunks go in from the last one back, all at a mark that stays in
+    # front of them. The text is read only until it is done, so the undo
+    # step holds nothing but the insert and Cancel takes back only that. A
+    # progress bar and a Cancel button are shown below the text meanwhile.
+    tab = text_area.tab
+    history = tab.history
+    text_area.mark_set('large_insert', widget_index(text_area, *position))
+    text_area.mark_gravity('large_insert', 'left')
+    if history is not None:
+        history.begin_step()
+    
+    progress_frame = Frame(tab.frame)
+    progress_frame.pack(side='bottom', fill='x', before=text_area.master)
+    Label(progress_frame, text="Inserting").pack(side='left', padx=5)
+    progress = ttk.Progressbar(progress_frame, maximum=len(text))
+    progress.pack(side='left', fill='x', expand=True, padx=5, pady=2)
+    # Characters still to insert, the ones in front, and whether the edits
+    # going through are the insert's own
+    state = {'remaining': len(text), 'writing': False}
+    text_area.large_insert = state
+    
+    def finish():
+        text_area.large_insert = None
+        text_area.mark_unset('large_insert')
+        progress_frame.destroy()
+    
+    def cancel():
+        # Take back everything done as part of the step, it does not stay
+        # in the history
+        state['writing'] = True
+        try:
+            if history is not None:
+                replay_deltas(text_area, history.cancel_step())
+            else:
+                start = document_position(text_area, 'large_insert')
+                end = end_of_insert(start, text[state['remaining']:])
+                text_area.delete(widget_index(text_area, *start), widget_index(text_area, *end))
+        finally:
+            finish()
+    
+    Button(progress_frame, text="Cancel", command=cancel).pack(side='right', padx=5, pady=2)
+    
+    @perf.timed('insert batch')
+    def feed():
+        if text_area.large_insert is not state or not text_area.winfo_exists():
+            return  # cancelled or the tab was closed
+        deadline = time.perf_counter() + LOAD_BATCH_MS / 1000
+        remaining = state['remaining']
+        state['writing'] = True
+        try:
+            while remaining and time.perf_counter() < deadline:
+                chunk_start = max(remaining - INSERT_CHUNK_CHARS, 0)
+                text_area.insert('large_insert', text[chunk_start:remaining])
+                remaining = chunk_start
+        finally:
+            state['writing'] = False
+        state['remaining'] = remaining
+        progress['value'] = len(text) - remaining
+        if remaining:
+            win.after(LOAD_POLL_MS, feed)
+            return
+        if history is not None:
+            history.end_step()
+        finish()
+    
+    feed()
+
+def mark_saved(text_area):
+    # The buffer matches the file, undo or redo coming back to this point
+    # clears the modified flag again
+    text_area.edit_modified(False)
+    if text_area.tab.history is not None:
+        text_area.tab.history.mark_saved()
+
+def begin_undo_step(text_area):
+    # Edits up to end_undo_step are undone and redone together
+    if text_area.tab.history is not None:
+        text_area.tab.history.begin_step()
+
+def end_undo_step(text_area):
+    if text_area.tab.history is not None:
+        text_area.tab.history.end_step()
+
+# Jobs run for every tab after an edit, keyed by name so repeats merge
+edit_jobs = {}
+
+# Counters used to check that edit driven jobs are being coalesced
+edit_job_stats = {'requested': 0, 'executed': 0}
+
+def register_edit_job(name, job):
+    edit_jobs[name] = job
+
+def mark_dirty(text_area):
+    # Queue every registered edit job for this tab
+    for name, job in edit_jobs.items():
+        schedule_edit_job(text_area, name, job)
+
+def schedule_edit_job(text_area, name, job):
+    edit_job_stats['requested'] += 1
+    tab = text_area.tab
+    tab.pending_jobs[name] = job
+    
+    # A pass is already queued, the job will run as part of it
+    if tab.refresh_after_id is not None:
+        return
+    
+    if edit_debounce_ms > 0:
+        tab.refresh_after_id = win.after(edit_debounce_ms, lambda: run_edit_jobs(text_area))
+    else:
+        tab.refresh_after_id = win.after_idle(lambda: run_edit_jobs(text_area))
+
+@perf.timed('edit jobs')
+def run_edit_jobs(text_area):
+    tab = text_area.tab
+    tab.refresh_after_id = None
+    jobs = tab.pending_jobs
+    tab.pending_jobs = {}
+    if not text_area.winfo_exists():
+        return
+    
+    for job in jobs.values():
+        edit_job_stats['executed'] += 1
+        try:
+            job(text_area)
+        except Exception as e:
+            print(f"Edit job failed: {e}")
+
+def track_modified_state(text_area):
+    text_area.tab.dirty = text_area.edit_modified()
+
+register_edit_job('line_numbers', update_line_numbers)
+register_edit_job('modified', track_modified_state)
+
+def inserted_text(text_area, start, new_end):
+    # Characters an edit put between start and new_end
+    if text_area.soft_wrap is not None:
+        # The widget also holds the soft breaks, the hook kept the real text
+        return text_area.edit_chars
+    return text_area.get(f'{start[0]}.{start[1]}', f'{new_end[0]}.{new_end[1]}')
+
+def track_undo_edits(text_area, start, old_end, new_end):
+    # Runs before the document is updated, so it still holds the removed text
+    history = text_area.tab.history
+    if history is not None and not history.replaying:
+        history.record(start, text_area.tab.document.get(start, old_end),
+                       inserted_text(text_area, start, new_end))
+
+@perf.timed('document edit')
+def track_document_edits(text_area, start, old_end, new_end):
+    doc = text_area.tab.document
+    offset = doc.offset(*start)
+    doc.replace(offset, doc.offset(*old_end), inserted_text(text_area, start, new_end))
+
+def track_journal_edits(text_area, start, old_end, new_end):
+    tab = text_area.tab
+    if tab.journal is not None:
+        tab.journal.record(start, old_end, tab.document.get(start, new_end))
+
+def journal_meta(tab):
+    if tab.text_area is None:
+        view = tab.sleeping
+    else:
+        view = {'cursor': '%d.%d' % document_position(tab.text_area, INSERT), 'view': tab.text_area.yview()[0]}
+    return {
+        'title': notebook.tab(tab.frame, 'text'),
+        'path': tab.path,
+        'encoding': tab.encoding,
+        'cursor': view['cursor'],
+        'view': view['view']
+    }
+
+def schedule_journal_flush(text_area):
+    # Edits are batched for a while before they are handed to the writer
+    tab = text_area.tab
+    if tab.journal is not None and tab.journal_after_id is None:
+        tab.journal_after_id = win.after(JOURNAL_FLUSH_MS, lambda: flush_journal(tab))
+
+@perf.timed('journal flush')
+def flush_journal(tab):
+    tab.journal_after_id = None
+    if tab.journal is None or tab.text_area is None:
+        return
+    if tab.journal.size > journal.COMPACT_BYTES:
+        tab.journal.compact(tab.document.snapshot(), journal_meta(tab))
+    else:
+        tab.journal.flush(journal_meta(tab))
+
+def journal_saved(tab, file_path):
+    # The file now holds the whole buffer, so the log can start again from it
+    if tab.journal is not None:
+        tab.journal.rebase_on_file(file_path, tab.encoding, meta=journal_meta(tab))
+
+register_edit_job('journal', schedule_journal_flush)
+
+def get_lines(text_area, first, last):
+    return text_area.tab.document.lines(first, last)
+
+def start_search(text_area, pattern, on_done=None):
+    # Scan one snapshot of the buffer on a worker thread, edits made in the
+    # meantime are recorded by the cache and replayed once it is filled
+    cache = search_engine.MatchCache(pattern)
+    text_area.match_cache = cache
+    snapshot = text_area.tab.document.snapshot()
+    results = queue.Queue(maxsize=1)
+    
+    def scan():
+        with perf.span('find scan'):
+            results.put(search_engine.scan(pattern, snapshot.text()))
+    
+    threading.Thread(target=scan, daemon=True).start()
+    
+    def poll():
+        if text_area.match_cache is not cache or not text_area.winfo_exists():
+            return  # a newer search replaced this one, or the tab was closed
+        try:
+            keys, lengths = results.get_nowait()
+        except queue.Empty:
+            win.after(SEARCH_POLL_MS, poll)
+            return
+        cache.fill(keys, lengths)
+        cache.apply_edits(lambda first, last: get_lines(text_area, first, last))
+        highlight_visible_matches(text_area)
+        if on_done:
+            on_done(cache)
+    
+    win.after(SEARCH_POLL_MS, poll)
+    return cache
+
+def track_match_edits(text_area, start, old_end, new_end):
+    if text_area.match_cache is not None:
+        text_area.match_cache.note_edit(start, old_end, new_end)
+
+@perf.timed('match highlight')
+def highlight_visible_matches(text_area):
+    cache = text_area.match_cache
+    if cache is None or not cache.ready:
+        return
+    cache.apply_edits(lambda first, last: get_lines(text_area, first, last))
+    
+    # Only the matches on screen are tagged, in a single Tk call
+    text_area.tag_remove("highlight", "1.0", END)
+    first = document_position(text_area, '@0,0')[0]
+    last = document_position(text_area, f'@0,{text_area.winfo_height()}')[0]
+    ranges = []
+    for key, length in cache.in_lines(first, last):
+        line, column = search_engine.split_key(key)
+        ranges += widget_range(text_area, line, column, length)
+    if ranges:
+        text_area.tag_add("highlight", *ranges)
+    text_area.tag_config("highlight", background="yellow")
+
+register_edit_job('matches', highlight_visible_matches)
+
+def go_to_match(text_area, forward=True):
+    cache = text_area.match_cache
+    if cache is None or not cache.ready:
+        return
+    cache.apply_edits(lambda first, last: get_lines(text_area, first, last))
+    line, column = document_position(text_area, INSERT)
+    match = cache.next_after(line, column) if forward else cache.previous_before(line, column)
+    if match is None:
+        return
+    
+    start, end = widget_range(text_area, *match)
+    text_area.tag_remove("sel", "1.0", END)
+    text_area.tag_add("sel", start, end)
+    text_area.mark_set(INSERT, start)
+    text_area.see(start)
 
 def open_file():
     file_path = filedialog.askopenfilename(filetypes=[("Text Files", "*.txt"), ("All Files", "*.*")])
     if file_path:
-        text_area = new_file()
-        with open(file_path, 'r') as file:
-            text_area.insert(1.0, file.read())
-        notebook.tab(notebook.index(text_area.master), text=file_path.split("/")[-1])  # Use file name as tab title
-        tab_file_paths[notebook.index(text_area.master)] = file_path  # Store file path
+        open_path(file_path)
+
+def open_path(file_path, position=None):
+    # Open file_path, or select its tab when it is already open, and
+    # optionally go to position, a (line, column, length) to select
+    for tab in tabs.values():
+        if tab.path and os.path.abspath(tab.path) == os.path.abspath(file_path):
+            notebook.select(tab.frame)
+            if position:
+                show_position(get_current_text_area(), *position)
+            return
+    
+    encoding = file_loader.detect_encoding(file_path)
+    # The viewer scans for b'\n', which only works for byte oriented encodings
+    if (os.path.getsize(file_path) > huge_file_threshold_mb * 1024 * 1024
+            and not encoding.startswith(('utf-16', 'utf-32'))):
+        text_area = open_huge_file(file_path, encoding)
+        if position:
+            text_area.scroll_to(position[0])
+    else:
+        load_file(file_path, position)
+
+def show_position(text_area, line, column=0, length=0):
+    if hasattr(text_area, 'huge_index'):
+        text_area.scroll_to(line)
+        return
+    start, end = widget_range(text_area, line, column, length)
+    text_area.tag_remove("sel", "1.0", END)
+    if length:
+        text_area.tag_add("sel", start, end)
+    text_area.mark_set(INSERT, start)
+    text_area.see(start)
+    text_area.focus_set()
+
+def load_file(file_path, position=None):
+    text_area = new_file()
+    tab = text_area.tab
+    frame = tab.frame
+    notebook.tab(frame, text=os.path.basename(file_path))  # Use file name as tab title
+    notebook.select(frame)
+    
+    encoding = file_loader.detect_encoding(file_path)
+    tab.encoding = encoding
+    total_bytes = max(os.path.getsize(file_path), 1)
+    
+    # Progress bar and cancel button shown while the file streams in
+    progress_frame = Frame(frame)
+    progress_frame.pack(side='bottom', fill='x', before=text_area.master)
+    progress = ttk.Progressbar(progress_frame, maximum=total_bytes)
+    progress.pack(side='left', fill='x', expand=True, padx=5, pady=2)
+    
+    # Loading should not fill the undo history with one step per chunk, nor
+    # the journal, which starts from the file once it is loaded
+    history = tab.history
+    tab.history = None
+    tab.journal = None
+    chunks, cancel = file_loader.start_reader(file_path, encoding)
+    tab.load_cancel = cancel
+    started = time.perf_counter()
+    text_area.load_stats = {'first_paint': None, 'total': None, 'bytes': 0}
+    
+    def finish():
+        progress_frame.destroy()
+        tab.load_cancel = None
+        tab.history = history
+        mark_saved(text_area)
+        text_area.load_stats['total'] = time.perf_counter() - started
+    
+    def cancel_load():
+        cancel.set()
+        text_area.load_stats['total'] = time.perf_counter() - started
+        # A partially loaded file must not be saved over the original
+        forget_tab(tab)
+    
+    Button(progress_frame, text="Cancel", command=cancel_load).pack(side='right', padx=5, pady=2)
+    
+    @perf.timed('load batch')
+    def feed():
+        if cancel.is_set() or tabs.get(tab.id) is not tab:
+            return
+        deadline = time.perf_counter() + LOAD_BATCH_MS / 1000
+        while time.perf_counter() < deadline:
+            try:
+                kind, payload, bytes_read = chunks.get_nowait()
+            except queue.Empty:
+                break
+            text_area.load_stats['bytes'] = bytes_read
+            if kind == 'data':
+                append_text(text_area, payload)
+                if text_area.load_stats['first_paint'] is None:
+                    text_area.load_stats['first_paint'] = time.perf_counter() - started
+            else:
+                finish()
+                if kind == 'error':
+                    messagebox.showerror("Open", f"Could not read {file_path}: {payload}")
+                else:
+                    set_tab_path(tab, file_path)
+                    tab.journal = journal.Journal(JOURNAL_DIR)
+                    journal_saved(tab, file_path)
+                    if position:
+                        show_position(text_area, *position)
+                return
+        progress['value'] = text_area.load_stats['bytes']
+        win.after(LOAD_POLL_MS, feed)
+    
+    win.after(LOAD_POLL_MS, feed)
+    return text_area
+
+def open_huge_file(file_path, encoding='utf-8'):
+    # Read-only tab that only ever holds the lines inside the viewport
+    text_area = new_file()
+    frame = text_area.tab.frame
+    title = os.path.basename(file_path)
+    notebook.tab(frame, text=title)
+    notebook.select(frame)
+    
+    index = LineIndex(file_path, encoding)
+    text_area.huge_index = index
+    text_area.tab.journal = None  # read-only, nothing to recover or undo
+    text_area.tab.history.discard()
+    text_area.tab.history = None
+    text_area.top_line = 1
+    text_area.configure(wrap='none', state='disabled')
+    linespace = font.Font(font=text_area.cget('font')).metrics('linespace')
+    
+    def visible_lines():
+        return max(1, text_area.winfo_height() // linespace)
+    
+    def render():
+        count = index.line_count
+        visible = visible_lines()
+        top = min(max(text_area.top_line, 1), max(count - visible + 1, 1))
+        text_area.top_line = top
+        text_area.line_offset = top - 1
+        
+        text_area.configure(state='normal')
+        text_area.delete('1.0', END)
+        text_area.insert('1.0', '\n'.join(index.lines(top - 1, visible)))
+        text_area.configure(state='disabled')
+        
+        text_area.scrollbar.set((top - 1) / count, min((top - 1 + visible) / count, 1.0))
+        update_line_numbers(text_area)
+    
+    def scroll_to(line):
+        text_area.top_line = line
+        render()
+        return 'break'
+    
+    def on_scrollbar(action, amount, unit=None):
+        if action == 'moveto':
+            scroll_to(int(float(amount) * index.line_count) + 1)
+        elif unit == 'pages':
+            scroll_to(text_area.top_line + int(amount) * visible_lines())
+        else:
+            scroll_to(text_area.top_line + int(amount))
+    
+    def on_mouse_wheel(event):
+        if event.num == 4 or event.delta > 0:
+            return scroll_to(text_area.top_line - 3)
+        return scroll_to(text_area.top_line + 3)
+    
+    text_area.scrollbar.configure(command=on_scrollbar)
+    text_area.configure(yscrollcommand=lambda *args: None)
+    text_area.bind('<Configure>', lambda e: render())
+    text_area.bind('<MouseWheel>', on_mouse_wheel)
+    text_area.bind('<Button-4>', on_mouse_wheel)
+    text_area.bind('<Button-5>', on_mouse_wheel)
+    text_area.bind('<Up>', lambda e: scroll_to(text_area.top_line - 1))
+    text_area.bind('<Down>', lambda e: scroll_to(text_area.top_line + 1))
+    text_area.bind('<Prior>', lambda e: scroll_to(text_area.top_line - visible_lines()))
+    text_area.bind('<Next>', lambda e: scroll_to(text_area.top_line + visible_lines()))
+    text_area.bind('<Control-Home>', lambda e: scroll_to(1))
+    text_area.bind('<Control-End>', lambda e: scroll_to(index.line_count))
+    text_area.bind('<Destroy>', lambda e: index.close(), add='+')
+    text_area.scroll_to = scroll_to
+    
+    # Keep rendering while the index is built so the scroll range grows
+    def watch_index():
+        if not text_area.winfo_exists():
+            return
+        render()
+        if index.done:
+            notebook.tab(frame, text=title)
+        else:
+            notebook.tab(frame, text=f"{title} (indexing {index.progress:.0%})")
+            win.after(200, watch_index)
+    
+    watch_index()
+    return text_area
+
+def go_to_line():
+    text_area = get_current_text_area()
+    if not text_area:
+        return
+    line = simpledialog.askinteger("Go To Line", "Line number:", minvalue=1)
+    if not line:
+        return
+    if hasattr(text_area, 'huge_index'):
+        text_area.scroll_to(line)
+    else:
+        text_area.mark_set(INSERT, widget_index(text_area, line, 0))
+        text_area.see(INSERT)
+
+@perf.timed('save file')
+def save_tab(tab, file_path):
+    watcher.pause(file_path)
+    try:
+        # The same bytes an auto-save of the buffer writes
+        with open(file_path, 'wb') as file:
+            for data in autosave.encoded_chunks(tab.document.snapshot(), tab.encoding):
+                file.write(data)
+    finally:
+        watcher.resume(file_path)
+    if tab.text_area is not None:
+        mark_saved(tab.text_area)
+    notebook.tab(tab.frame, text=file_path.split("/")[-1])  # Update tab title
+    set_tab_path(tab, file_path)
+    journal_saved(tab, file_path)
 
 def save_as_text():
-    current_text_area = notebook.nametowidget(notebook.select()).winfo_children()[1]
+    current_text_area = get_current_text_area()
     file_path = filedialog.asksaveasfilename(defaultextension=".txt", filetypes=[("Text Files", "*.txt"), ("All Files", "*.*")])
     if file_path:
-        with open(file_path, 'w') as file:
-            file.write(current_text_area.get(1.0, END))
-        notebook.tab(notebook.index(current_text_area.master), text=file_path.split("/")[-1])  # Update tab title
-        tab_file_paths[notebook.index(current_text_area.master)] = file_path  # Store file path
+        save_tab(current_text_area.tab, file_path)
+
+def hold_awake(text_area, window):
+    # Keep the tab of text_area from hibernating until window is closed
+    text_area.held_by.add(window)
+    window.bind('<Destroy>', lambda e: text_area.held_by.discard(window) if e.widget is window else None, add='+')
 
 def save_as_pdf():
-    current_text_area = notebook.nametowidget(notebook.select()).winfo_children()[1]  # Get text area from frame
+    current_text_area = get_current_text_area()
     file_path = filedialog.asksaveasfilename(defaultextension=".pdf", 
                                             filetypes=[("PDF Files", "*.pdf"), 
                                                      ("All Files", "*.*")])
-    if file_path:
-        pdf_canvas = canvas.Canvas(file_path, pagesize=letter)
-        text = current_text_area.get(1.0, END)
+    if not file_path:
+        return
+    
+    export_window = Toplevel(win)
+    export_window.title("Save As PDF")
+    hold_awake(current_text_area, export_window)  # the export reads its lines until it is done
+    export = None
+    
+    options_frame = Frame(export_window)
+    options_frame.pack(fill=X)
+    numbers_var = BooleanVar(value=False)
+    colors_var = BooleanVar(value=current_text_area.highlighter is not None)
+    Checkbutton(options_frame, text="Line numbers", variable=numbers_var).pack(side=LEFT, padx=5)
+    Checkbutton(options_frame, text="Syntax colours", variable=colors_var).pack(side=LEFT)
+    
+    progress = ttk.Progressbar(export_window, length=300)
+    progress.pack(fill=X, padx=5, pady=5)
+    status = Label(export_window, text="")
+    status.pack()
+    
+    def start_export():
+        nonlocal export
+        import pdf_export
+        lexer = style = None
+        if colors_var.get():
+            from pygments.styles import get_style_by_name
+            lexer = text_area_lexer(current_text_area)
+            style = get_style_by_name(HIGHLIGHT_STYLES['light'])  # pages are white
+        # Lines are read from the buffer a chunk at a time while the worker
+        # keeps up, so the document is never copied out whole
+        last_line = document_position(current_text_area, 'end-1c')[0]
+        export = pdf_export.PdfExport(file_path, numbers_var.get(), lexer, style, line_count=last_line)
+        export_button.configure(state='disabled')
+        progress.configure(maximum=last_line)
+        next_line = 1
         
-        # Configure text properties
-        pdf_canvas.setFont("Helvetica", 12)
-        y = 750  # Starting y position
+        def feed():
+            nonlocal next_line
+            while next_line is not None and not export.chunks.full():
+                if next_line > last_line or not current_text_area.winfo_exists():
+                    export.put(None)
+                    next_line = None
+                else:
+                    chunk_last = min(next_line + PDF_CHUNK_LINES - 1, last_line)
+                    export.put(get_lines(current_text_area, next_line, chunk_last))
+                    next_line = chunk_last + 1
+            progress['value'] = export.lines_done
+            status.configure(text=f"{export.pages} pages")
+            if not export.done:
+                win.after(PDF_POLL_MS, feed)
+                return
+            export_window.destroy()
+            if export.error is not None:
+                messagebox.showerror("Save as PDF", f"Could not export {file_path}: {export.error}")
+            elif not export.cancel.is_set():
+                messagebox.showinfo("Save as PDF", f"Saved as PDF: {file_path}")
         
-        # Split text into lines and write each line
-        for line in text.split('\n'):
-            if y < 50:  # Check if we need a new page
-                pdf_canvas.showPage()
-                y = 750
-                pdf_canvas.setFont("Helvetica", 12)
-            
-            pdf_canvas.drawString(72, y, line)
-            y -= 15  # Move down for next line
-            
-        pdf_canvas.save()
-        messagebox.showinfo("Save as PDF", f"Saved as PDF: {file_path}")
+        feed()
+    
+    def cancel_export():
+        if export is None:
+            export_window.destroy()
+        else:
+            export.cancel.set()  # the window closes once the worker stops
+    
+    buttons_frame = Frame(export_window)
+    buttons_frame.pack(pady=5)
+    export_button = Button(buttons_frame, text="Export", command=start_export)
+    export_button.pack(side=LEFT, padx=5)
+    Button(buttons_frame, text="Cancel", command=cancel_export).pack(side=LEFT, padx=5)
+    export_window.protocol("WM_DELETE_WINDOW", cancel_export)
 
 def save_as_batch_file():
-    current_text_area = notebook.nametowidget(notebook.select()).winfo_children()[1]
+    current_text_area = get_current_text_area()
     file_path = filedialog.asksaveasfilename(defaultextension=".bat", filetypes=[("Batch Files", "*.bat"), ("All Files", "*.*")])
     if file_path:
-        with open(file_path, 'w') as file:
-            file.write(current_text_area.get(1.0, END))
-        notebook.tab(notebook.index(current_text_area.master), text=file_path.split("/")[-1])  # Update tab title
-        tab_file_paths[notebook.index(current_text_area.master)] = file_path  # Store file path
+        save_tab(current_text_area.tab, file_path)
 
 def save_as_command_prompt_file():
-    current_text_area = notebook.nametowidget(notebook.select()).winfo_children()[1]
+    current_text_area = get_current_text_area()
     file_path = filedialog.asksaveasfilename(defaultextension=".cmd", filetypes=[("Command Files", "*.cmd"), ("All Files", "*.*")])
     if file_path:
-        with open(file_path, 'w') as file:
-            file.write(current_text_area.get(1.0, END))
-        notebook.tab(notebook.index(current_text_area.master), text=file_path.split("/")[-1])  # Update tab title
-        tab_file_paths[notebook.index(current_text_area.master)] = file_path  # Store file path
+        save_tab(current_text_area.tab, file_path)
 
 def exit_program():
+    # A clean exit leaves nothing to recover
+    for tab in tabs.values():
+        if tab.journal is not None:
+            tab.journal.discard()
+    journal.wait()
     win.quit()
 
 def get_current_text_area():
-    frame = notebook.nametowidget(notebook.select())
-    # Find the text area in the frame hierarchy
-    for child in frame.winfo_children():
-        if isinstance(child, Frame):  # text_frame
-            for subchild in child.winfo_children():
-                if isinstance(subchild, Text):
-                    return subchild
-    return None
+    tab = current_tab()
+    if tab is None:
+        return None
+    return tab.text_area or wake_tab(tab)
 
 def undo():
     text_area = get_current_text_area()
     if text_area:
-        try:
-            text_area.edit_undo()
-        except:
-            pass
+        step_history(text_area)
+
+def redo():
+    text_area = get_current_text_area()
+    if text_area:
+        step_history(text_area, redo=True)
 
 def cut():
     text_area = get_current_text_area()
@@ -263,155 +1275,388 @@ def select_all():
 def insert_time_date():
     text_area = get_current_text_area()
     if text_area:
-        text_area.insert(INSERT, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        insert_text(text_area, INSERT, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
 
 def find():
-    current_text_area = notebook.nametowidget(notebook.select()).winfo_children()[1]
+    current_text_area = get_current_text_area()
     find_text = simpledialog.askstring("Find", "Enter text to find:")
     if find_text:
-        start_pos = current_text_area.search(find_text, "1.0", END)
+        if current_text_area.soft_wrap is None:
+            start_pos = current_text_area.search(find_text, "1.0", END)
+        else:
+            # The widget's own search would miss matches cut by a soft break
+            match = next(search_engine.iter_matches(search_engine.compile_pattern(find_text),
+                                                    current_text_area.tab.document.text()), None)
+            start_pos = match and widget_index(current_text_area, match[0], match[1])
         if start_pos:
-            current_text_area.tag_add("highlight", start_pos, f"{start_pos}+{len(find_text)}c")
+            line, column = document_position(current_text_area, start_pos)
+            current_text_area.tag_add("highlight", *widget_range(current_text_area, line, column, len(find_text)))
             current_text_area.tag_config("highlight", background="yellow")
         else:
             # Show a message box if the text is not found
             messagebox.showinfo("Not Found", f"'{find_text}' not found in the text.")
 
+@perf.timed('replace all')
+def replace_all(text_area, pattern, template, regex=False, dry_run=False):
+    # Find every match in one pass over a snapshot of the whole document,
+    # so matches may span lines and \A and \Z anchor to the document, then
+    # replace them from the last one back so edits never shift the ones
+    # still to do, touching only the matched characters
+    found = list(search_engine.replacements(pattern, text_area.tab.document.snapshot().text(), template, regex))
+    if dry_run:
+        return len(found)
+    
+    view = text_area.yview()[0]
+    # Record the whole operation as a single undo step
+    begin_undo_step(text_area)
+    try:
+        for line, column, matched, replacement in reversed(found):
+            if matched != replacement:
+                text_area.replace(widget_index(text_area, line, column),
+                                  widget_index(text_area, *end_of_insert((line, column), matched)),
+                                  replacement)
+    finally:
+        end_undo_step(text_area)
+        text_area.yview_moveto(view)
+    return len(found)
+
 def replace():
-    current_text_area = notebook.nametowidget(notebook.select()).winfo_children()[1]
+    current_text_area = get_current_text_area()
     
     replace_window = Toplevel(win)
     replace_window.title("Replace")
+    hold_awake(current_text_area, replace_window)
     
-    Label(replace_window, text="Find:").pack(side=LEFT, padx=5)
-    entry_find = Entry(replace_window, width=30)
+    entries_frame = Frame(replace_window)
+    entries_frame.pack(fill=X)
+    Label(entries_frame, text="Find:").pack(side=LEFT, padx=5)
+    entry_find = Entry(entries_frame, width=30)
     entry_find.pack(side=LEFT, padx=5)
     
-    Label(replace_window, text="Replace:").pack(side=LEFT, padx=5)
-    entry_replace = Entry(replace_window, width=30)
+    Label(entries_frame, text="Replace:").pack(side=LEFT, padx=5)
+    entry_replace = Entry(entries_frame, width=30)
     entry_replace.pack(side=LEFT, padx=5)
     
-    def replace_text():
+    # Search options, in regex mode the replacement may use \1 or \g<name>
+    options_frame = Frame(replace_window)
+    options_frame.pack(fill=X)
+    regex_var = BooleanVar(value=False)
+    case_var = BooleanVar(value=True)
+    word_var = BooleanVar(value=False)
+    Checkbutton(options_frame, text="Regex", variable=regex_var).pack(side=LEFT, padx=5)
+    Checkbutton(options_frame, text="Match case", variable=case_var).pack(side=LEFT)
+    Checkbutton(options_frame, text="Whole word", variable=word_var).pack(side=LEFT)
+    
+    status = Label(options_frame, text="")
+    status.pack(side=RIGHT, padx=5)
+    
+    def run_replace(dry_run):
         find_text = entry_find.get()
-        replace_text_value = entry_replace.get()  # Change variable name to avoid confusion
-        content = current_text_area.get(1.0, END)
+        if not find_text:
+            return
+        try:
+            pattern = search_engine.compile_pattern(find_text, regex_var.get(), case_var.get(), word_var.get())
+            count = replace_all(current_text_area, pattern, entry_replace.get(), regex_var.get(), dry_run)
+        except re.error as e:
+            status.configure(text=f"Invalid pattern: {e}")
+            return
         
-        # Check if the text to find exists in the content
-        if find_text in content:
-            new_content = content.replace(find_text, replace_text_value)
-            current_text_area.delete(1.0, END)
-            current_text_area.insert(1.0, new_content)
-            replace_window.destroy()  # Close the replace window after replacing
+        if not count:
+            status.configure(text=f"'{find_text}' not found in the text.")
+        elif dry_run:
+            status.configure(text=f"{count} occurrences would be replaced")
         else:
-            # Show a message box if the text is not found
-            messagebox.showinfo("Not Found", f"'{find_text}' not found in the text.")
+            replace_window.destroy()  # Close the replace window after replacing
 
-    Button(replace_window, text="Replace", command=replace_text).pack(side=LEFT, padx=5)
+    Button(entries_frame, text="Count", command=lambda: run_replace(True)).pack(side=LEFT, padx=5)
+    Button(entries_frame, text="Replace All", command=lambda: run_replace(False)).pack(side=LEFT, padx=5)
 
 def find_all():
-    current_text_area = notebook.nametowidget(notebook.select()).winfo_children()[1]
+    current_text_area = get_current_text_area()
     find_window = Toplevel(win)
     find_window.title("Find All")
-    find_window.geometry("300x100")
+    hold_awake(current_text_area, find_window)
+    find_window.geometry("380x150")
     
     Label(find_window, text="Find:").pack(pady=5)
-    entry_find = Entry(find_window, width=30)
+    entry_find = Entry(find_window, width=40)
     entry_find.pack(pady=5)
+    entry_find.focus_set()
+    
+    # Search options
+    options_frame = Frame(find_window)
+    options_frame.pack()
+    regex_var = BooleanVar(value=False)
+    case_var = BooleanVar(value=True)
+    word_var = BooleanVar(value=False)
+    Checkbutton(options_frame, text="Regex", variable=regex_var).pack(side=LEFT)
+    Checkbutton(options_frame, text="Match case", variable=case_var).pack(side=LEFT)
+    Checkbutton(options_frame, text="Whole word", variable=word_var).pack(side=LEFT)
+    
+    # Results are reported here instead of in a blocking message box
+    status = Label(find_window, text="")
     
     def highlight_all():
-        # Remove existing highlights
-        current_text_area.tag_remove("highlight", "1.0", END)
+        find_text = entry_find.get()
+        if not find_text:
+            return
+        try:
+            pattern = search_engine.compile_pattern(find_text, regex_var.get(), case_var.get(), word_var.get())
+        except re.error as e:
+            status.configure(text=f"Invalid pattern: {e}")
+            return
+        
+        def show_count(cache):
+            if len(cache):
+                status.configure(text=f"Found {len(cache)} occurrences")
+            else:
+                status.configure(text="No matches found")
         
+        status.configure(text="Searching...")
+        start_search(current_text_area, pattern, on_done=show_count)
+    
+    def on_find_close():
+        current_text_area.match_cache = None
+        current_text_area.tag_remove("highlight", "1.0", END)
+        find_window.destroy()
+    
+    buttons_frame = Frame(find_window)
+    buttons_frame.pack(pady=5)
+    Button(buttons_frame, text="Find All", command=highlight_all).pack(side=LEFT, padx=5)
+    Button(buttons_frame, text="Previous", command=lambda: go_to_match(current_text_area, forward=False)).pack(side=LEFT, padx=5)
+    Button(buttons_frame, text="Next", command=lambda: go_to_match(current_text_area)).pack(side=LEFT, padx=5)
+    status.pack()
+    
+    entry_find.bind('<Return>', lambda e: highlight_all())
+    find_window.protocol("WM_DELETE_WINDOW", on_find_close)
+
+# Colours of the window, the text areas and the line number gutters
+THEMES = {
+    'light': {
+        'window': 'white',
+        'notebook': 'Light.TNotebook',
+        'text': {'background': 'white', 'foreground': 'black', 'insertbackground': 'black',
+                 'selectbackground': '#0078D7', 'selectforeground': 'white'},
+        'gutter': '#f0f0f0',
+        'gutter_text': 'gray'
+    },
+    'dark': {
+        'window': '#1e1e1e',
+        'notebook': 'Dark.TNotebook',
+        'text': {'background': '#1e1e1e', 'foreground': '#d4d4d4', 'insertbackground': 'white',
+                 'selectbackground': '#264f78', 'selectforeground': 'white'},
+        'gutter': '#252526',
+        'gutter_text': '#858585'
+    }
+}
+
+def apply_theme(tab):
+    # One configure call per widget of the tab
+    colors = THEMES.get(current_theme, THEMES['light'])
+    tab.text_area.configure(**colors['text'])
+    tab.line_numbers.configure(background=colors['gutter'])
+    tab.line_numbers.foreground = colors['gutter_text']
+
+def index_path(root):
+    # Each searched directory gets its own index file
+    name = hashlib.blake2b(os.path.abspath(root).encode('utf-8', 'surrogateescape'), digest_size=8).hexdigest()
+    return os.path.join(INDEX_DIR, name + '.idx')
+
+def find_in_files():
+    find_window = Toplevel(win)
+    find_window.title("Find in Files")
+    find_window.geometry("700x450")
+    search = None
+    
+    entries_frame = Frame(find_window)
+    entries_frame.pack(fill=X)
+    Label(entries_frame, text="Find:").grid(row=0, column=0, sticky='w', padx=5)
+    entry_find = Entry(entries_frame)
+    entry_find.grid(row=0, column=1, sticky='ew', padx=5, pady=2)
+    Label(entries_frame, text="In folder:").grid(row=1, column=0, sticky='w', padx=5)
+    entry_folder = Entry(entries_frame)
+    entry_folder.grid(row=1, column=1, sticky='ew', padx=5, pady=2)
+    entries_frame.columnconfigure(1, weight=1)
+    tab = current_tab()
+    entry_folder.insert(0, os.path.dirname(tab.path) if tab and tab.path else os.getcwd())
+    entry_find.focus_set()
+    
+    def browse():
+        folder = filedialog.askdirectory(initialdir=entry_folder.get())
+        if folder:
+            entry_folder.delete(0, END)
+            entry_folder.insert(0, folder)
+    
+    Button(entries_frame, text="Browse", command=browse).grid(row=1, column=2, padx=5)
+    
+    # Search options, the index keeps the trigrams of the folder on disk so
+    # repeated searches only read the files that can match
+    options_frame = Frame(find_window)
+    options_frame.pack(fill=X)
+    regex_var = BooleanVar(value=False)
+    case_var = BooleanVar(value=True)
+    word_var = BooleanVar(value=False)
+    index_var = BooleanVar(value=False)
+    Checkbutton(options_frame, text="Regex", variable=regex_var).pack(side=LEFT, padx=5)
+    Checkbutton(options_frame, text="Match case", variable=case_var).pack(side=LEFT)
+    Checkbutton(options_frame, text="Whole word", variable=word_var).pack(side=LEFT)
+    Checkbutton(options_frame, text="Use index", variable=index_var).pack(side=LEFT)
+    search_button = Button(options_frame, text="Search", command=lambda: start())
+    search_button.pack(side=RIGHT, padx=5)
+    Button(options_frame, text="Stop", command=lambda: stop()).pack(side=RIGHT)
+    
+    status = Label(find_window, text="", anchor='w')
+    status.pack(fill=X, padx=5)
+    
+    # One row per file, its matches below it
+    results_frame = Frame(find_window)
+    results_frame.pack(fill=BOTH, expand=True)
+    results = ttk.Treeview(results_frame, columns=('position',), show='tree headings')
+    results.heading('#0', text="Match")
+    results.heading('position', text="Line:Column")
+    results.column('position', width=100, stretch=False)
+    scrollbar = ttk.Scrollbar(results_frame, orient='vertical', command=results.yview)
+    results.configure(yscrollcommand=scrollbar.set)
+    scrollbar.pack(side=RIGHT, fill=Y)
+    results.pack(side=LEFT, fill=BOTH, expand=True)
+    hits_by_item = {}  # tree item -> (path, (line, column, length))
+    listed = 0
+    
+    def start():
+        nonlocal search, listed
         find_text = entry_find.get()
-        if find_text:
-            pos = "1.0"
-            count = 0
-            while True:
-                pos = current_text_area.search(find_text, pos, END)
-                if not pos:
-                    break
-                count += 1
-                end_pos = f"{pos}+{len(find_text)}c"
-                current_text_area.tag_add("highlight", pos, end_pos)
-                pos = end_pos
-            
-            current_text_area.tag_config("highlight", background="yellow")
-            if count:
-                messagebox.showinfo("Find Results", f"Found {count} occurrences")
+        root = entry_folder.get()
+        if not find_text:
+            return
+        if not os.path.isdir(root):
+            status.configure(text=f"{root} is not a folder")
+            return
+        try:
+            pattern = search_engine.compile_pattern(find_text, regex_var.get(), case_var.get(), word_var.get())
+        except re.error as e:
+            status.configure(text=f"Invalid pattern: {e}")
+            return
+        stop()
+        results.delete(*results.get_children())
+        hits_by_item.clear()
+        listed = 0
+        
+        required = file_search.required_trigrams(find_text, regex_var.get())
+        search = file_search.FileSearch(root, pattern, FIND_MAX_FILE_MB * 1024 * 1024, required,
+                                        index_path(root) if index_var.get() else None)
+        status.configure(text="Searching...")
+        poll(search)
+    
+    def stop():
+        if search is not None:
+            search.cancel.set()
+    
+    def poll(running):
+        nonlocal listed
+        if running is not search or not find_window.winfo_exists():
+            return
+        # Hits are shown as they come in, a batch per poll
+        while True:
+            try:
+                kind, *payload = running.results.get_nowait()
+            except queue.Empty:
+                status.configure(text=f"Searching... {running.stats['hits']} matches "
+                                      f"in {running.stats['scanned']} files scanned")
+                win.after(SEARCH_POLL_MS, lambda: poll(running))
+                return
+            if kind == 'hits':
+                path, hits = payload
+                if listed >= FIND_MAX_RESULTS:
+                    continue
+                file_item = results.insert('', END, text=os.path.relpath(path, running.root),
+                                           values=(len(hits),), open=True)
+                for line, column, length, text in hits[:FIND_MAX_RESULTS - listed]:
+                    item = results.insert(file_item, END, text=text.strip(), values=(f'{line}:{column + 1}',))
+                    hits_by_item[item] = (path, (line, column, length))
+                listed += min(len(hits), FIND_MAX_RESULTS - listed)
+            elif kind == 'done':
+                stats = payload[0]
+                shown = f", first {listed} listed" if stats['hits'] > listed else ""
+                state = "Stopped" if running.cancel.is_set() else "Done"
+                status.configure(text=f"{state}: {stats['hits']} matches{shown}, {stats['scanned']} of "
+                                      f"{stats['files']} files scanned in {stats['seconds']:.2f} s")
+                return
             else:
-                messagebox.showinfo("Find Results", "No matches found")
+                status.configure(text=f"Search failed: {payload[0]}")
+                return
     
-    Button(find_window, text="Find All", command=highlight_all).pack(pady=5)
+    def open_hit(event=None):
+        for item in results.selection():
+            if item in hits_by_item:
+                path, position = hits_by_item[item]
+                open_path(path, position)
+    
+    def on_close():
+        stop()
+        find_window.destroy()
+    
+    results.bind('<Double-1>', open_hit)
+    results.bind('<Return>', open_hit)
+    entry_find.bind('<Return>', lambda e: start())
+    find_window.protocol("WM_DELETE_WINDOW", on_close)
 
 def set_theme(theme):
     global current_theme
     current_theme = theme
+    colors = THEMES.get(theme, THEMES['light'])
+    win.configure(bg=colors['window'])
+    notebook.configure(style=colors['notebook'])
     
-    # Update all tabs
-    for tab_id in notebook.tabs():
-        frame = notebook.nametowidget(tab_id)
-        text_area = None
-        line_numbers = None
-        
-        # Find the text area and line numbers in the widget hierarchy
-        for child in frame.winfo_children():
-            if isinstance(child, Frame):  # text_frame
-                for subchild in child.winfo_children():
-                    if isinstance(subchild, Text):
-                        text_area = subchild
-            elif isinstance(subchild, Text):  # line numbers
-                line_numbers = child
-        
-        if theme == "light":
-            # Light theme colors
-            win.configure(bg='white')
-            notebook.configure(style='Light.TNotebook')
-            text_area.configure(
-                background='white',
-                foreground='black',
-                insertbackground='black',
-                selectbackground='#0078D7',
-                selectforeground='white'
-            )
-            if line_numbers:
-                line_numbers.configure(
-                    background='#f0f0f0',
-                    foreground='gray'
-                )
-            
-        else:
-            # Dark theme colors
-            win.configure(bg='#1e1e1e')
-            notebook.configure(style='Dark.TNotebook')
-            text_area.configure(
-                background='#1e1e1e',
-                foreground='#d4d4d4',
-                insertbackground='white',
-                selectbackground='#264f78',
-                selectforeground='white'
-            )
-            if line_numbers:
-                line_numbers.configure(
-                    background='#252526',
-                    foreground='#858585'
-                )
+    # Update all awake tabs, hibernated ones are themed when they wake
+    for tab in tabs.values():
+        if tab.text_area is None:
+            continue
+        apply_theme(tab)
+        # Token colours come from a style that matches the theme
+        if tab.text_area.highlighter is not None:
+            start_highlighting(tab.text_area, tab.text_area.highlighter.lexer)
+    
+    # Hidden gutters are redrawn when their tab is shown
+    tab = current_tab()
+    if tab:
+        update_line_numbers(tab.text_area)
+
+def on_tab_changed(event=None):
+    tab = current_tab()
+    if tab:
+        if tab.text_area is None:
+            wake_tab(tab)
+        tab.last_active = time.monotonic()
+        update_line_numbers(tab.text_area)
+        if outline_panel is not None:
+            outline_panel.show(tab.text_area)
 
 # Configure notebook styles for themes
 style = ttk.Style()
 style.configure('Light.TNotebook', background='white')
 style.configure('Dark.TNotebook', background='#1e1e1e')
 
-def create_tab_menu(text_area):
+def create_tab_menu():
     tab_menu = Menu(notebook, tearoff=0)
-    tab_menu.add_command(label="Rename", command=lambda: rename_tab(notebook.index(text_area.master)))
-    tab_menu.add_command(label="Close", command=lambda: close_tab(notebook.index(text_area.master)))
+    clicked = None  # tab the menu was opened on
+    tab_menu.add_command(label="Rename", command=lambda: rename_tab(notebook.index(clicked.frame)))
+    tab_menu.add_command(label="Close", command=lambda: close_tab(notebook.index(clicked.frame)))
+    
+    def show_tab_menu(event):
+        nonlocal clicked
+        try:
+            clicked = tab_at(notebook.index(f'@{event.x},{event.y}'))
+        except (TclError, ValueError, IndexError):
+            return  # not over a tab
+        tab_menu.post(event.x_root, event.y_root)
 
     # Bind the right-click event to the tab
-    notebook.bind("<Button-3>", lambda event: tab_menu.post(event.x_root, event.y_root))
+    notebook.bind("<Button-3>", show_tab_menu)
 
 def create_context_menu(text_area):
     context_menu = Menu(text_area, tearoff=0)
     context_menu.add_command(label="Undo", command=undo)
+    context_menu.add_command(label="Redo", command=redo)
     context_menu.add_separator()
     context_menu.add_command(label="Cut", command=cut)
     context_menu.add_command(label="Copy", command=copy)
@@ -433,167 +1678,809 @@ def rename_tab(index):
         notebook.tab(index, text=tab_name)  # Update tab title
 
 def close_tab(index):
-    notebook.forget(index)
+    tab = tab_at(index)
+    text_area = tab.text_area
+    # A split view must not outlive the tab it shows
+    if text_area is not None and text_area in split_screen_views():
+        close_split_screen()
+    if tab.journal is not None:
+        tab.journal.discard()
+        tab.journal = None
+    forget_tab(tab)
+
+def forget_tab(tab):
+    # Drop the tab from the registry and free its widgets
+    del tabs[tab.id]
+    if tab.load_cancel is not None:
+        tab.load_cancel.set()
+    if tab.path:
+        watcher.unwatch(tab.path)
+    tab.cancel_timers()
+    if tab.history is not None:
+        tab.history.discard()
+    if tab.text_area is not None:
+        stop_symbol_index(tab.text_area)
+        if outline_panel is not None and outline_panel.text_area is tab.text_area:
+            outline_panel.show(None)
+    notebook.forget(tab.frame)
+    tab.frame.destroy()
 
 def toggle_line_numbers():
     global show_line_numbers
     show_line_numbers = not show_line_numbers
     save_config()
-    
-    # Update all tabs
-    for tab_id in notebook.tabs():
-        frame = notebook.nametowidget(tab_id)
-        
-        # Find the text area in the frame hierarchy
-        text_area = None
-        for child in frame.winfo_children():
-            if isinstance(child, Frame):  # text_frame
-                for subchild in child.winfo_children():
-                    if isinstance(subchild, Text):
-                        text_area = subchild
-                        break
-                if text_area:
-                    break
-        
-        if not text_area:
+    apply_line_numbers()
+
+def apply_line_numbers():
+    # Update all tabs, only the visible gutter is drawn now
+    for tab in tabs.values():
+        if tab.line_numbers is None:
             continue
-            
-        line_numbers = text_area.line_numbers
-        
         if show_line_numbers:
-            line_numbers.pack(side='right', fill='y')
-            update_line_numbers(text_area)
+            tab.line_numbers.pack(side='right', fill='y')
         else:
-            line_numbers.pack_forget()
+            tab.line_numbers.pack_forget()
+    if show_line_numbers:
+        on_tab_changed()
 
 def toggle_auto_save():
     global auto_save_enabled
     auto_save_enabled = not auto_save_enabled
     save_config()
     
-    # Update all tabs
-    for tab_id in notebook.tabs():
-        frame = notebook.nametowidget(tab_id)
-        text_area = frame.winfo_children()[1]
-        if auto_save_enabled:
-            setup_auto_save(text_area)
+    if auto_save_enabled:
+        start_auto_save()
+    else:
+        stop_auto_save()
+
+def token_tag(text_area, ttype):
+    # Text widget tag for a token type, None when the style leaves it plain
+    tags = text_area.token_tags
+    if ttype not in tags:
+        color = text_area.highlight_style.style_for_token(ttype)['color']
+        tags[ttype] = f'token{ttype}' if color else None
+        if color:
+            text_area.tag_configure(tags[ttype], foreground=f'#{color}')
+            # Keep selection and search highlights on top of the colouring
+            text_area.tag_lower(tags[ttype])
+    return tags[ttype]
+
+@perf.timed('apply tokens')
+def apply_tokens(text_area, first, last, lines):
+    for tag in text_area.token_tags.values():
+        if tag:
+            text_area.tag_remove(tag, f'{first}.0', f'{last}.0 lineend')
+    
+    # One tag_add call per token type for the whole range
+    ranges = {}
+    for line, tokens in enumerate(lines, first):
+        for column, length, ttype in tokens:
+            tag = token_tag(text_area, ttype)
+            if tag:
+                ranges.setdefault(tag, []).extend((f'{line}.{column}', f'{line}.{column + length}'))
+    for tag, indices in ranges.items():
+        text_area.tag_add(tag, *indices)
+
+@perf.timed('highlight')
+def run_highlighting(text_area):
+    highlighter = text_area.highlighter
+    if highlighter is None or not highlighter.busy:
+        return
+    
+    # Lex at least down to the bottom of the viewport, the rest of the
+    # document is left to idle passes
+    last_visible = parse_index(text_area.index(f'@0,{text_area.winfo_height()}'))[0]
+    budget = max(last_visible - highlighter.dirty_from + 1, HIGHLIGHT_BATCH_LINES)
+    done = highlighter.run(lambda first, last: get_lines(text_area, first, last),
+                           lambda first, last, lines: apply_tokens(text_area, first, last, lines),
+                           budget)
+    if not done and text_area.tab.highlight_after_id is None:
+        text_area.tab.highlight_after_id = win.after_idle(lambda: highlight_in_idle(text_area))
+
+def highlight_in_idle(text_area):
+    text_area.tab.highlight_after_id = None
+    if text_area.winfo_exists():
+        run_highlighting(text_area)
+
+def track_highlight_edits(text_area, start, old_end, new_end):
+    if text_area.highlighter is not None:
+        text_area.highlighter.note_edit(start, old_end, new_end)
+
+register_edit_job('highlight', run_highlighting)
+
+def start_highlighting(text_area, lexer):
+    if text_area.soft_wrap is not None:
+        return  # lexing lines of megabytes would keep the editor busy for minutes
+    from highlighter import Highlighter
+    from pygments.styles import get_style_by_name
+    
+    # Tokens become tags, the text itself is never touched
+    if text_area.highlighter is not None:
+        for tag in text_area.token_tags.values():
+            if tag:
+                text_area.tag_remove(tag, '1.0', END)
+    text_area.token_tags = {}
+    text_area.highlight_style = get_style_by_name(HIGHLIGHT_STYLES.get(current_theme, 'default'))
+    text_area.highlighter = Highlighter(lexer, parse_index(text_area.index('end-1c'))[0])
+    run_highlighting(text_area)
 
 def apply_syntax_highlighting():
-    current_frame = notebook.nametowidget(notebook.select())
-    text_area = current_frame.winfo_children()[1]
+    text_area = get_current_text_area()
+    if not text_area:
+        return
+    
+    start_highlighting(text_area, guess_lexer(text_area))
+
+def guess_lexer(text_area):
+    from pygments.lexers import get_lexer_for_filename, TextLexer
     
     # Get file extension from tab name
-    tab_text = notebook.tab(notebook.select(), "text")
+    tab_text = notebook.tab(text_area.tab.frame, "text")
     try:
-        lexer = get_lexer_for_filename(tab_text)
+        return get_lexer_for_filename(tab_text)
     except:
-        lexer = TextLexer()
+        return TextLexer()
+
+def text_area_lexer(text_area):
+    # The lexer already used for highlighting, or one guessed from the tab name
+    if text_area.highlighter is not None:
+        return text_area.highlighter.lexer
+    return guess_lexer(text_area)
+
+# Called with (text_area, reshaped) each time a tab's symbol index is checked
+symbol_listeners = []
+outline_panel = None
+
+def symbol_index(text_area):
+    # The tab's symbol index, started on first use and again once the tab
+    # would be highlighted with another lexer. None in the huge file viewer.
+    if hasattr(text_area, 'huge_index'):
+        return None
+    lexer = text_area_lexer(text_area)
+    index = text_area.symbol_index
+    if index is not None and index.lexer.name == lexer.name:
+        return index
+    import symbols
+    stop_symbol_index(text_area)
+    text_area.symbol_index = symbols.SymbolIndex(lexer, text_area.tab.document.snapshot(), SYMBOL_DIR)
+    schedule_symbol_poll(text_area)
+    return text_area.symbol_index
+
+def stop_symbol_index(text_area):
+    if text_area.symbol_index is not None:
+        text_area.symbol_index.close()
+        text_area.symbol_index = None
+    if text_area.symbols_after_id is not None:
+        win.after_cancel(text_area.symbols_after_id)
+        text_area.symbols_after_id = None
+
+def track_symbol_edits(text_area, start, old_end, new_end):
+    if text_area.symbol_index is not None:
+        text_area.symbol_index.note_edit(start, old_end, new_end)
+
+def send_symbol_edits(text_area):
+    # Once per coalesced pass, with one snapshot for all the edits in it
+    index = text_area.symbol_index
+    if index is not None and index.edits:
+        index.send(text_area.tab.document.snapshot())
+        schedule_symbol_poll(text_area)
+
+register_edit_job('symbols', send_symbol_edits)
+
+def schedule_symbol_poll(text_area):
+    if text_area.symbols_after_id is None:
+        text_area.symbols_after_id = win.after(SYMBOL_POLL_MS, lambda: poll_symbols(text_area))
+
+def poll_symbols(text_area):
+    text_area.symbols_after_id = None
+    index = text_area.symbol_index
+    if index is None or not text_area.winfo_exists():
+        return
+    reshaped = index.collect()
+    for listener in list(symbol_listeners):
+        listener(text_area, reshaped)
+    if index.busy:
+        schedule_symbol_poll(text_area)
+
+def symbol_label(symbol):
+    return f"{SYMBOL_MARKS.get(symbol[2], '')} {symbol[3]}"
+
+def jump_to_symbol(text_area, symbol, focus=True):
+    if not text_area.winfo_exists():
+        return
+    line, column = symbol[0], symbol[1]
+    if focus:
+        notebook.select(text_area.tab.frame)
+        show_position(text_area, line, column)
+    else:
+        text_area.see(widget_index(text_area, line, column))
+
+class OutlinePanel:
+    """Symbols of the current tab as a tree beside the notebook.
+
+    A new outline is filled in a batch at a time, and the children of an
+    item only once it is opened. Items are named after the index of their
+    symbol in the table, so a table where only lines moved is taken over
+    without touching the tree.
+    """
+
+    def __init__(self):
+        self.frame = Frame(win, width=OUTLINE_WIDTH)
+        self.frame.pack_propagate(False)
+        self.frame.pack(side='right', fill='y', before=notebook)
+        self.status = Label(self.frame, text="", anchor='w')
+        self.status.pack(side='bottom', fill=X)
+        self.tree = ttk.Treeview(self.frame, show='tree', selectmode='browse')
+        scrollbar = Scrollbar(self.frame, orient='vertical', command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side='right', fill='y')
+        self.tree.pack(side='left', fill=BOTH, expand=True)
+        self.tree.bind('<<TreeviewOpen>>', self.on_open)
+        self.tree.bind('<<TreeviewClose>>', self.on_close)
+        # Selecting scrolls the tab to the symbol, double click or Enter moves there
+        self.tree.bind('<<TreeviewSelect>>', lambda e: self.jump(focus=False))
+        self.tree.bind('<Double-1>', lambda e: self.jump())
+        self.tree.bind('<Return>', lambda e: self.jump())
+        self.text_area = None
+        self.table = None  # table the tree was filled from
+        self.pending = []  # (parent item, first, end) ranges of symbols still to add, next last
+        self.opened = set()  # (kind, name, depth) of the items opened, kept open across rebuilds
+        self.fill_after_id = None
+        symbol_listeners.append(self.symbols_changed)
+        tab = current_tab()
+        self.show(tab.text_area if tab else None)
+
+    def close(self):
+        symbol_listeners.remove(self.symbols_changed)
+        if self.fill_after_id is not None:
+            win.after_cancel(self.fill_after_id)
+        self.frame.destroy()
+
+    def show(self, text_area):
+        self.text_area = text_area
+        self.opened = set()
+        index = symbol_index(text_area) if text_area is not None else None
+        self.rebuild(index.table if index is not None else None)
+
+    def symbols_changed(self, text_area, reshaped):
+        if text_area is not self.text_area:
+            return
+        table = text_area.symbol_index.table
+        if reshaped or (self.table is None and table is not None):
+            self.rebuild(table)
+        else:
+            self.table = table
+            self.show_status()
+
+    def rebuild(self, table):
+        if self.fill_after_id is not None:
+            win.after_cancel(self.fill_after_id)
+            self.fill_after_id = None
+        self.tree.delete(*self.tree.get_children())
+        self.table = table
+        self.pending = [('', 0, len(table))] if table is not None else []
+        self.fill()
+
+    def fill(self):
+        self.fill_after_id = None
+        deadline = time.perf_counter() + LOAD_BATCH_MS / 1000
+        while self.pending:
+            parent, i, end = self.pending.pop()
+            if i >= end:
+                continue
+            ends = self.table.ends
+            self.pending.append((parent, ends[i], end))
+            symbol = self.table.symbols[i]
+            has_children = ends[i] > i + 1
+            opened = has_children and (symbol[2], symbol[3], symbol[4]) in self.opened
+            self.tree.insert(parent, 'end', iid=str(i), text=symbol_label(symbol), open=opened)
+            if opened:
+                self.pending.append((str(i), i + 1, ends[i]))
+            elif has_children:
+                self.tree.insert(str(i), 'end', iid=f'{i}+')  # lets the item be opened
+            if time.perf_counter() > deadline:
+                self.fill_after_id = win.after(LOAD_POLL_MS, self.fill)
+                break
+        self.show_status()
+
+    def on_open(self, event=None):
+        item = self.tree.focus()
+        if not item or self.table is None:
+            return
+        i = int(item)
+        symbol = self.table.symbols[i]
+        self.opened.add((symbol[2], symbol[3], symbol[4]))
+        if self.tree.exists(f'{i}+'):
+            self.tree.delete(f'{i}+')
+            self.pending.append((item, i + 1, self.table.ends[i]))
+            if self.fill_after_id is None:
+                self.fill()
+
+    def on_close(self, event=None):
+        item = self.tree.focus()
+        if item and self.table is not None:
+            symbol = self.table.symbols[int(item)]
+            self.opened.discard((symbol[2], symbol[3], symbol[4]))
+
+    def jump(self, focus=True):
+        selection = self.tree.selection()
+        if not selection or self.table is None or self.text_area is None or selection[0].endswith('+'):
+            return
+        jump_to_symbol(self.text_area, self.table.symbols[int(selection[0])], focus)
+
+    def show_status(self):
+        index = self.text_area.symbol_index if self.text_area is not None else None
+        if index is None:
+            text = "No outline"
+        elif self.table is None:
+            text = "Indexing..."
+        else:
+            text = f"{len(self.table):,} symbols" + (", updating..." if index.busy else "")
+        self.status.config(text=text)
+
+def toggle_outline():
+    global outline_panel
+    if outline_panel is None:
+        outline_panel = OutlinePanel()
+    else:
+        outline_panel.close()
+        outline_panel = None
+
+def go_to_symbol():
+    text_area = get_current_text_area()
+    if not text_area:
+        return
+    index = symbol_index(text_area)
+    if index is None:
+        messagebox.showinfo("Go To Symbol", "Symbols are not indexed in the huge file viewer.")
+        return
+    symbol_window = Toplevel(win)
+    symbol_window.title("Go To Symbol")
+    symbol_window.geometry("450x350")
+    symbol_window.transient(win)
+
+    query = StringVar()
+    entry = Entry(symbol_window, textvariable=query)
+    entry.pack(fill=X, padx=5, pady=5)
+    status = Label(symbol_window, text="", anchor='w')
+    status.pack(side='bottom', fill=X, padx=5)
+    list_frame = Frame(symbol_window)
+    list_frame.pack(fill=BOTH, expand=True, padx=5)
+    results = Listbox(list_frame, activestyle='none', exportselection=False)
+    scrollbar = Scrollbar(list_frame, orient='vertical', command=results.yview)
+    results.configure(yscrollcommand=scrollbar.set)
+    scrollbar.pack(side='right', fill='y')
+    results.pack(side='left', fill=BOTH, expand=True)
+    shown = None  # table the listed symbols come from
+    found = []
+
+    def refresh(*args):
+        nonlocal shown, found
+        shown = index.table
+        results.delete(0, END)
+        if shown is None:
+            found = []
+            status.config(text="Indexing...")
+            return
+        # The lookup gives up early rather than hold up typing in the box
+        with perf.span('symbol lookup'):
+            found = shown.find(query.get(), GOTO_SYMBOL_RESULTS)
+        if found:
+            results.insert(END, *(f"{symbol_label(symbol)}    line {symbol[0]}"
+                                  for symbol in (shown.symbols[i] for i in found)))
+            results.selection_set(0)
+        status.config(text=f"{len(found)} of {len(shown):,} symbols" + (", indexing..." if index.busy else ""))
+
+    def on_symbols(changed, reshaped):
+        nonlocal shown
+        if changed is not text_area or changed.symbol_index is not index:
+            return
+        if shown is not None and not reshaped:
+            shown = index.table  # only lines moved, the list still holds
+        else:
+            refresh()
+
+    def move(step):
+        if found:
+            selection = results.curselection()
+            i = min(max((selection[0] if selection else -1) + step, 0), len(found) - 1)
+            results.selection_clear(0, END)
+            results.selection_set(i)
+            results.see(i)
+        return 'break'
+
+    def jump(event=None):
+        selection = results.curselection()
+        if not selection or not found:
+            return
+        symbol = shown.symbols[found[selection[0]]]
+        close()
+        jump_to_symbol(text_area, symbol)
+
+    def close(event=None):
+        if on_symbols in symbol_listeners:
+            symbol_listeners.remove(on_symbols)
+        symbol_window.destroy()
+
+    query.trace_add('write', refresh)
+    entry.bind('<Down>', lambda e: move(1))
+    entry.bind('<Up>', lambda e: move(-1))
+    symbol_window.bind('<Return>', jump)
+    symbol_window.bind('<Escape>', close)
+    results.bind('<Double-1>', jump)
+    symbol_window.protocol("WM_DELETE_WINDOW", close)
+    symbol_listeners.append(on_symbols)
+    refresh()
+    entry.focus_set()
+
+class PeerText(Text):
+    """Second view onto a tab's Text widget.
+
+    Tk shares the text and tags between peers, so opening one copies
+    nothing and an edit in either view shows up in both and goes into the
+    tab's undo history. Only the scroll position, cursor and selection are
+    the peer's own.
+    """
+    
+    def __init__(self, master, text_area, **options):
+        BaseWidget._setup(self, master, {})
+        self.owner = text_area
+        text_area.tk.call(text_area, 'peer', 'create', self._w, *self._options(options))
+        # Edits made here reach the tab's document, journal and highlighter
+        install_edit_hook(self, owner=text_area)
+
+class DiffView:
+    """Compare mode of the split screen.
+    
+    The two documents are diffed by lines on a worker thread and the hunks
+    are tagged as they stream in. Edits to either side are collected and
+    handed to the worker, which only diffs the lines around them again.
+    Tags are shared between a tab and its peers, so the differences also
+    show in the tabs themselves while the comparison is on.
+    """
+    
+    def __init__(self, left, right, on_status):
+        self.sides = (left, right)
+        self.on_status = on_status
+        self.generation = 0
+        self.after_id = None
+        self.restart_after_id = None
+        self.update_after_id = None
+        self.jobs = None
+        colors = DIFF_COLORS.get(current_theme, DIFF_COLORS['light'])
+        for text_area in self.sides:
+            for tag, color in colors.items():
+                text_area.tag_configure(tag, background=color)
+                text_area.tag_lower(tag)
+            text_area.edit_listeners.append(self.note_edit)
+        self.start()
+    
+    def start(self):
+        self.restart_after_id = None
+        self.generation += 1
+        if self.jobs is not None:
+            self.jobs.put(None)  # lets a worker of the last run finish
+        self.clear_tags()
+        self.hunks = []
+        self.untagged = deque()
+        self.streaming = True
+        self.updating = False
+        self.dirty = [None, None]  # per side (first, end in the worker, end now)
+        self.results = queue.Queue()
+        self.jobs = queue.Queue()
+        snapshots = [text_area.tab.document.snapshot() for text_area in self.sides]
+        threading.Thread(target=self.work, args=(self.generation, self.jobs, *snapshots), daemon=True).start()
+        self.on_status("Comparing...")
+        self.poll()
     
-    # Get text content
-    content = text_area.get(1.0, END)
+    def stop(self):
+        self.generation += 1
+        self.jobs.put(None)
+        for after_id in (self.after_id, self.restart_after_id, self.update_after_id):
+            if after_id is not None:
+                win.after_cancel(after_id)
+        for text_area in self.sides:
+            if self.note_edit in text_area.edit_listeners:
+                text_area.edit_listeners.remove(self.note_edit)
+        self.clear_tags()
     
-    # Apply highlighting
-    formatter = BBCodeFormatter(style=get_style_by_name('monokai'))
-    highlighted = highlight(content, lexer, formatter)
+    def clear_tags(self):
+        for text_area in self.sides:
+            if text_area.winfo_exists():
+                for tag in DIFF_COLORS['light']:
+                    text_area.tag_remove(tag, '1.0', END)
+    
+    def work(self, generation, jobs, left, right):
+        # Runs on the worker thread, the hunks are handed over in batches
+        with perf.span('diff'):
+            line_diff = diff.LineDiff(left.text().split('\n'), right.text().split('\n'))
+            batch = []
+            handed_over = time.perf_counter()
+            for hunk in line_diff.run():
+                if generation != self.generation:
+                    return
+                batch.append(hunk)
+                if time.perf_counter() - handed_over > DIFF_STREAM_SECONDS:
+                    self.results.put((generation, 'hunks', batch))
+                    batch = []
+                    handed_over = time.perf_counter()
+            self.results.put((generation, 'hunks', batch))
+        self.results.put((generation, 'done', line_diff.hunks))
+        while True:
+            job = jobs.get()
+            if job is None or generation != self.generation:
+                return
+            with perf.span('diff update'):
+                region, hunks = line_diff.update(*job)
+            self.results.put((generation, 'update', (region, hunks, line_diff.hunks)))
+    
+    def poll(self):
+        self.after_id = None
+        deadline = time.perf_counter() + LOAD_BATCH_MS / 1000
+        while True:
+            try:
+                generation, kind, payload = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if generation != self.generation:
+                continue
+            if kind == 'hunks':
+                self.hunks.extend(payload)
+                self.untagged.extend(payload)
+            elif kind == 'done':
+                self.streaming = False
+                self.hunks = payload
+            else:
+                self.updated(*payload)
+        # Tag a batch at a time, so a million changed lines never block the editor
+        while self.untagged and time.perf_counter() < deadline:
+            self.tag([self.untagged.popleft() for _ in range(min(200, len(self.untagged)))])
+        
+        if self.streaming or self.untagged:
+            self.on_status("Comparing...")
+        else:
+            self.on_status(f"{len(self.hunks)} differences" if self.hunks else "No differences")
+        if self.streaming or self.untagged or self.updating:
+            self.after_id = win.after(DIFF_POLL_MS, self.poll)
+    
+    def tag(self, hunks):
+        # Whole lines are tagged, line numbers count from 0 in hunks
+        left, right = self.sides
+        ranges = ({tag: [] for tag in DIFF_COLORS['light']}, {tag: [] for tag in DIFF_COLORS['light']})
+        for a0, a1, b0, b1 in hunks:
+            if a0 < a1 and b0 < b1:
+                ranges[0]['diff_changed'] += self.line_range(left, a0, a1)
+                ranges[1]['diff_changed'] += self.line_range(right, b0, b1)
+            elif a0 < a1:
+                ranges[0]['diff_removed'] += self.line_range(left, a0, a1)
+            else:
+                ranges[1]['diff_added'] += self.line_range(right, b0, b1)
+        for text_area, tags in zip(self.sides, ranges):
+            for tag, indices in tags.items():
+                if indices:
+                    text_area.tag_add(tag, *indices)
+    
+    @staticmethod
+    def line_range(text_area, first, end):
+        return [widget_index(text_area, first + 1, 0), widget_index(text_area, end + 1, 0)]
+    
+    def note_edit(self, text_area, start, old_end, new_end):
+        if self.streaming:
+            # Starting again is simpler than following edits into a diff still running
+            if self.restart_after_id is not None:
+                win.after_cancel(self.restart_after_id)
+            self.restart_after_id = win.after(DIFF_UPDATE_MS, self.start)
+            return
+        
+        # Lines first to end in the worker's numbering are lines first to
+        # now in the document, edits are merged into that one range per side
+        side = 0 if text_area is self.sides[0] else 1
+        first, end, now = start[0] - 1, old_end[0], new_end[0]
+        if self.dirty[side] is not None:
+            dirty_first, dirty_end, dirty_now = self.dirty[side]
+            first = min(first, dirty_first)
+            end, now = dirty_end + max(end - dirty_now, 0), max(dirty_now, end) + now - end
+        self.dirty[side] = (first, end, now)
+        if self.update_after_id is not None:
+            win.after_cancel(self.update_after_id)
+        self.update_after_id = win.after(DIFF_UPDATE_MS, self.send_update)
+    
+    def send_update(self):
+        self.update_after_id = None
+        if self.updating or self.dirty == [None, None]:
+            return  # sent again once the update in flight is back
+        job = []
+        for text_area, dirty in zip(self.sides, self.dirty):
+            if dirty is None:
+                job.append(None)
+            else:
+                first, end, now = dirty
+                job.append((first, end, text_area.tab.document.lines(first + 1, now).split('\n')))
+        self.dirty = [None, None]
+        self.updating = True
+        self.jobs.put(job)
+        if self.after_id is None:
+            self.after_id = win.after(DIFF_POLL_MS, self.poll)
     
-    # Update text area
-    text_area.delete(1.0, END)
-    text_area.insert(1.0, highlighted)
+    def updated(self, region, hunks, all_hunks):
+        self.updating = False
+        self.hunks = all_hunks
+        # Edits made since the update was sent move its lines, one that
+        # overlaps them is left to the next update instead
+        bounds = [list(region[0:2]), list(region[2:4])]
+        for side, (first, end) in enumerate(bounds):
+            dirty = self.dirty[side]
+            if dirty is None or end <= dirty[0]:
+                continue
+            if first >= dirty[1]:
+                bounds[side] = [first + dirty[2] - dirty[1], end + dirty[2] - dirty[1]]
+                continue
+            dirty_first, dirty_end, dirty_now = dirty
+            self.dirty[side] = (min(first, dirty_first), max(end, dirty_end),
+                                dirty_now + max(end - dirty_end, 0))
+            bounds = None
+            break
+        if bounds is not None:
+            shift = [bounds[0][0] - region[0], bounds[1][0] - region[2]]
+            for text_area, (first, end) in zip(self.sides, bounds):
+                for tag in DIFF_COLORS['light']:
+                    text_area.tag_remove(tag, *self.line_range(text_area, first, end))
+            self.tag([(a0 + shift[0], a1 + shift[0], b0 + shift[1], b1 + shift[1]) for a0, a1, b0, b1 in hunks])
+        if self.dirty != [None, None]:
+            self.send_update()
+    
+    def next_hunk(self, line, forward=True):
+        # Hunk after (or before) line of the left side, None at either end
+        starts = [hunk[0] for hunk in self.hunks]
+        if forward:
+            i = bisect_right(starts, line)
+            return self.hunks[i] if i < len(self.hunks) else None
+        i = bisect_left(starts, line)
+        return self.hunks[i - 1] if i else None
+
+def split_screen_views():
+    # Text areas shown in the split screen, these are never hibernated
+    if not split_screen_window:
+        return set()
+    return {pane.view.owner for pane in split_screen_window.panes if pane.view is not None}
+
+def close_split_screen():
+    global split_screen_active, split_screen_window
+    if split_screen_window:
+        if split_screen_window.diff is not None:
+            split_screen_window.diff.stop()
+        split_screen_window.destroy()
+        split_screen_window = None
+    split_screen_active = False
 
 def create_split_screen():
     global split_screen_active, split_screen_window
     
     if split_screen_active:
         # If split screen is active, close it
-        if split_screen_window:
-            split_screen_window.destroy()
-            split_screen_window = None
-        split_screen_active = False
+        close_split_screen()
         return
 
-    # Get list of open tabs
-    open_tabs = []
-    for tab_id in notebook.tabs():
-        tab_text = notebook.tab(tab_id, "text")
-        open_tabs.append((tab_id, tab_text))
-    
-    if len(open_tabs) < 2:
-        messagebox.showwarning("Split Screen", "You need at least two open tabs to use split screen.")
+    open_tabs = [(notebook.tab(tab_id, 'text'), tabs[str(tab_id)]) for tab_id in notebook.tabs()]
+    if not open_tabs:
+        messagebox.showwarning("Split Screen", "Open a document to use split screen.")
         return
 
     # Create split screen window
     split_screen_window = Toplevel(win)
     split_screen_window.title("Split Screen View")
     split_screen_window.geometry("1200x600")
+    split_screen_window.panes = []
+    split_screen_window.diff = None
+    
+    sync_scrolling = BooleanVar(value=sync_split_scrolling)
+    compare = BooleanVar(value=False)
+    
+    def on_sync_toggle():
+        global sync_split_scrolling
+        sync_split_scrolling = sync_scrolling.get()
+        save_config()
+    
+    def start_compare():
+        if split_screen_window.diff is not None:
+            split_screen_window.diff.stop()
+            split_screen_window.diff = None
+        left, right = (pane.view.owner for pane in split_screen_window.panes)
+        if not compare.get():
+            diff_status.configure(text="")
+        elif left is right:
+            diff_status.configure(text="Both panes show the same document")
+        else:
+            split_screen_window.diff = DiffView(left, right, lambda text: diff_status.configure(text=text))
+    
+    def go_to_difference(forward):
+        view = split_screen_window.diff
+        if view is None:
+            return
+        left, right = split_screen_window.panes
+        line = document_position(left.view.owner, INSERT, left.view)[0] - 1
+        hunk = view.next_hunk(line, forward)
+        if hunk is None:
+            return
+        # A few lines of context stay above the difference
+        for pane, first in ((left, hunk[0]), (right, hunk[2])):
+            if pane is right and sync_scrolling.get():
+                break  # the right pane follows the left one
+            index = widget_index(pane.view.owner, first + 1, 0)
+            pane.view.mark_set(INSERT, index)
+            pane.view.yview(f'{index} - 3 lines')
     
-    # Create left and right frames
-    left_frame = Frame(split_screen_window)
-    left_frame.pack(side=LEFT, fill=BOTH, expand=True)
-    
-    right_frame = Frame(split_screen_window)
-    right_frame.pack(side=RIGHT, fill=BOTH, expand=True)
-    
-    # Create comboboxes for tab selection
-    left_combo = ttk.Combobox(left_frame, values=[tab[1] for tab in open_tabs])
-    left_combo.pack(fill=X, padx=5, pady=5)
-    left_combo.set(open_tabs[0][1])
-    
-    right_combo = ttk.Combobox(right_frame, values=[tab[1] for tab in open_tabs])
-    right_combo.pack(fill=X, padx=5, pady=5)
-    right_combo.set(open_tabs[1][1] if len(open_tabs) > 1 else open_tabs[0][1])
-    
-    # Create text areas
-    left_text = Text(left_frame, wrap="word", undo=True, font=("Arial", 12))
-    left_text.pack(fill=BOTH, expand=True, padx=5, pady=5)
-    
-    right_text = Text(right_frame, wrap="word", undo=True, font=("Arial", 12))
-    right_text.pack(fill=BOTH, expand=True, padx=5, pady=5)
-    
-    # Function to update text content
-    def update_text_content(event=None):
-        # Update left text area
-        left_tab_name = left_combo.get()
-        left_tab_id = [tab[0] for tab in open_tabs if notebook.tab(tab[0], "text") == left_tab_name][0]
-        left_content = notebook.nametowidget(left_tab_id).winfo_children()[1].get(1.0, END)
-        left_text.delete(1.0, END)
-        left_text.insert(1.0, left_content)
+    bar = Frame(split_screen_window)
+    bar.pack(side=BOTTOM, fill=X)
+    Checkbutton(bar, text="Synchronise scrolling", variable=sync_scrolling,
+                command=on_sync_toggle).pack(side=LEFT, padx=5)
+    Checkbutton(bar, text="Compare", variable=compare, command=start_compare).pack(side=LEFT, padx=5)
+    Button(bar, text="Previous Difference", command=lambda: go_to_difference(False)).pack(side=LEFT, padx=5)
+    Button(bar, text="Next Difference", command=lambda: go_to_difference(True)).pack(side=LEFT, padx=5)
+    diff_status = Label(bar)
+    diff_status.pack(side=LEFT, padx=5)
+    split_screen_window.bind('<F7>', lambda e: go_to_difference(True))
+    split_screen_window.bind('<Shift-F7>', lambda e: go_to_difference(False))
+    
+    def on_scroll(pane, first, last):
+        pane.scrollbar.set(first, last)
+        if pane.following:
+            # This is the echo of a move made by the other pane
+            pane.following = False
+            return
+        if sync_scrolling.get():
+            for other in split_screen_window.panes:
+                if other is not pane and other.view is not None:
+                    other.following = True
+                    if split_screen_window.diff is not None:
+                        # Line up the lines that correspond rather than the fractions
+                        side = 0 if pane is split_screen_window.panes[0] else 2
+                        line = document_position(pane.view.owner, '@0,0', pane.view)[0] - 1
+                        line = diff.corresponding_line(split_screen_window.diff.hunks, line, side)
+                        other.view.yview(widget_index(other.view.owner, line + 1, 0))
+                    else:
+                        other.view.yview_moveto(first)
+    
+    def show(pane, tab):
+        # Swap the peer for one onto the chosen tab, nothing is copied
+        text_area = tab.text_area or wake_tab(tab)
+        top = pane.view.yview()[0] if pane.view is not None else 0.0
+        if pane.view is not None:
+            pane.view.destroy()
+        options = {key: text_area.cget(key) for key in
+                   ('wrap', 'font', 'background', 'foreground', 'insertbackground',
+                    'selectbackground', 'selectforeground', 'state')}
+        pane.view = PeerText(pane, text_area, **options)
+        if text_area.soft_wrap is not None:
+            bind_soft_breaks(pane.view, text_area)
+        pane.view.configure(yscrollcommand=lambda first, last: on_scroll(pane, first, last))
+        pane.view.pack(side=LEFT, fill=BOTH, expand=True, padx=5, pady=5)
+        pane.scrollbar.configure(command=pane.view.yview)
+        pane.view.yview_moveto(top)
+        if len(split_screen_window.panes) == 2 and compare.get():
+            start_compare()
+    
+    def add_pane(side, selected):
+        pane = Frame(split_screen_window)
+        pane.pack(side=side, fill=BOTH, expand=True)
+        pane.view = None
+        pane.following = False
+        split_screen_window.panes.append(pane)
         
-        # Update right text area
-        right_tab_name = right_combo.get()
-        right_tab_id = [tab[0] for tab in open_tabs if notebook.tab(tab[0], "text") == right_tab_name][0]
-        right_content = notebook.nametowidget(right_tab_id).winfo_children()[1].get(1.0, END)
-        right_text.delete(1.0, END)
-        right_text.insert(1.0, right_content)
-    
-    # Bind combobox selection to update function
-    left_combo.bind('<<ComboboxSelected>>', update_text_content)
-    right_combo.bind('<<ComboboxSelected>>', update_text_content)
-    
-    # Initial content update
-    update_text_content()
-    
-    # Function to sync scroll
-    def sync_scroll(*args):
-        left_text.yview_moveto(args[0])
-        right_text.yview_moveto(args[0])
-    
-    # Add scrollbars
-    left_scrollbar = ttk.Scrollbar(left_frame, orient="vertical", command=sync_scroll)
-    left_scrollbar.pack(side=RIGHT, fill=Y)
-    left_text.configure(yscrollcommand=left_scrollbar.set)
-    
-    right_scrollbar = ttk.Scrollbar(right_frame, orient="vertical", command=sync_scroll)
-    right_scrollbar.pack(side=RIGHT, fill=Y)
-    right_text.configure(yscrollcommand=right_scrollbar.set)
-    
-    # Function to handle window close
-    def on_split_screen_close():
-        global split_screen_active, split_screen_window
-        split_screen_active = False
-        split_screen_window.destroy()
-        split_screen_window = None
+        combo = ttk.Combobox(pane, values=[title for title, _ in open_tabs], state='readonly')
+        combo.pack(fill=X, padx=5, pady=5)
+        combo.current(selected)
+        combo.bind('<<ComboboxSelected>>', lambda e: show(pane, open_tabs[combo.current()][1]))
+        
+        pane.scrollbar = ttk.Scrollbar(pane, orient="vertical")
+        pane.scrollbar.pack(side=RIGHT, fill=Y)
+        show(pane, open_tabs[selected][1])
     
-    split_screen_window.protocol("WM_DELETE_WINDOW", on_split_screen_close)
+    # With a single tab both panes show it, each scrolled on its own
+    add_pane(LEFT, 0)
+    add_pane(RIGHT, 1 if len(open_tabs) > 1 else 0)
+    
+    split_screen_window.protocol("WM_DELETE_WINDOW", close_split_screen)
     split_screen_active = True
 
 def create_menu():
@@ -615,6 +2502,7 @@ def create_menu():
     edit_menu = Menu(menubar, tearoff=0)
     menubar.add_cascade(label="Edit", menu=edit_menu)
     edit_menu.add_command(label="Undo", command=undo, accelerator="Ctrl+Z")
+    edit_menu.add_command(label="Redo", command=redo, accelerator="Ctrl+Y")
     edit_menu.add_separator()
     edit_menu.add_command(label="Cut", command=cut, accelerator="Ctrl+X")
     edit_menu.add_command(label="Copy", command=copy, accelerator="Ctrl+C")
@@ -623,7 +2511,10 @@ def create_menu():
     edit_menu.add_separator()
     edit_menu.add_command(label="Find", command=find, accelerator="Ctrl+F")
     edit_menu.add_command(label="Find All", command=find_all)
+    edit_menu.add_command(label="Find in Files", command=find_in_files, accelerator="Ctrl+Shift+F")
     edit_menu.add_command(label="Replace", command=replace, accelerator="Ctrl+H")
+    edit_menu.add_command(label="Go To Line", command=go_to_line, accelerator="Ctrl+G")
+    edit_menu.add_command(label="Go To Symbol", command=go_to_symbol, accelerator="Ctrl+Shift+O")
     edit_menu.add_separator()
     edit_menu.add_command(label="Select All", command=select_all, accelerator="Ctrl+A")
     edit_menu.add_command(label="Time/Date", command=insert_time_date, accelerator="F5")
@@ -634,8 +2525,21 @@ def create_menu():
     view_menu.add_checkbutton(label="Line Numbers", command=toggle_line_numbers)
     view_menu.add_checkbutton(label="Auto Save", command=toggle_auto_save)
     view_menu.add_command(label="Apply Syntax Highlighting", command=apply_syntax_highlighting)
+    view_menu.add_checkbutton(label="Outline", command=toggle_outline)
     view_menu.add_separator()
     view_menu.add_command(label="Split Screen", command=create_split_screen)
+    view_menu.add_command(label="Tab Memory", command=show_tab_memory)
+    
+    # Performance submenu
+    performance_menu = Menu(view_menu, tearoff=0)
+    view_menu.add_cascade(label="Performance", menu=performance_menu)
+    recording_var = BooleanVar(value=performance_recording)
+    overlay_var = BooleanVar(value=False)
+    performance_menu.add_checkbutton(label="Record Timings", variable=recording_var,
+                                     command=lambda: toggle_performance_recording(recording_var.get()))
+    performance_menu.add_checkbutton(label="Overlay", variable=overlay_var,
+                                     command=lambda: toggle_performance_overlay(overlay_var.get()))
+    performance_menu.add_command(label="Export Trace...", command=export_performance_trace)
     
     # Theme submenu
     theme_menu = Menu(view_menu, tearoff=0)
@@ -650,37 +2554,508 @@ def create_menu():
     win.bind('<Control-o>', lambda e: open_file())
     win.bind('<Control-s>', lambda e: save_as_text())
     win.bind('<Control-z>', lambda e: undo())
+    win.bind('<Control-y>', lambda e: redo())
     win.bind('<Control-x>', lambda e: cut())
     win.bind('<Control-c>', lambda e: copy())
     win.bind('<Control-v>', lambda e: paste())
     win.bind('<Control-f>', lambda e: find())
+    win.bind('<Control-F>', lambda e: find_in_files())
     win.bind('<Control-h>', lambda e: replace())
+    win.bind('<Control-g>', lambda e: go_to_line())
+    win.bind('<Control-O>', lambda e: go_to_symbol())
     win.bind('<Control-a>', lambda e: select_all())
     win.bind('<F5>', lambda e: insert_time_date())
 
-def setup_auto_save(text_area):
-    def auto_save():
-        if auto_save_enabled and text_area.edit_modified():
-            if notebook.index(text_area.master) in tab_file_paths:
-                file_path = tab_file_paths[notebook.index(text_area.master)]
-                try:
-                    with open(file_path, 'w') as file:
-                        file.write(text_area.get(1.0, END))
-                    text_area.edit_modified(False)
-                except Exception as e:
-                    print(f"Auto-save failed: {e}")
+# One auto-save timer and one writer thread serve every tab
+auto_saver = autosave.AutoSaver()
+auto_save_after_id = None
+
+def start_auto_save():
+    global auto_save_after_id
+    stop_auto_save()
+    auto_save_after_id = win.after(AUTO_SAVE_INTERVAL, run_auto_save)
+
+def stop_auto_save():
+    global auto_save_after_id
+    if auto_save_after_id is not None:
+        win.after_cancel(auto_save_after_id)
+        auto_save_after_id = None
+
+def run_auto_save():
+    global auto_save_after_id
+    auto_save_after_id = None
+    if not auto_save_enabled:
+        return
+    
+    # Only a snapshot of the document's pieces is taken on the Tk thread,
+    # joining, encoding, hashing and writing happen on the auto-saver's worker
+    submitted = 0
+    for tab in tabs.values():
+        # Hibernated tabs were saved when they went to sleep
+        if tab.text_area is not None and auto_save_tab(tab):
+            submitted += 1
+    if submitted:
+        win.after(AUTO_SAVE_POLL_MS, lambda: collect_auto_saves(submitted))
+    
+    auto_save_after_id = win.after(AUTO_SAVE_INTERVAL, run_auto_save)
+
+@perf.timed('auto-save snapshot')
+def auto_save_tab(tab):
+    # Hand a snapshot of a modified tab to the auto-saver, True if one was
+    text_area = tab.text_area
+    if not tab.path or not text_area.edit_modified() or hasattr(text_area, 'huge_index'):
+        return False
+    mark_saved(text_area)
+    tag = tab.journal.mark() if tab.journal is not None else None
+    watcher.pause(tab.path)
+    auto_saver.submit((tab, tag), tab.path, tab.document.snapshot(), tab.encoding)
+    return True
+
+def collect_auto_saves(remaining):
+    while remaining:
+        try:
+            (tab, tag), file_path, error = auto_saver.results.get_nowait()
+        except queue.Empty:
+            win.after(AUTO_SAVE_POLL_MS, lambda: collect_auto_saves(remaining))
+            return
+        remaining -= 1
+        watcher.resume(file_path)
+        if tab.id not in tabs:
+            continue
+        if error is not None:
+            print(f"Auto-save failed: {error}")
+            # Keep the tab marked as modified so the next pass retries
+            if tab.text_area is not None:
+                tab.text_area.edit_modified(True)
+            else:
+                tab.sleeping['modified'] = True
+            if tab.history is not None:
+                tab.history.saved = None
+        elif tab.journal is not None:
+            # Edits made after the snapshot stay in the log
+            tab.journal.rebase_on_file(file_path, tab.encoding, tag)
+
+# Files open in tabs are watched for changes made by other programs
+watcher = file_watcher.FileWatcher()
+
+def set_tab_path(tab, file_path):
+    if tab.path == file_path:
+        return
+    if tab.path:
+        watcher.unwatch(tab.path)
+    tab.path = file_path
+    watcher.watch(file_path)
+
+def check_file_changes():
+    win.after(WATCH_POLL_MS, check_file_changes)
+    while True:
+        try:
+            file_path = watcher.changes.get_nowait()
+        except queue.Empty:
+            return
+        for tab in list(tabs.values()):
+            if tab.path == file_path:
+                reload_from_disk(tab)
+
+def reload_from_disk(tab):
+    # Bring a tab up to date with its file after another program changed it.
+    # The file is read and compared on a worker thread: text added to the
+    # end is appended, anything else is applied as the changed lines only,
+    # so the cursor, the view and the undo history mostly stay put.
+    text_area = tab.text_area
+    if text_area is None:
+        tab.sleeping['changed_on_disk'] = True  # looked at when the tab wakes
+        return
+    if text_area.reloading:
+        text_area.reloading = 'again'
+        return
+    text_area.reloading = True
+    file_path = tab.path
+    signature, tail = watcher.state(file_path)
+    snapshot = tab.document.snapshot()
+    version = tab.document.version
+    # Unsaved edits mean the document is not the old file plus its tail
+    modified = text_area.edit_modified()
+    results = queue.Queue(maxsize=1)
+    
+    def read():
+        try:
+            with perf.span('file reload read'):
+                results.put(file_watcher.read_change(file_path, signature, tail, tab.encoding,
+                                                     snapshot, not modified))
+        except Exception as e:
+            results.put(e)
+    
+    threading.Thread(target=read, daemon=True).start()
+    
+    def poll():
+        if tab.text_area is not text_area:
+            if tab.id in tabs and tab.sleeping is not None:
+                tab.sleeping['changed_on_disk'] = True
+            return  # closed or hibernated meanwhile
+        try:
+            result = results.get_nowait()
+        except queue.Empty:
+            win.after(RELOAD_POLL_MS, poll)
+            return
+        again = text_area.reloading == 'again'
+        text_area.reloading = False
+        if isinstance(result, Exception):
+            print(f"Could not reload {file_path}: {result}")
+            return
+        if again or tab.path != file_path or tab.document.version != version:
+            reload_from_disk(tab)  # changed again or edited while being read
+            return
+        
+        kind, change, state = result
+        if change and modified and not messagebox.askyesno(
+                "File Changed", f"{file_path} was changed by another program.\n\n"
+                                f"Reload it and lose your unsaved changes?"):
+            change = None  # keep the edits, saving will write them over the file
+        if change:
+            apply_disk_change(text_area, kind, change)
+            mark_saved(text_area)
+            journal_saved(tab, file_path)
+        watcher.settle(file_path, state)
+    
+    win.after(RELOAD_POLL_MS, poll)
+
+@perf.timed('file reload apply')
+def apply_disk_change(text_area, kind, change):
+    if kind == 'append':
+        # Keep following the end like tail -f when it was in view
+        following = text_area.bbox('end-1c') is not None
+        begin_undo_step(text_area)
+        text_area.insert('end-1c', change)
+        end_undo_step(text_area)
+        if following:
+            text_area.see('end-1c')
+        return
+    
+    # Bottom up, so the line numbers of the edits still to come stay valid,
+    # and as a single undo step
+    top = document_position(text_area, '@0,0')[0]
+    shift = 0
+    begin_undo_step(text_area)
+    try:
+        for line, old, new in reversed(change):
+            end = end_of_insert((line, 0), old)
+            text_area.replace(widget_index(text_area, line, 0), widget_index(text_area, *end), new)
+            if end[0] < top:
+                shift += new.count('\n') - old.count('\n')
+    finally:
+        end_undo_step(text_area)
+    if shift:
+        text_area.yview(widget_index(text_area, max(top + shift, 1), 0))
+
+def restore_session():
+    # Restored tabs start hibernated, only the one shown builds its widgets
+    restored = 0
+    for doc_id, journal_path in journal.find(JOURNAL_DIR):
+        try:
+            text, meta, edited, stale = journal.replay(journal_path)
+        except Exception as e:
+            print(f"Could not restore {journal_path}: {e}")
+            continue
+        if text is None:
+            # Without the file the edits cannot be replayed, the log stays
+            # for when it is back
+            messagebox.showwarning("Restore", f"{meta.get('path', 'A file')} no longer exists, its unsaved "
+                                              f"edits could not be restored. They are kept in {journal_path}.")
+            continue
+        
+        tab = new_tab(meta.get('title', "Restored Document"))
+        tab.encoding = meta.get('encoding', 'utf-8')
+        # Keep appending to the same log, it already describes this content
+        tab.journal = journal.Journal(JOURNAL_DIR, doc_id)
+        tab.sleeping = {
+            'text': hibernation.SleepingText(text),
+            'awake_bytes': text_memory(text),
+            'modified': edited,
+            'cursor': meta.get('cursor', '1.0'),
+            'view': meta.get('view', 0.0),
+            'lexer': None
+        }
+        if meta.get('path'):
+            set_tab_path(tab, meta['path'])
+            if stale:
+                # The file changed since the crash, the edits could not be replayed
+                print(f"{meta['path']} changed on disk, restored it without the unsaved edits")
+                journal_saved(tab, meta['path'])
+        restored += 1
+    if restored:
+        on_tab_changed()
+    return restored
+
+def text_memory(text):
+    # Rough bytes a tab holding text costs while awake: the document model
+    # with its line index plus the Text widget's own copy
+    lines = text.count('\n') + 1
+    return sys.getsizeof(text) + 8 * lines + len(text) + lines * TK_LINE_BYTES
+
+def tab_memory(tab):
+    if tab.text_area is None:
+        return tab.sleeping['text'].size
+    doc = tab.document
+    return doc.memory() + len(doc) + doc.line_count * TK_LINE_BYTES
+
+def can_hibernate(tab):
+    text_area = tab.text_area
+    if (text_area is None or hasattr(text_area, 'huge_index') or text_area in split_screen_views()
+            or text_area.held_by):
+        return False
+    # Tabs still streaming a file or a large paste in stay awake
+    return (getattr(text_area, 'load_stats', {}).get('total', 0) is not None
+            and text_area.large_insert is None)
+
+@perf.timed('hibernate tab')
+def hibernate_tab(tab):
+    # Drop the widgets of a tab and keep its content compressed, the undo
+    # history is kept too but moved to disk when spilling is on
+    text_area = tab.text_area
+    flush_journal(tab)
+    if auto_save_enabled and auto_save_tab(tab):
+        win.after(AUTO_SAVE_POLL_MS, lambda: collect_auto_saves(1))
+    snapshot = tab.document.snapshot()
+    tab.sleeping = {
+        'text': hibernation.SleepingText(snapshot),
+        'awake_bytes': tab_memory(tab),
+        'modified': text_area.edit_modified(),
+        'cursor': '%d.%d' % document_position(text_area, INSERT),
+        'view': text_area.yview()[0],
+        'lexer': text_area.highlighter.lexer if text_area.highlighter is not None else None
+    }
+    tab.cancel_timers()
+    tab.pending_jobs = {}
+    tab.history.spill_all()
+    stop_symbol_index(text_area)
+    text_area.master.destroy()
+    tab.line_numbers.destroy()
+    tab.text_area = tab.line_numbers = tab.document = None
+
+@perf.timed('wake tab')
+def wake_tab(tab):
+    state = tab.sleeping
+    text_area = build_tab(tab)
+    tab.sleeping = None
+    # The log and the undo history already describe this content
+    log, history = tab.journal, tab.history
+    tab.journal = tab.history = None
+    append_text(text_area, state['text'].text())
+    tab.journal, tab.history = log, history
+    text_area.edit_modified(state['modified'])
+    text_area.mark_set(INSERT, widget_index(text_area, *parse_index(state['cursor'])))
+    text_area.yview_moveto(state['view'])
+    if state['lexer'] is not None:
+        start_highlighting(text_area, state['lexer'])
+    if state.get('changed_on_disk'):
+        reload_from_disk(tab)
+    return text_area
+
+def hibernate_idle_tabs():
+    win.after(HIBERNATE_CHECK_MS, hibernate_idle_tabs)
+    if hibernate_idle_minutes <= 0:
+        return
+    now = time.monotonic()
+    current = current_tab()
+    if current:
+        current.last_active = now
+    for tab in list(tabs.values()):
+        if tab is not current and now - tab.last_active > hibernate_idle_minutes * 60 and can_hibernate(tab):
+            hibernate_tab(tab)
+
+def show_tab_memory():
+    memory_window = Toplevel(win)
+    memory_window.title("Tab Memory")
+    memory_window.geometry("640x300")
+    
+    table = ttk.Treeview(memory_window, columns=('state', 'memory', 'undo'))
+    table.heading('#0', text="Tab")
+    table.heading('state', text="State")
+    table.heading('memory', text="Memory (estimated)")
+    table.heading('undo', text="Undo history")
+    table.column('state', width=90)
+    table.column('memory', width=130, anchor='e')
+    table.column('undo', width=170, anchor='e')
+    table.pack(fill=BOTH, expand=True)
+    summary = Label(memory_window, text="")
+    summary.pack(pady=5)
+    
+    def megabytes(size):
+        return f"{size / (1024 * 1024):.2f} MB"
+    
+    def undo_memory(history):
+        if history is None:
+            return ""
+        if history.spill_size:
+            return f"{megabytes(history.size)} + {megabytes(history.spill_size)} on disk"
+        return megabytes(history.size)
+    
+    def refresh():
+        table.delete(*table.get_children())
+        total = saved = 0
+        for tab_id in notebook.tabs():
+            tab = tabs[str(tab_id)]
+            size = tab_memory(tab)
+            total += size
+            if tab.text_area is not None:
+                state = "Awake"
+            else:
+                state = "Hibernated" if tab.sleeping['text'].compressed else "Compressing"
+                saved += max(tab.sleeping['awake_bytes'] - size, 0)
+            table.insert('', END, text=notebook.tab(tab_id, 'text'),
+                         values=(state, megabytes(size), undo_memory(tab.history)))
+        summary.configure(text=f"Total {megabytes(total)} plus {megabytes(undo_budget.total)} of undo history, "
+                               f"{megabytes(saved)} saved by hibernation")
+    
+    Button(memory_window, text="Refresh", command=refresh).pack(pady=5)
+    refresh()
+
+# Event loop health while recording, updated by the heartbeat
+perf_state = {'after_id': None, 'due': None, 'delay_ms': 0.0, 'frame_ms': 0.0, 'queued': 0,
+              'memory': None, 'memory_at': 0}
+perf_overlay = None
+
+def set_perf_enabled(enabled):
+    perf.enabled = enabled
+    if enabled and perf_state['after_id'] is None:
+        perf_state['due'] = None
+        perf_heartbeat()
+
+def perf_heartbeat():
+    # An after callback that runs late means the event loop was busy, the
+    # delay is what a keystroke arriving then would have waited
+    perf_state['after_id'] = None
+    if not perf.enabled:
+        return
+    now = time.perf_counter_ns()
+    due = perf_state['due']
+    if due is not None:
+        delay = max(now - due, 0)
+        perf_state['delay_ms'] = delay / 1e6
+        perf.count('event loop delay ms', perf_state['delay_ms'])
+        if delay > PERF_STALL_MS * 1e6:
+            perf.record('event loop stall', due, delay)
+    
+    # Pending Tk timers plus the writes waiting on the background threads
+    queued = (len(win.tk.splitlist(win.tk.call('after', 'info'))) + auto_saver.jobs.qsize()
+              + journal.jobs.qsize() + hibernation.jobs.qsize())
+    perf_state['queued'] = queued
+    perf.count('queued jobs', queued)
+    if now - perf_state['memory_at'] > PERF_MEMORY_MS * 1e6:
+        perf_state['memory_at'] = now
+        perf_state['memory'] = perf.memory_usage()
+        if perf_state['memory'] is not None:
+            perf.count('memory MB', perf_state['memory'] / (1024 * 1024))
+    
+    perf_state['due'] = time.perf_counter_ns() + PERF_HEARTBEAT_MS * 1000000
+    perf_state['after_id'] = win.after(PERF_HEARTBEAT_MS, perf_heartbeat)
+
+def perf_key_pressed(event):
+    # Time from a key press until Tk is idle again, after the redraw it caused
+    if perf.enabled:
+        pressed = time.perf_counter_ns()
         
-        # Schedule next auto-save
-        win.after(AUTO_SAVE_INTERVAL, lambda: auto_save())
+        def painted():
+            duration = time.perf_counter_ns() - pressed
+            perf_state['frame_ms'] = duration / 1e6
+            perf.record('keystroke to idle', pressed, duration)
+        
+        win.after_idle(painted)
+
+def toggle_performance_recording(enabled):
+    global performance_recording
+    performance_recording = enabled
+    set_perf_enabled(enabled or perf_overlay is not None)
+    save_config()
+
+def toggle_performance_overlay(shown):
+    global perf_overlay
+    if not shown:
+        if perf_overlay is not None:
+            perf_overlay.destroy()
+            perf_overlay = None
+        set_perf_enabled(performance_recording)
+        return
     
-    # Start auto-save cycle
-    win.after(AUTO_SAVE_INTERVAL, lambda: auto_save())
+    # Drawn over the bottom right corner of the window, the overlay needs
+    # the timings so it turns recording on while it is shown
+    perf_overlay = Label(win, justify=LEFT, anchor='nw', font=("Courier New", 9),
+                         bg='#202020', fg='#e0e0e0', padx=6, pady=4)
+    perf_overlay.place(relx=1.0, rely=1.0, x=-4, y=-4, anchor='se')
+    set_perf_enabled(True)
+    refresh_performance_overlay(perf_overlay)
+
+def refresh_performance_overlay(overlay):
+    if overlay is not perf_overlay or not overlay.winfo_exists():
+        return
+    memory = perf_state['memory']
+    lines = [f"event loop  {perf_state['delay_ms']:7.1f} ms",
+             f"keystroke   {perf_state['frame_ms']:7.1f} ms",
+             f"queued      {perf_state['queued']:7d}",
+             f"memory      {memory / (1024 * 1024):7.1f} MB" if memory is not None else "memory          n/a",
+             f"slowest in the last {perf.RECENT_SECONDS} s:"]
+    lines += [f"  {name:<20.20} {duration:7.1f} ms" for name, duration in perf.slowest()]
+    overlay.configure(text='\n'.join(lines))
+    overlay.lift()
+    win.after(PERF_OVERLAY_MS, lambda: refresh_performance_overlay(overlay))
+
+def export_performance_trace():
+    if not perf.events:
+        messagebox.showinfo("Export Trace", "Nothing has been recorded yet, turn on "
+                            "View > Performance > Record Timings first")
+        return
+    file_path = filedialog.asksaveasfilename(defaultextension=".json",
+                                             filetypes=[("Chrome Trace", "*.json"), ("All Files", "*.*")])
+    if file_path:
+        try:
+            perf.export_chrome_trace(file_path)
+        except OSError as e:
+            messagebox.showerror("Export Trace", f"Could not write {file_path}: {e}")
+
+def prewarm():
+    def run():
+        for name in PREWARM_MODULES:
+            try:
+                importlib.import_module(name)
+            except ImportError:
+                pass
+    threading.Thread(target=run, daemon=True).start()
+
+def finish_startup():
+    # Runs once the window is up, settings are applied to the tabs already open
+    load_config()
+    undo_budget.tab_bytes = undo_memory_mb * 1024 * 1024
+    undo_budget.total_bytes = undo_total_memory_mb * 1024 * 1024
+    undo_budget.spill = undo_spill_to_disk
+    set_theme(current_theme)
+    if not show_line_numbers:
+        apply_line_numbers()
+    create_menu()
+    create_tab_menu()
+    notebook.bind('<<NotebookTabChanged>>', on_tab_changed)
+    if auto_save_enabled:
+        start_auto_save()
+    if prewarm_imports:
+        win.after(PREWARM_DELAY_MS, lambda: win.after_idle(prewarm))
+    win.after(HIBERNATE_CHECK_MS, hibernate_idle_tabs)
+    win.after(WATCH_POLL_MS, check_file_changes)
+    win.bind_all('<KeyPress>', perf_key_pressed, add='+')
+    if performance_recording:
+        set_perf_enabled(True)
+
+def main():
+    win.protocol("WM_DELETE_WINDOW", exit_program)
+
+    # Bring back the tabs of a session that crashed, or start with an empty
+    # one, everything else waits until the window has been drawn
+    if not restore_session():
+        new_file()
+    win.after_idle(finish_startup)
 
-load_config()
-create_menu()
+    # Start the application
+    win.mainloop()
 
-# Create the initial tab
-new_file()
+if __name__ == "__main__":
+    main()
 
-# Start the application
-win.mainloop()
@@ -0,0 +1,191 @@
+"""PDF export that streams lines onto wrapped, paginated pages.
+
+The editor feeds the document in chunks of lines through a bounded queue and
+a worker thread lays them out in a monospace font, wrapping long lines at
+word boundaries, with optional line numbers and syntax colours.
+"""
+import os
+import queue
+import threading
+
+from reportlab.lib.colors import HexColor
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+
+from highlighter import lex_chunks
+
+FONT = 'Courier'
+FONT_SIZE = 10
+LEADING = 1.25  # line height as a multiple of the font size
+MARGIN = 54  # points around the text block
+TAB_SIZE = 4
+NUMBER_DIGITS = 5  # widest line number when the line count is not known
+QUEUE_SIZE = 8  # chunks buffered ahead of the worker
+TEXT_COLOR = HexColor('#000000')
+NUMBER_COLOR = HexColor('#808080')
+
+
+def wrap(text, width):
+    """Split text into (start, end) segments of at most width characters,
+    breaking after the last space that fits when there is one."""
+    segments = []
+    start = 0
+    while len(text) - start > width:
+        end = text.rfind(' ', start, start + width) + 1
+        if end <= start:
+            end = start + width
+        segments.append((start, end))
+        start = end
+    segments.append((start, len(text)))
+    return segments
+
+
+class PdfExport:
+    """One PDF written on a worker thread.
+
+    Feed the document with put(chunk), chunk being lines joined by '\\n',
+    and finish with put(None). line_count sizes the line number gutter.
+    pages, lines_done, error and done can be read from any thread, cancel
+    stops the export and removes the partial file.
+    """
+
+    def __init__(self, path, line_numbers=False, lexer=None, style=None, pagesize=letter, line_count=None):
+        self.path = path
+        self.line_numbers = line_numbers
+        self.line_count = line_count
+        self.lexer = lexer if style is not None else None
+        self.style = style
+        self.pagesize = pagesize
+        self.chunks = queue.Queue(maxsize=QUEUE_SIZE)
+        self.cancel = threading.Event()
+        self.pages = 0
+        self.lines_done = 0
+        self.error = None
+        self.done = False
+        self.colors = {}
+        self.fill = None  # colour last set on the current page
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def put(self, chunk, timeout=None):
+        self.chunks.put(chunk, timeout=timeout)
+
+    def color(self, ttype):
+        if ttype not in self.colors:
+            color = self.style.style_for_token(ttype)['color']
+            self.colors[ttype] = HexColor(f'#{color}') if color else TEXT_COLOR
+        return self.colors[ttype]
+
+    def set_fill(self, page, color):
+        # Parsing and emitting a colour is the slowest part of a run
+        if color is not self.fill:
+            page.setFillColor(color)
+            self.fill = color
+
+    def _chunks(self):
+        while True:
+            try:
+                chunk = self.chunks.get(timeout=0.1)
+            except queue.Empty:
+                if self.cancel.is_set():
+                    return
+                continue
+            if chunk is None or self.cancel.is_set():
+                return
+            yield chunk.expandtabs(TAB_SIZE)
+
+    def _lines(self):
+        # (text, tokens) for every line, tokens None without colours
+        if self.lexer is not None:
+            yield from lex_chunks(self.lexer, self._chunks())
+            return
+        for chunk in self._chunks():
+            for line in chunk.split('\n'):
+                yield line, None
+
+    def _run(self):
+        try:
+            self._render()
+        except Exception as e:
+            self.error = e
+            self.cancel.set()
+        if self.cancel.is_set():
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+        self.done = True
+
+    def _render(self):
+        page_width, page_height = self.pagesize
+        char_width = stringWidth('M', FONT, FONT_SIZE)
+        line_height = FONT_SIZE * LEADING
+        lines_per_page = int((page_height - 2 * MARGIN) // line_height)
+        # Room for the widest number and a space after it
+        digits = 0
+        if self.line_numbers:
+            digits = (len(str(self.line_count)) if self.line_count else NUMBER_DIGITS) + 1
+        gutter = digits * char_width
+        columns = max(int((page_width - 2 * MARGIN - gutter) // char_width), 1)
+        top = page_height - MARGIN - FONT_SIZE
+
+        pdf = canvas.Canvas(self.path, pagesize=self.pagesize)
+        pdf.setTitle(os.path.basename(self.path))
+        row = 0
+        page = None
+
+        def new_page():
+            nonlocal page, row
+            if page is not None:
+                pdf.drawText(page)
+                pdf.showPage()
+                self.pages += 1
+            page = pdf.beginText()
+            page.setFont(FONT, FONT_SIZE)
+            self.fill = None
+            row = 0
+
+        new_page()
+        number = 0
+        for text, tokens in self._lines():
+            number += 1
+            for start, end in wrap(text, columns):
+                if row == lines_per_page:
+                    new_page()
+                y = top - row * line_height
+                if self.line_numbers and start == 0:
+                    self.set_fill(page, NUMBER_COLOR)
+                    page.setTextOrigin(MARGIN, y)
+                    page.textOut(str(number).rjust(digits - 1))
+                page.setTextOrigin(MARGIN + gutter, y)
+                if tokens is None:
+                    self.set_fill(page, TEXT_COLOR)
+                    page.textOut(text[start:end])
+                else:
+                    self._draw_tokens(page, text, tokens, start, end)
+                row += 1
+            self.lines_done = number
+        if self.cancel.is_set():
+            return
+        pdf.drawText(page)
+        pdf.showPage()
+        self.pages += 1
+        pdf.save()
+
+    def _draw_tokens(self, page, text, tokens, start, end):
+        # Neighbouring tokens of the same colour are drawn as one run
+        run_start = start
+        run_color = TEXT_COLOR
+        for column, length, ttype in tokens:
+            if column + length <= start or column >= end:
+                continue
+            color = self.color(ttype)
+            if color is not run_color:
+                if column > run_start:
+                    self.set_fill(page, run_color)
+                    page.textOut(text[run_start:column])
+                    run_start = max(column, start)
+                run_color = color
+        if end > run_start:
+            self.set_fill(page, run_color)
+            page.textOut(text[run_start:end])
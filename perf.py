@@ -0,0 +1,160 @@
+"""Named timing spans, counters and Chrome trace export.
+
+Events are only recorded while enabled is set. When it is not, span()
+returns one shared do-nothing context manager and a timed() function makes
+a single check before calling through, so the hooks can stay in the hot
+paths. Events are kept in a bounded ring buffer, appended from any thread,
+and can be written out in the Chrome trace event format that
+chrome://tracing and Perfetto read.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+MAX_EVENTS = 200_000  # events kept for export, older ones are dropped
+RECENT_SECONDS = 10  # how far back slowest() looks by default
+
+enabled = False
+# (phase, name, start_ns, duration_ns or counter value, thread id), phase
+# 'X' for a span and 'C' for a counter sample like in the trace format
+events = deque(maxlen=MAX_EVENTS)
+thread_names = {}  # thread id -> name, kept since threads may be gone by export
+origin_ns = time.perf_counter_ns()
+
+
+class Span:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.name, self.start, time.perf_counter_ns() - self.start)
+        return False
+
+
+class NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+def span(name):
+    return Span(name) if enabled else NULL_SPAN
+
+
+def timed(name):
+    """Decorator recording every call of the function as a span."""
+    def decorate(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(name, start, time.perf_counter_ns() - start)
+        return wrapper
+    return decorate
+
+
+def thread_id():
+    ident = threading.get_ident()
+    if ident not in thread_names:
+        thread_names[ident] = threading.current_thread().name
+    return ident
+
+
+def record(name, start_ns, duration_ns):
+    events.append(('X', name, start_ns, duration_ns, thread_id()))
+
+
+def count(name, value):
+    if enabled:
+        events.append(('C', name, time.perf_counter_ns(), value, thread_id()))
+
+
+def clear():
+    events.clear()
+
+
+def memory_usage():
+    # Resident set size in bytes, None where it cannot be read cheaply
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Only the peak is available here, in kilobytes except on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def slowest(limit=5, seconds=RECENT_SECONDS):
+    """(name, duration_ms) of the slowest spans that ended in the last
+    seconds, slowest first."""
+    cutoff = time.perf_counter_ns() - int(seconds * 1e9)
+    spans = []
+    # Newest events are at the right, stop once they are too old
+    for phase, name, start, value, _ in reversed(events.copy()):
+        if start + (value if phase == 'X' else 0) < cutoff:
+            break
+        if phase == 'X':
+            spans.append((value, name))
+    spans.sort(reverse=True)
+    return [(name, duration / 1e6) for duration, name in spans[:limit]]
+
+
+def summary():
+    # name -> (calls, total ms, max ms) over every recorded span
+    totals = {}
+    for phase, name, _, value, _ in events.copy():
+        if phase == 'X':
+            calls, total, longest = totals.get(name, (0, 0, 0))
+            totals[name] = (calls + 1, total + value, max(longest, value))
+    return {name: (calls, total / 1e6, longest / 1e6) for name, (calls, total, longest) in totals.items()}
+
+
+def chrome_trace():
+    """The recorded events as a Chrome trace object, times in microseconds
+    from when this module was imported."""
+    pid = os.getpid()
+    trace = []
+    threads = set()
+    for phase, name, start, value, thread in events.copy():
+        event = {'name': name, 'ph': phase, 'ts': (start - origin_ns) / 1000, 'pid': pid, 'tid': thread}
+        if phase == 'X':
+            event['dur'] = value / 1000
+        else:
+            event['args'] = {'value': value}
+        trace.append(event)
+        threads.add(thread)
+    for thread in threads:
+        trace.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': thread,
+                      'args': {'name': thread_names.get(thread, f'Thread {thread}')}})
+    return {'traceEvents': trace, 'displayTimeUnit': 'ms'}
+
+
+def export_chrome_trace(path):
+    with open(path, 'w') as f:
+        json.dump(chrome_trace(), f)
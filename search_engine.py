@@ -0,0 +1,250 @@
+"""Search engine used by Find and Replace.
+
+A search scans a snapshot of the buffer in one pass and keeps the matches as
+a sorted array of (line << 32 | column) keys, so navigation is a binary
+search and edits only touch the lines they changed.
+"""
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+
+COLUMN_BITS = 32
+BLOCK_MATCHES = 4096  # matches per block of a MatchCache
+
+
+def compile_pattern(text, regex=False, match_case=True, whole_word=False):
+    # ^ and $ match at every line like Tk's search, so a scan of the whole
+    # document and a rescan of a few lines agree
+    pattern = text if regex else re.escape(text)
+    if whole_word:
+        pattern = r'\b(?:' + pattern + r')\b'
+    flags = re.MULTILINE if regex else 0
+    if not match_case:
+        flags |= re.IGNORECASE
+    return re.compile(pattern, flags)
+
+
+def make_key(line, column):
+    return (line << COLUMN_BITS) | column
+
+
+def split_key(key):
+    return key >> COLUMN_BITS, key & ((1 << COLUMN_BITS) - 1)
+
+
+def iter_matches(pattern, text, first_line=1):
+    """Yield (line, column, match) for every non-empty match of pattern.
+
+    Lines are numbered from first_line and columns from 0, like Tk indices.
+    """
+    line = first_line
+    line_start = 0
+    pos = 0
+    for match in pattern.finditer(text):
+        start, end = match.span()
+        if start == end:
+            continue
+        newlines = text.count('\n', pos, start)
+        if newlines:
+            line += newlines
+            line_start = text.rfind('\n', pos, start) + 1
+        pos = start
+        yield line, start - line_start, match
+
+
+def scan(pattern, text, first_line=1):
+    # Matches as (keys, lengths) arrays
+    keys = array('Q')
+    lengths = array('L')
+    for line, column, match in iter_matches(pattern, text, first_line):
+        keys.append(make_key(line, column))
+        lengths.append(match.end() - match.start())
+    return keys, lengths
+
+
+def replacements(pattern, text, template, regex=False, first_line=1):
+    """Yield (line, column, matched, replacement) for every match.
+
+    In regex mode the template may refer to groups (\\1, \\g<name>),
+    otherwise it is inserted literally.
+    """
+    for line, column, match in iter_matches(pattern, text, first_line):
+        replacement = match.expand(template) if regex else template
+        yield line, column, match.group(), replacement
+
+
+class MatchCache:
+    """Matches of one pattern in one document, kept up to date lazily.
+
+    Edits are only recorded by note_edit; apply_edits drops the matches on
+    the touched lines, shifts the ones below and rescans just those lines.
+    Matches are assumed not to span the edited lines. The matches are kept
+    in blocks of about BLOCK_MATCHES, each with a line shift still to be
+    added to its keys, so an edit that adds or removes lines only rewrites
+    the blocks it touches and bumps the shift of the ones below.
+    """
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.blocks = []  # [line shift, keys, lengths], in order, never empty
+        self.pending = []
+        self.ready = False
+
+    def fill(self, keys, lengths):
+        self.blocks = make_blocks(keys, lengths)
+        self.ready = True
+
+    def __len__(self):
+        return sum(len(block[1]) for block in self.blocks)
+
+    @property
+    def keys(self):
+        keys = array('Q')
+        for block in self.blocks:
+            keys.extend(block_keys(block))
+        return keys
+
+    @property
+    def lengths(self):
+        lengths = array('L')
+        for block in self.blocks:
+            lengths.extend(block[2])
+        return lengths
+
+    def note_edit(self, start, old_end, new_end):
+        # Positions are (line, column) tuples
+        self.pending.append((start[0], old_end[0], new_end[0]))
+
+    def apply_edits(self, get_lines):
+        """Bring the cache up to date; get_lines(first, last) returns the
+        current text of that inclusive line range."""
+        if not self.pending or not self.ready:
+            return
+        dirty = []
+        for first, old_last, new_last in self.pending:
+            delta = new_last - old_last
+            self._splice(make_key(first, 0), make_key(old_last + 1, 0), array('Q'), array('L'), delta)
+            if delta:
+                dirty = [(a + delta if a > old_last else a, b + delta if b > old_last else b)
+                         for a, b in dirty]
+            dirty.append((first, new_last))
+        self.pending = []
+
+        for first, last in merge_ranges(dirty):
+            keys, lengths = scan(self.pattern, get_lines(first, last), first)
+            self._splice(make_key(first, 0), make_key(last + 1, 0), keys, lengths)
+
+    def _find_block(self, key):
+        # Index of the first block ending at or after key
+        blocks = self.blocks
+        low, high = 0, len(blocks)
+        while low < high:
+            middle = (low + high) // 2
+            if block_key(blocks[middle], -1) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _splice(self, low_key, high_key, keys, lengths, delta=0):
+        # Put keys in place of the matches in [low_key, high_key) and move
+        # the ones after it by delta lines
+        blocks = self.blocks
+        i = self._find_block(low_key)
+        j = i
+        while j < len(blocks) and block_key(blocks[j], 0) < high_key:
+            j += 1
+        if i == j and keys:
+            # Nothing to remove, join the new matches to a neighbouring block
+            if i:
+                i -= 1
+            elif j < len(blocks):
+                j += 1
+        elif i == j:
+            for block in blocks[j:]:
+                block[0] += delta
+            return
+
+        old_keys = array('Q')
+        old_lengths = array('L')
+        for block in blocks[i:j]:
+            old_keys.extend(block_keys(block))
+            old_lengths.extend(block[2])
+        low = bisect_left(old_keys, low_key)
+        high = bisect_left(old_keys, high_key)
+        tail = old_keys[high:]
+        if delta:
+            shift = delta << COLUMN_BITS
+            tail = array('Q', [key + shift for key in tail])
+        for block in blocks[j:]:
+            block[0] += delta
+        blocks[i:j] = make_blocks(old_keys[:low] + keys + tail,
+                                  old_lengths[:low] + lengths + old_lengths[high:])
+
+    def in_lines(self, first, last):
+        # Matches starting on lines first..last as (key, length) pairs
+        low_key = make_key(first, 0)
+        high_key = make_key(last + 1, 0)
+        for block in self.blocks[self._find_block(low_key):]:
+            shift = block[0] << COLUMN_BITS
+            keys = block[1]
+            start = bisect_left(keys, low_key - shift)
+            end = bisect_left(keys, high_key - shift)
+            for i in range(start, end):
+                yield keys[i] + shift, block[2][i]
+            if end < len(keys):
+                return
+
+    def next_after(self, line, column):
+        if not self.blocks:
+            return None
+        key = make_key(line, column)
+        b = self._find_block(key + 1)
+        if b == len(self.blocks):
+            return block_match(self.blocks[0], 0)  # wrap around to the first
+        block = self.blocks[b]
+        return block_match(block, bisect_right(block[1], key - (block[0] << COLUMN_BITS)))
+
+    def previous_before(self, line, column):
+        if not self.blocks:
+            return None
+        key = make_key(line, column)
+        b = self._find_block(key)
+        if b < len(self.blocks):
+            block = self.blocks[b]
+            i = bisect_left(block[1], key - (block[0] << COLUMN_BITS)) - 1
+            if i >= 0:
+                return block_match(block, i)
+        # The last match before this block, or the very last one
+        return block_match(self.blocks[b - 1], -1)
+
+
+def make_blocks(keys, lengths):
+    return [[0, keys[i:i + BLOCK_MATCHES], lengths[i:i + BLOCK_MATCHES]]
+            for i in range(0, len(keys), BLOCK_MATCHES)]
+
+
+def block_key(block, i):
+    return block[1][i] + (block[0] << COLUMN_BITS)
+
+
+def block_keys(block):
+    # Keys of a block with its line shift applied
+    if not block[0]:
+        return block[1]
+    shift = block[0] << COLUMN_BITS
+    return array('Q', [key + shift for key in block[1]])
+
+
+def block_match(block, i):
+    return split_key(block_key(block, i)) + (block[2][i],)
+
+
+def merge_ranges(ranges):
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+        else:
+            merged.append((first, last))
+    return merged
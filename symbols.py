@@ -0,0 +1,396 @@
+"""Symbol index behind the outline panel and Go To Symbol.
+
+Symbols are read from the token stream of the highlighter's lexer: class
+and function names, headings, and the keys of JSON and YAML documents. A
+symbol is (line, column, kind, name, depth), depth being the indentation of
+its line (the level for a heading), which is what nests the outline.
+
+Symbols keeps them together with a Highlighter of its own, so after an
+edit only the lines from the edit on are lexed again, until the lexer state
+matches the cached one. SymbolIndex runs that on a worker thread: edits
+are queued with a snapshot of the document taken after them, and each time
+the symbols change a new SymbolTable is handed back. A table is never
+changed once made, the editor reads it while the worker builds the next
+one. Finished indexes are cached on disk by a hash of the document text,
+so reopening an unchanged file or waking a tab does not lex it again.
+
+SymbolTable.find does the fuzzy lookup: the lower-cased names are joined
+into one string, one per line, and searched with regular expressions, so
+the matching runs in C and answers within a frame for 100,000 symbols.
+"""
+import hashlib
+import json
+import os
+import queue
+import re
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+from pygments.token import Generic, Keyword, Name, Text
+
+import perf
+from autosave import atomic_write
+from highlighter import ROOT, Highlighter
+
+LEX_BATCH_LINES = 2000  # lines lexed between looks at the edit queue
+PUBLISH_SECONDS = 0.5  # how often a table is handed over while a big document is first indexed
+FIND_LIMIT = 200  # default number of matches find returns
+FIND_SECONDS = 0.01  # longest a lookup searches before it returns what it found
+FIND_WINDOW = 256 * 1024  # characters of names searched between looks at the clock
+CACHE_VERSION = 2
+CACHE_FILES = 200  # cached indexes kept, the least recently written go first
+CACHE_SUFFIX = '.sym'
+KEY_LEXERS = {'json', 'json-object', 'jsonld', 'yaml'}  # lexers whose Name.Tag tokens are keys
+WORD = re.compile(r'\w')
+
+
+def token_kind(ttype, keys):
+    # Kind of symbol a token names, None for the rest
+    if ttype in Name.Class:
+        return 'class'
+    if ttype in Name.Function:
+        return 'function'
+    if ttype in Generic.Heading or ttype in Generic.Subheading:
+        return 'heading'
+    if keys and ttype in Name.Tag:
+        return 'key'
+    return None
+
+
+def line_symbols(number, text, tokens, kinds, keys):
+    """Symbols of one line from its (column, length, tokentype) tokens.
+
+    kinds caches token_kind per token type. A magic method name like
+    __init__ only counts right after a keyword, Pygments also marks the
+    calls to one.
+    """
+    found = []
+    previous = None  # type of the last token that is not blank
+    for column, length, ttype in tokens:
+        kind = kinds.get(ttype, False)
+        if kind is False:
+            kind = kinds[ttype] = token_kind(ttype, keys)
+        if kind is not None and (ttype not in Name.Function.Magic or previous in Keyword):
+            name = text[column:column + length]
+            if kind == 'heading':
+                level = len(name) - len(name.lstrip('#'))
+                name = name.lstrip('#').strip()
+                depth = level - 1 if level else int(ttype in Generic.Subheading)
+            else:
+                if kind == 'key':
+                    name = name.strip('"\'')
+                depth = len(text) - len(text.lstrip())
+            # Setext underlines and the like are headings without a name
+            if WORD.search(name):
+                found.append((number, column, kind, name, depth))
+        if ttype not in Text:
+            previous = ttype
+    return found
+
+
+def subtree_ends(symbols):
+    # ends[i] is the index after the last symbol nested under symbol i
+    ends = [len(symbols)] * len(symbols)
+    stack = []
+    for i, symbol in enumerate(symbols):
+        depth = symbol[4]
+        while stack and symbols[stack[-1]][4] >= depth:
+            ends[stack.pop()] = i
+        stack.append(i)
+    return ends
+
+
+class SymbolTable:
+    """Symbols of a document at one point in time, never changed once made.
+
+    reshaped tells whether the names or the nesting differ from the table
+    it was made after, when they do not only line numbers have moved.
+    """
+
+    def __init__(self, symbols, previous=None):
+        self.symbols = symbols
+        # Every name follows a newline, starts[i] is where the one before
+        # name i is. Lower-casing can change the length of a name, so they
+        # are measured on the lower-cased text.
+        self.haystack = '\n' + '\n'.join([symbol[3] for symbol in symbols]).lower()
+        self.starts = list(accumulate((len(name) + 1 for name in self.haystack[1:].split('\n')), initial=0)) \
+            if symbols else [0, 1]
+        self.shape = [(symbol[2], symbol[4]) for symbol in symbols]
+        if previous is not None and previous.haystack == self.haystack and previous.shape == self.shape:
+            self.ends = previous.ends
+            self.reshaped = False
+        else:
+            self.ends = subtree_ends(symbols)
+            self.reshaped = True
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def find(self, query, limit=FIND_LIMIT, seconds=FIND_SECONDS):
+        """Indices of up to limit symbols matching query, best first.
+
+        Names starting with the query come first, then names containing it,
+        then names holding its characters in order. Each group is in
+        document order, and an empty query lists the first symbols. The
+        search stops with what it has once it has taken seconds.
+        """
+        query = query.strip().lower()
+        if not query:
+            return list(range(min(limit, len(self.symbols))))
+        deadline = time.perf_counter() + seconds
+        chars = [re.escape(char) for char in query]
+        literal = ''.join(chars)
+        # The fuzzy pattern starts with a literal so the regex engine can
+        # skip ahead to it
+        spread = chars[0] + ''.join(f'[^{char}\\n]*{char}' for char in chars[1:])
+        found = []
+        seen = set()
+        for pattern in ('\n' + literal, literal, spread):
+            if self._scan(re.compile(pattern), found, seen, limit, deadline):
+                break
+        return found
+
+    def _scan(self, pattern, found, seen, limit, deadline):
+        # Adds the symbols pattern matches to found, a window of the
+        # haystack at a time. True once there is no need to go on.
+        haystack, starts = self.haystack, self.starts
+        position = 0
+        while position < len(haystack):
+            if time.perf_counter() > deadline:
+                return True
+            # Windows end right before a newline, no match spans two names
+            end = starts[min(bisect_right(starts, position + FIND_WINDOW), len(starts) - 1)]
+            for match in pattern.finditer(haystack, position, end):
+                i = bisect_right(starts, match.start()) - 1
+                if i not in seen:
+                    seen.add(i)
+                    found.append(i)
+                    if len(found) >= limit:
+                        return True
+            position = end
+        return False
+
+
+class Symbols:
+    """Symbols of a document and the lexer state needed to keep them up to date.
+
+    Not thread-safe, SymbolIndex only ever uses it from its worker.
+    """
+
+    def __init__(self, lexer, line_count):
+        self.lexer = lexer
+        self.highlighter = Highlighter(lexer, line_count)
+        self.keys = bool(KEY_LEXERS.intersection(getattr(lexer, 'aliases', ())))
+        self.kinds = {}  # token type -> kind, see token_kind
+        self.symbols = []  # sorted by position
+        self.changed = True  # symbols differ from the last table made
+        self.fetched = (1, [])  # first line and text of the lines handed to the lexer last
+
+    @property
+    def busy(self):
+        return self.highlighter.busy
+
+    def note_edit(self, start, old_end, new_end):
+        # Lines after the first edited one are lexed again, the symbols on
+        # them go and the ones below move with the lines
+        first, old_last, new_last = start[0], old_end[0], new_end[0]
+        self.highlighter.note_edit(start, old_end, new_end)
+        symbols = self.symbols
+        low = bisect_left(symbols, (first + 1,))
+        high = bisect_left(symbols, (old_last + 1,))
+        delta = new_last - old_last
+        if delta:
+            symbols[high:] = [(symbol[0] + delta,) + symbol[1:] for symbol in symbols[high:]]
+        if low < high or delta:
+            del symbols[low:high]
+            self.changed = True
+
+    def run(self, snapshot, max_lines=LEX_BATCH_LINES):
+        """Lex about max_lines lines of snapshot, True once up to date."""
+        def get_lines(first, last):
+            text = snapshot.lines(first, last)
+            self.fetched = (first, text.split('\n'))
+            return text
+        return self.highlighter.run(get_lines, self._apply, max_lines)
+
+    def _apply(self, first, last, lexed):
+        fetched_first, texts = self.fetched
+        found = []
+        for number, tokens in enumerate(lexed, first):
+            if tokens:
+                found += line_symbols(number, texts[number - fetched_first], tokens, self.kinds, self.keys)
+        symbols = self.symbols
+        low = bisect_left(symbols, (first,))
+        high = bisect_left(symbols, (last + 1,))
+        if symbols[low:high] != found:
+            symbols[low:high] = found
+            self.changed = True
+
+    def table(self, previous=None):
+        self.changed = False
+        return SymbolTable(list(self.symbols), previous)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Plain JSON, the file may come from anywhere. Most lines start in
+        # the same few states, each is written once and lines refer to it by
+        # its number.
+        stacks = {}
+        states = [None if s is None else stacks.setdefault(s, len(stacks)) for s in self.highlighter.states]
+        state = {'version': CACHE_VERSION, 'lexer': self.lexer.name, 'symbols': self.symbols,
+                 'stacks': list(stacks), 'states': states}
+        atomic_write(path, json.dumps(state, separators=(',', ':')).encode('utf-8'))
+
+    @classmethod
+    def load(cls, path, lexer, line_count):
+        # Symbols saved for the same text and lexer, None when there are none
+        # or the file is unreadable, cut short or not one of ours
+        names = getattr(lexer, '_tokens', None) or ROOT
+        try:
+            with open(path, 'rb') as f:
+                state = json.loads(f.read())
+            if (state['version'] != CACHE_VERSION or state['lexer'] != lexer.name
+                    or len(state['states']) != line_count + 1):
+                return None
+            stacks = [tuple(stack) for stack in state['stacks']]
+            if not all(stack and all(isinstance(name, str) and name in names for name in stack)
+                       for stack in stacks):
+                return None
+            states = [None if number is None else stacks[number] for number in state['states']]
+            found = [(int(line), int(column), str(kind), str(name), int(depth))
+                     for line, column, kind, name, depth in state['symbols']]
+        except Exception:
+            return None
+        symbols = cls(lexer, line_count)
+        symbols.symbols = found
+        symbols.highlighter.states = states
+        symbols.highlighter.dirty_from = None
+        return symbols
+
+
+def content_key(lexer, snapshot):
+    # Name of the cache file for this text lexed by this lexer
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f'{CACHE_VERSION}:{lexer.name}:'.encode('utf-8'))
+    for chunk in snapshot.chunks():
+        digest.update(chunk.encode('utf-8', 'surrogatepass'))
+    return digest.hexdigest() + CACHE_SUFFIX
+
+
+def prune_cache(directory, keep=CACHE_FILES):
+    try:
+        entries = [entry for entry in os.scandir(directory) if entry.name.endswith(CACHE_SUFFIX)]
+        entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in entries[keep:]:
+            os.remove(entry.path)
+    except OSError:
+        pass
+
+
+class SymbolIndex:
+    """Symbols of one open document, kept up to date on a worker thread.
+
+    The editor calls note_edit for every edit and send with a snapshot once
+    it wants them taken in, then collect to pick up new tables. table is
+    the newest one, None until the first arrives.
+    """
+
+    def __init__(self, lexer, snapshot, cache_dir=None):
+        # The worker gets a lexer of its own
+        self.lexer = type(lexer)(**lexer.options)
+        self.table = None
+        self.edits = []  # edits not sent yet
+        self.sent = 0  # batches of edits sent
+        self.seen = 0  # batches the worker had taken in when it last reported
+        self.converged = False  # the worker was up to date when it last reported
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        threading.Thread(target=self._run, args=(snapshot, cache_dir), daemon=True).start()
+
+    @property
+    def busy(self):
+        return bool(self.edits) or self.seen < self.sent or not self.converged
+
+    def note_edit(self, start, old_end, new_end):
+        self.edits.append((start, old_end, new_end))
+
+    def send(self, snapshot):
+        """Hand the edits noted so far to the worker, snapshot is the
+        document right after the last of them."""
+        if self.edits:
+            self.sent += 1
+            self.jobs.put((self.sent, self.edits, snapshot))
+            self.edits = []
+
+    def collect(self):
+        """Take in what the worker reported. True when the outline changed
+        shape since the last call, False when at most lines moved."""
+        reshaped = False
+        while True:
+            try:
+                self.seen, table, self.converged = self.results.get_nowait()
+            except queue.Empty:
+                return reshaped
+            if table is not None:
+                reshaped = reshaped or table.reshaped
+                self.table = table
+
+    def close(self):
+        self.jobs.put(None)
+
+    def _run(self, snapshot, cache_dir):
+        path = None
+        symbols = None
+        if cache_dir is not None:
+            path = os.path.join(cache_dir, content_key(self.lexer, snapshot))
+            symbols = Symbols.load(path, self.lexer, snapshot.line_count)
+        cached = symbols is not None
+        if not cached:
+            symbols = Symbols(self.lexer, snapshot.line_count)
+        table = None
+        if cached:
+            table = symbols.table()
+            self.results.put((0, table, True))
+        seen = 0
+        edited = False  # edits came in since the cache was last written
+        published = time.perf_counter()
+        while True:
+            try:
+                job = self.jobs.get(block=not symbols.busy)
+            except queue.Empty:
+                job = False
+            if job is None:
+                break
+            if job:
+                seen, edits, snapshot = job
+                for edit in edits:
+                    symbols.note_edit(*edit)
+                edited = True
+                continue  # everything queued is taken in before lexing on
+
+            with perf.span('symbols'):
+                done = symbols.run(snapshot)
+            if done or (symbols.changed and time.perf_counter() - published > PUBLISH_SECONDS):
+                if symbols.changed:
+                    table = symbols.table(table)
+                    self.results.put((seen, table, done))
+                else:
+                    self.results.put((seen, None, done))
+                published = time.perf_counter()
+            if done and not cached and not edited and path is not None:
+                cached = True
+                self._save(symbols, path, cache_dir)
+
+        # An index closed with edits is saved as it is now, if it is done
+        if edited and cache_dir is not None and not symbols.busy:
+            self._save(symbols, os.path.join(cache_dir, content_key(self.lexer, snapshot)), cache_dir)
+
+    @staticmethod
+    def _save(symbols, path, cache_dir):
+        try:
+            symbols.save(path)
+        except OSError:
+            return
+        prune_cache(cache_dir)
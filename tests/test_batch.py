@@ -0,0 +1,55 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import batch
+
+
+class ReplaceTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'sample.txt')
+
+    def write(self, data):
+        with open(self.path, 'wb') as f:
+            f.write(data)
+
+    def read(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def run_batch(self, *argv):
+        options = batch.parse_args(list(argv) + [self.path])
+        function = batch.find_file if options.command == 'find' else batch.replace_file
+        return function(self.path, options)
+
+    def replaced(self, *argv):
+        result = self.run_batch('replace', *argv)
+        return int(result[0].split(': ')[1].split()[0]) if result else 0
+
+    def test_dollar_does_not_match_after_last_newline(self):
+        for ending in (b'\n', b'\r\n'):
+            data = ending.join([b'a', b'b', b'c']) + ending
+            self.write(data)
+            found = len(self.run_batch('find', '--regex', '$'))
+            self.assertEqual(self.replaced('--regex', '$', ';'), found)
+            self.assertEqual(self.read(), data)
+            self.assertEqual(self.replaced('--regex', '(\\w)$', '\\1;'), 3)
+            self.assertEqual(self.read(), ending.join([b'a;', b'b;', b'c;']) + ending)
+
+    def test_trailing_space_across_chunk_boundary(self):
+        lines = 2 * batch.CHUNK_LINES + 1
+        self.write(b'x \n' * lines)
+        found = len(self.run_batch('find', '--regex', '[ \\t]*\\s$'))
+        self.assertEqual(found, lines)
+        self.assertEqual(self.replaced('--regex', '[ \\t]*\\s$', ''), found)
+        self.assertEqual(self.read(), b'x\n' * lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
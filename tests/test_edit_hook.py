@@ -0,0 +1,41 @@
+import os
+import sys
+import tkinter
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+notepad = None
+
+
+def setUpModule():
+    # notepad creates its window on import, which needs a display
+    global notepad
+    try:
+        tkinter.Tk().destroy()
+    except tkinter.TclError:
+        raise unittest.SkipTest("no display")
+    import notepad
+
+
+class DisabledEditTest(unittest.TestCase):
+
+    def test_edits_dropped_by_a_disabled_text_are_not_reported(self):
+        text_area = notepad.new_file()
+        text_area.insert('1.0', 'hello\nworld')
+        reported = []
+        text_area.edit_listeners.append(lambda *args: reported.append(args[1:]))
+        text_area.configure(state='disabled')
+        try:
+            text_area.delete('1.0', 'end')
+            text_area.insert('1.0', 'x')
+            text_area.replace('1.0', '1.1', 'y')
+        finally:
+            text_area.configure(state='normal')
+        self.assertEqual(reported, [])
+        self.assertEqual(text_area.get('1.0', 'end-1c'), 'hello\nworld')
+        self.assertEqual(text_area.tab.document.snapshot().text(), 'hello\nworld')
+
+
+if __name__ == '__main__':
+    unittest.main()
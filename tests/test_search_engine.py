@@ -0,0 +1,95 @@
+import os
+import random
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import search_engine
+
+
+def lines_of(text):
+    def get_lines(first, last):
+        return '\n'.join(text.split('\n')[first - 1:last])
+    return get_lines
+
+
+class AnchorTest(unittest.TestCase):
+
+    def full_scan(self, pattern, text):
+        keys, lengths = search_engine.scan(pattern, text)
+        return list(keys), list(lengths)
+
+    def test_anchors_match_every_line(self):
+        text = '\n'.join(f'foo {n} foo' for n in range(1, 101))
+        for source in ('^foo', 'foo$', r'^foo \d+ foo$'):
+            pattern = search_engine.compile_pattern(source, regex=True)
+            keys, _ = self.full_scan(pattern, text)
+            self.assertEqual(len(keys), 100, source)
+
+    def test_rescan_after_edit_matches_full_scan(self):
+        text = '\n'.join(f'foo {n} foo' for n in range(1, 101))
+        for source in ('^foo', 'foo$', '^bar'):
+            pattern = search_engine.compile_pattern(source, regex=True)
+            cache = search_engine.MatchCache(pattern)
+            cache.fill(*search_engine.scan(pattern, text))
+
+            # Type at the start of line 50 and add a line after it
+            lines = text.split('\n')
+            lines[49] = 'bar ' + lines[49]
+            lines.insert(50, 'foo inserted foo')
+            edited = '\n'.join(lines)
+            cache.note_edit((50, 0), (50, 0), (51, len('foo inserted foo')))
+            cache.apply_edits(lines_of(edited))
+
+            self.assertEqual((list(cache.keys), list(cache.lengths)), self.full_scan(pattern, edited), source)
+
+    def test_replacements_over_the_whole_document(self):
+        # Replace All scans the whole document in one pass
+        text = '\n'.join(f'foo {n}' for n in range(1, 20001))
+        found = list(search_engine.replacements(search_engine.compile_pattern('^foo', regex=True),
+                                                text, 'bar', True))
+        self.assertEqual([line for line, _, _, _ in found], list(range(1, 20001)))
+        for source, expected in ((r'\Afoo', [(1, 0)]), (r'\d+\Z', [(20000, 4)]),
+                                 (r'10000\nfoo', [(10000, 4)])):
+            found = search_engine.replacements(search_engine.compile_pattern(source, regex=True),
+                                               text, '', True)
+            self.assertEqual([(line, column) for line, column, _, _ in found], expected, source)
+
+
+class BlockTest(unittest.TestCase):
+
+    @mock.patch.object(search_engine, 'BLOCK_MATCHES', 8)
+    def test_edits_across_blocks_match_full_scan(self):
+        rng = random.Random(5)
+        lines = [rng.choice(['foo', 'bar foo', 'baz', '']) for _ in range(300)]
+        pattern = search_engine.compile_pattern('foo')
+        cache = search_engine.MatchCache(pattern)
+        cache.fill(*search_engine.scan(pattern, '\n'.join(lines)))
+        for _ in range(200):
+            first = rng.randrange(1, len(lines) + 1)
+            old_last = min(first + rng.randrange(3), len(lines))
+            new = [rng.choice(['foo', 'x', 'foo foo', '']) for _ in range(rng.randrange(1, 4))]
+            lines[first - 1:old_last] = new
+            cache.note_edit((first, 0), (old_last, 0), (first + len(new) - 1, 0))
+            if rng.random() < 0.5:
+                continue  # several edits applied together
+            cache.apply_edits(lines_of('\n'.join(lines)))
+            keys, lengths = search_engine.scan(pattern, '\n'.join(lines))
+            self.assertEqual((list(cache.keys), list(cache.lengths)), (list(keys), list(lengths)))
+            self.assertEqual(len(cache), len(keys))
+
+            line = rng.randrange(1, len(lines) + 1)
+            expected = [(k, n) for k, n in zip(keys, lengths) if line <= k >> 32 <= line + 20]
+            self.assertEqual(list(cache.in_lines(line, line + 20)), expected)
+            if keys:
+                key = search_engine.make_key(line, 1)
+                after = [k for k in keys if k > key] or [keys[0]]
+                before = [k for k in keys if k < key] or [keys[-1]]
+                self.assertEqual(cache.next_after(line, 1)[:2], search_engine.split_key(after[0]))
+                self.assertEqual(cache.previous_before(line, 1)[:2], search_engine.split_key(before[-1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import undo_history
+
+
+def new_history(tab_bytes=1 << 30, total_bytes=1 << 30, spill=True):
+    return undo_history.History(undo_history.Budget(tab_bytes, total_bytes, spill))
+
+
+class SavedStateTest(unittest.TestCase):
+
+    def test_undo_and_redo_back_to_saved(self):
+        history = new_history()
+        history.record((1, 0), '', 'a')
+        history.mark_saved()
+        self.assertTrue(history.at_saved())
+        history.record((1, 1), '', 'b')  # typing on starts a new step
+        self.assertFalse(history.at_saved())
+        history.undo()
+        self.assertTrue(history.at_saved())
+        history.undo()
+        self.assertFalse(history.at_saved())
+        history.redo()
+        self.assertTrue(history.at_saved())
+
+    def test_saved_step_dropped_with_redo(self):
+        history = new_history()
+        history.record((1, 0), '', 'a')
+        history.mark_saved()
+        history.undo()
+        history.record((1, 0), '', 'b')
+        history.undo()
+        self.assertFalse(history.at_saved())
+
+    def test_saved_while_step_open_is_unknown(self):
+        history = new_history()
+        history.begin_step()
+        history.record((1, 0), '', 'a')
+        history.mark_saved()
+        history.record((1, 1), '', 'b')
+        history.end_step()
+        self.assertFalse(history.at_saved())
+
+
+class RedoBudgetTest(unittest.TestCase):
+
+    def test_undoing_spilled_steps_keeps_redo_within_cap(self):
+        cap = 64 * 1024
+        history = new_history(tab_bytes=cap)
+        for line in range(1, 201):
+            history.record((line, 0), '', 'x' * 1024 + '\n')
+            history.close_run()
+        self.assertTrue(history.spilled)
+        while history.undo():
+            self.assertLessEqual(history.size, cap + 2048)
+        self.assertTrue(history.redo_steps)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,331 @@
+"""Undo and redo history of a tab, kept in Python instead of in Tk.
+
+Every edit is recorded as a delta (line, column, removed, inserted) in
+document positions, the ones the edit hook reports, so undoing it only
+touches the characters it changed whatever the size of the file, and works
+the same in long-line mode. The deltas between begin_step and end_step, like
+the matches of a replace all, make one step. Outside of one, keys typed or
+deleted with backspace or delete next to each other are folded into the same
+delta until the typing pauses, so a typed paragraph is one small record
+instead of one per key.
+
+The histories of all tabs share a Budget with a cap per tab and one for all
+of them together. Past a cap the oldest steps go first, to a temporary spill
+file when spilling is on, from where undo reads them back once it gets to
+them, otherwise they are forgotten. Undone steps are never spilled, once
+only those are left over a cap the one to be redone last is forgotten.
+"""
+import json
+import sys
+import tempfile
+import time
+import weakref
+from collections import deque
+
+MERGE_SECONDS = 1.0  # pause in typing after which the next key starts a new step
+MERGE_CHARS = 16  # longest edit that still continues a typing run
+RUN_CHARS = 4096  # longest typing run folded into one delta
+DELTA_BYTES = 128  # rough size of a delta tuple on top of its text
+SPILL_BYTES = 512 * 1024 * 1024  # spilled history kept per tab before the oldest is forgotten
+
+
+def end_of(start, text):
+    # Position right after text once inserted at start
+    newlines = text.count('\n')
+    if newlines:
+        return start[0] + newlines, len(text) - text.rfind('\n') - 1
+    return start[0], start[1] + len(text)
+
+
+def delta_size(delta):
+    return sys.getsizeof(delta[2]) + sys.getsizeof(delta[3]) + DELTA_BYTES
+
+
+class Step:
+    """Deltas undone and redone together, in the order they were made."""
+    __slots__ = ('deltas', 'size', 'serial')
+
+    def __init__(self, serial, deltas=()):
+        self.deltas = list(deltas)
+        self.size = sum(map(delta_size, self.deltas))
+        self.serial = serial  # age among the steps of every history
+
+
+class Budget:
+    """Memory caps shared by the histories of every tab."""
+
+    def __init__(self, tab_bytes, total_bytes, spill=True):
+        self.tab_bytes = tab_bytes
+        self.total_bytes = total_bytes
+        self.spill = spill  # move the oldest steps to disk instead of forgetting them
+        self.total = 0  # bytes held in memory by all histories
+        self.serial = 0
+        self.histories = weakref.WeakSet()
+
+    def next_serial(self):
+        self.serial += 1
+        return self.serial
+
+    def enforce(self, history):
+        # Oldest steps of history first while it is over its own cap, then
+        # the oldest of any history while they are over the total. Redo
+        # steps go only once no undo step can.
+        while history.size > self.tab_bytes and (history.evict_oldest() or history.evict_redo()):
+            pass
+        while self.total > self.total_bytes:
+            candidates = [h for h in self.histories if len(h.undo_steps) > 1]
+            if candidates:
+                min(candidates, key=lambda h: h.undo_steps[0].serial).evict_oldest()
+                continue
+            candidates = [h for h in self.histories if h.redo_steps]
+            if not candidates:
+                break
+            min(candidates, key=lambda h: h.redo_steps[0].serial).evict_redo()
+
+
+class History:
+    """Undo and redo steps of one tab.
+
+    undo and redo return the deltas to apply as (line, column, old, new):
+    the text old at (line, column) is replaced by new, in the order given.
+    The newest step always stays in memory, so a step still being recorded
+    is never moved out from under it. mark_saved notes the step the file on
+    disk matches, at_saved tells when undo or redo has come back to it.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.undo_steps = deque()  # in memory, oldest first
+        self.redo_steps = []  # undone, the next one to redo last
+        self.size = 0  # bytes of the steps in memory
+        self.spill = None  # temporary file with the steps older than undo_steps
+        self.spilled = deque()  # (position, length, serial) of those steps, oldest first
+        self.spill_size = 0
+        self.dropped = 0  # steps forgotten for good
+        self.group = 0  # depth of begin_step calls
+        self.run_at = None  # when the typing run that can still be continued last grew
+        self.replaying = False  # set while undo or redo deltas are being applied
+        self.saved = 0  # serial of the newest step when last saved, None if unknown
+        budget.histories.add(self)
+
+    def _count(self, size):
+        self.size += size
+        self.budget.total += size
+
+    def record(self, start, removed, inserted):
+        """Note that removed at start was replaced by inserted."""
+        if self.replaying:
+            return
+        delta = (start[0], start[1], removed, inserted)
+        now = time.monotonic()
+        self._drop_redo()
+        if self.group:
+            self._add(self.undo_steps[-1], delta)
+        elif not (self.run_at is not None and now - self.run_at < MERGE_SECONDS and self._merge(delta)):
+            step = Step(self.budget.next_serial())
+            self.undo_steps.append(step)
+            self._add(step, delta)
+        small = len(removed) + len(inserted) <= MERGE_CHARS
+        self.run_at = now if small and not self.group else None
+        self.budget.enforce(self)
+
+    def _add(self, step, delta):
+        size = delta_size(delta)
+        step.deltas.append(delta)
+        step.size += size
+        self._count(size)
+
+    def _merge(self, delta):
+        # Fold a key typed or deleted right next to the last one into its delta
+        step = self.undo_steps[-1] if self.undo_steps else None
+        if step is None or len(step.deltas) != 1:
+            return False
+        last = step.deltas[0]
+        line, column, removed, inserted = last
+        new_line, new_column, new_removed, new_inserted = delta
+        start = (line, column)
+        new_start = (new_line, new_column)
+        end = end_of(start, inserted)
+        if not removed and not new_removed and new_start == end and len(inserted) < RUN_CHARS:
+            merged = (line, column, '', inserted + new_inserted)  # typing on
+        elif new_inserted:
+            return False
+        elif inserted:
+            if removed or new_start < start or end_of(new_start, new_removed) != end:
+                return False
+            merged = (line, column, '', inserted[:len(inserted) - len(new_removed)])  # backspace over it
+        elif end_of(new_start, new_removed) == start:
+            merged = (new_line, new_column, new_removed + removed, '')  # backspace on
+        elif new_start == start:
+            merged = (line, column, removed + new_removed, '')  # delete on
+        else:
+            return False
+        self._count(-step.size)
+        if merged[2] or merged[3]:
+            step.deltas[0] = merged
+            step.size = delta_size(merged)
+            self._count(step.size)
+        else:
+            self.undo_steps.pop()  # everything typed was deleted again
+        return True
+
+    def close_run(self):
+        """Start a new step with the next edit."""
+        self.run_at = None
+
+    def begin_step(self):
+        """Make the edits up to the matching end_step one step."""
+        self.group += 1
+        if self.group == 1:
+            self.run_at = None
+            self.undo_steps.append(Step(self.budget.next_serial()))
+
+    def end_step(self):
+        self.group -= 1
+        if not self.group and self.undo_steps and not self.undo_steps[-1].deltas:
+            self.undo_steps.pop()
+
+    def cancel_step(self):
+        """End the step begun with begin_step and forget it. Returns the
+        deltas taking its edits back, like undo."""
+        self.group = 0
+        step = self.undo_steps.pop()
+        self._count(-step.size)
+        return [(line, column, inserted, removed)
+                for line, column, removed, inserted in reversed(step.deltas)]
+
+    def _newest_serial(self):
+        # Serial of the step the content is at, 0 before any and -1 when
+        # the steps before it were forgotten
+        if self.undo_steps:
+            return self.undo_steps[-1].serial
+        if self.spilled:
+            return self.spilled[-1][2]
+        return -1 if self.dropped else 0
+
+    def mark_saved(self):
+        """Note that the content as it is now has been saved."""
+        self.run_at = None  # typing on must not change the saved step
+        self.saved = None if self.group else self._newest_serial()
+
+    def at_saved(self):
+        """Whether the content is back to what was saved last."""
+        return self.saved is not None and not self.group and self.saved == self._newest_serial()
+
+    def undo(self):
+        """Deltas undoing the newest step, None when there is none."""
+        if self.group:
+            return None
+        self.run_at = None
+        if not self.undo_steps and self.spilled:
+            self._read_back()
+        if not self.undo_steps:
+            return None
+        step = self.undo_steps.pop()
+        self.redo_steps.append(step)
+        return [(line, column, inserted, removed)
+                for line, column, removed, inserted in reversed(step.deltas)]
+
+    def redo(self):
+        """Deltas redoing the step undone last, None when there is none."""
+        if self.group or not self.redo_steps:
+            return None
+        self.run_at = None
+        step = self.redo_steps.pop()
+        self.undo_steps.append(step)
+        return list(step.deltas)
+
+    def _drop_redo(self):
+        for step in self.redo_steps:
+            self._count(-step.size)
+        self.redo_steps = []
+
+    def evict_redo(self):
+        """Forget the step that would be redone last. False when there is
+        nothing to redo."""
+        if not self.redo_steps:
+            return False
+        step = self.redo_steps.pop(0)
+        self._count(-step.size)
+        return True
+
+    def evict_oldest(self, keep=1):
+        """Move the oldest step out of memory, to the spill file or for
+        good. False when only keep steps are left."""
+        if len(self.undo_steps) <= keep:
+            return False
+        step = self.undo_steps.popleft()
+        self._count(-step.size)
+        if not self.budget.spill:
+            # The spilled steps are older still and can no longer be reached
+            self.dropped += 1 + len(self.spilled)
+            self._forget_spill()
+            return True
+        if self.spill is None:
+            self.spill = tempfile.TemporaryFile(prefix='notepad_undo_')
+        data = json.dumps(step.deltas).encode('utf-8')
+        position = self.spill.seek(0, 2)
+        self.spill.write(data)
+        self.spilled.append((position, len(data), step.serial))
+        self.spill_size += len(data)
+        while self.spill_size > SPILL_BYTES and len(self.spilled) > 1:
+            self.spill_size -= self.spilled.popleft()[1]
+            self.dropped += 1
+        if position > 2 * SPILL_BYTES:
+            self._compact_spill()
+        return True
+
+    def spill_all(self):
+        """Move every undo step out of memory, for a tab that is put away.
+        Nothing happens when spilling is off."""
+        if self.budget.spill and not self.group:
+            self.run_at = None
+            while self.evict_oldest(keep=0):
+                pass
+
+    def _read_back(self):
+        # Bring the newest spilled step back, the file shrinks with it
+        position, length, serial = self.spilled.pop()
+        self.spill.seek(position)
+        deltas = [tuple(delta) for delta in json.loads(self.spill.read(length).decode('utf-8'))]
+        self.spill.truncate(position)
+        self.spill_size -= length
+        step = Step(serial, deltas)
+        self.undo_steps.appendleft(step)
+        self._count(step.size)
+        self.budget.enforce(self)
+
+    def _compact_spill(self):
+        # Steps forgotten from the front of the file still take up space in it
+        spill = tempfile.TemporaryFile(prefix='notepad_undo_')
+        spilled = deque()
+        for position, length, serial in self.spilled:
+            self.spill.seek(position)
+            spilled.append((spill.tell(), length, serial))
+            spill.write(self.spill.read(length))
+        self.spill.close()
+        self.spill = spill
+        self.spilled = spilled
+
+    def _forget_spill(self):
+        if self.spill is not None:
+            self.spill.close()
+            self.spill = None
+        self.spilled = deque()
+        self.spill_size = 0
+
+    def clear(self):
+        self._drop_redo()
+        for step in self.undo_steps:
+            self._count(-step.size)
+        self.undo_steps = deque()
+        self._forget_spill()
+        self.run_at = None
+        self.saved = None
+        if self.group:
+            self.undo_steps.append(Step(self.budget.next_serial()))
+
+    def discard(self):
+        """Free everything, for a tab that is closed."""
+        self.clear()
+        self.budget.histories.discard(self)